@@ -0,0 +1,55 @@
+import sys
+from bms_paged_loader import fetch_all_rows, default_client_factory
+from bms_contacts import PHONES_COLUMN, format_contacts
+from bms_order_store import reset_store
+from bms_full_sync import SUPABASE_URL, SUPABASE_KEY, TARGET_TABLE, upsert_records
+
+# 동기화가 customer.phones를 채우기 전에 저장된 주문들에 한 번만 실행하는 스크립트
+ALTER_SQL = f'ALTER TABLE {TARGET_TABLE} ADD COLUMN IF NOT EXISTS "{PHONES_COLUMN}" text;'
+
+class PrintProgress:
+    """fetch_all_rows의 loading_text 자리에 넣어 진행 상황을 콘솔에 출력"""
+    def text(self, msg):
+        print(msg)
+
+def backfill():
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("❌ Supabase 환경 변수가 설정되지 않았습니다.")
+        return False
+
+    # 1. 컬럼 존재 확인 (PostgREST로는 컬럼을 추가할 수 없으므로 SQL 안내)
+    try:
+        default_client_factory().table(TARGET_TABLE).select(f'"{PHONES_COLUMN}"').limit(1).execute()
+    except Exception:
+        print(f"❌ {PHONES_COLUMN} 컬럼이 없습니다. Supabase SQL Editor에서 먼저 실행하세요:")
+        print(ALTER_SQL)
+        return False
+
+    # 2. 아직 비어 있는 주문만 조회
+    rows = fetch_all_rows(
+        lambda client: client.table(TARGET_TABLE)
+            .select('id,"customer.contacts"')
+            .is_(f'"{PHONES_COLUMN}"', "null"),
+        loading_text=PrintProgress(),
+        label="전화번호가 비어 있는 주문"
+    )
+    if not rows:
+        print("✅ 채울 주문이 없습니다.")
+        return True
+
+    # 3. 전화번호 정리 후 upsert (연락처가 없는 주문은 빈 문자열로 채워 다시 조회되지 않도록)
+    print(f"🔄 총 {len(rows)}건의 전화번호를 채웁니다...")
+    records = [{"id": r["id"], PHONES_COLUMN: format_contacts(r.get("customer.contacts"))} for r in rows]
+    failed = upsert_records(records)
+    # 대시보드 저장소는 updatedAt 기준으로만 변경분을 받으므로 채운 전화번호가 보이도록 재수집 예약
+    reset_store()
+    if failed:
+        failed_rows = sum(len(chunk["records"]) for chunk in failed)
+        print(f"⚠️ {failed_rows}건을 저장하지 못했습니다. 다시 실행하면 남은 주문만 처리합니다.")
+        return False
+
+    print(f"✅ 완료! {len(records)}건의 customer.phones를 채웠습니다.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if backfill() else 1)
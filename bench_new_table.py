@@ -0,0 +1,29 @@
+import sys
+import time
+
+import bms_lens_sku
+import bms_new_dashboard as page
+from test_new_dashboard_table import STAFF, baseline_process_new_data, make_orders
+
+# NEW 주문 표 구성: 기존 행 단위(iterrows) vs 컬럼 단위 처리 시간 비교
+# 사용법: python bench_new_table.py [주문 수 ...]  (기본 1000 5000 10000)
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def run(sizes):
+    bms_lens_sku.load_lens_mappings = lambda: {}
+    print(f"{'주문 수':>8} {'담당자':>6} {'행 수':>6} {'기존(초)':>9} {'컬럼 단위(초)':>13} {'배수':>6}  같음")
+    for n in sizes:
+        df = make_orders(n, seed=0)
+        for staff in STAFF:
+            old, t_old = timed(baseline_process_new_data, df.copy(), staff)
+            # 담당자 무관 단계의 캐시를 쓰지 않은 첫 실행 시간
+            page.build_new_table.clear()
+            new, t_new = timed(page.process_new_data, df.copy(), staff)
+            print(f"{n:>8} {staff:>6} {len(new):>6} {t_old:>9.2f} {t_new:>13.3f} {t_old / t_new:>6.1f}  {old.equals(new)}")
+
+if __name__ == "__main__":
+    run([int(a) for a in sys.argv[1:]] or [1000, 5000, 10000])
@@ -0,0 +1,53 @@
+import argparse
+import time
+
+from bms_rx_matcher import AUTO_BROADCAST_MAX_ROWS, MATCH_ENGINES, _match_inputs, find_matches
+from test_rx_matcher import baseline_find_alt_returns, make_rx, make_rx_realistic
+
+# 대체 반품 후보 찾기: 기존 이중 iterrows vs 매칭 엔진별 처리 시간 비교
+# 사용법: python bench_rx_matcher.py [--sizes 1000 5000 20000] [--baseline-max 1000]
+# 기존 방식은 행 수의 제곱에 비례해 느리므로 --baseline-max 행 이하에서만 실행하고 결과가 같은지도 확인
+# --crossover: 실제에 가까운 분포에서 엔진별 후보 쌍 계산 시간 비교 (AUTO_BROADCAST_MAX_ROWS 근거)
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def run(sizes, baseline_max):
+    print(f"{'행 수':>7} {'엔진':>10} {'시간(초)':>9} {'후보 있는 행':>11}  기존과 같음")
+    for n in sizes:
+        df = make_rx(n, seed=0)
+        expected = None
+        if n <= baseline_max:
+            expected, elapsed = timed(baseline_find_alt_returns, df)
+            print(f"{n:>7} {'iterrows':>10} {elapsed:>9.2f} {sum(1 for x in expected if x):>11}")
+        for engine in sorted(MATCH_ENGINES):
+            result, elapsed = timed(find_matches, df, engine)
+            same = "-" if expected is None else result == expected
+            print(f"{n:>7} {engine:>10} {elapsed:>9.3f} {sum(1 for x in result if x):>11}  {same}")
+
+def crossover(sizes, repeat=3):
+    print(f"auto 기준: {AUTO_BROADCAST_MAX_ROWS}행 이하 broadcast")
+    engines = sorted(MATCH_ENGINES)
+    print(f"{'행 수':>7} {'쌍 수':>7} " + " ".join(f"{e + '(초)':>13}" for e in engines) + "  빠른 엔진")
+    for n in sizes:
+        inputs = _match_inputs(make_rx_realistic(n, seed=0))
+        best = {}
+        for engine in engines:
+            # 여러 번 중 가장 빠른 시간 (첫 실행의 메모리 할당 등 영향 제외)
+            runs = [timed(MATCH_ENGINES[engine], *inputs) for _ in range(repeat)]
+            best[engine] = min(t for _, t in runs)
+            pairs = len(runs[0][0][0])
+        print(f"{n:>7} {pairs:>7} " + " ".join(f"{best[e]:>13.4f}" for e in engines) + f"  {min(best, key=best.get)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--baseline-max", type=int, default=1000)
+    parser.add_argument("--crossover", action="store_true")
+    args = parser.parse_args()
+    if args.crossover:
+        crossover([500, 1000, 2000, 3000, 4000, 6000, 10000, 20000, 40000])
+    else:
+        run(args.sizes, args.baseline_max)
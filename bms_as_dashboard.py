@@ -1,9 +1,11 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import altair as alt
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from bms_order_store import load_orders, invalidate_store, data_version
+from bms_json_columns import parse_json_value
 import sys
 import subprocess
 import time
@@ -36,9 +38,6 @@ def load_data():
         if not SUPABASE_URL or not SUPABASE_KEY:
             return pd.DataFrame()
         
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        all_data = []
-        
         # 🌟 핵심 1: 무거운 전체 열(*) 대신 대시보드에 표시할 필수 열만 콕 집어서 요청 (속도 수십 배 향상)
         COLS = [
             "id", "createdAt", "status", "code", "frameType", "lensType",
@@ -51,36 +50,9 @@ def load_data():
             '"data.las.referenceId"', '"data.las.classification"', '"data.las.comment"',
             '"data.fas.referenceId"', '"data.fas.classification"', '"data.fas.comment"'
         ]
-        cols = ",".join(COLS)
-        
-        # 🌟 핵심 2: 1000개씩 나눠서 가져오기 (서버 과부하 원천 차단)
-        offset = 0
-        page_size = 1000
+        # 공용 로컬 저장소에서 읽기 (변경된 주문만 Supabase에서 받아 반영)
         loading_text = st.empty()
-        
-        while True:
-            loading_text.text(f"⏳ 전체 과거 데이터를 불러오는 중입니다... ({offset}건 완료)")
-            
-            response = supabase.table(TARGET_TABLE)\
-                .select(cols)\
-                .order("id")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-                
-            data = response.data
-            if not data:
-                break
-                
-            all_data.extend(data)
-            
-            if len(data) < page_size:
-                break # 가져온 게 1000개 미만이면 마지막 페이지임
-                
-            offset += page_size
-            
-        loading_text.empty() # 완료되면 안내 문구 삭제
-        
-        return pd.DataFrame(all_data) if all_data else pd.DataFrame()
+        return load_orders(COLS, loading_text=loading_text)
         
     except Exception as e:
         st.error(f"전체 데이터 로드 중 오류: {e}")
@@ -127,8 +99,7 @@ TRANSLATION_MAP = {
 def parse_classification(raw_data):
     if not raw_data: return ""
     try:
-        import ast
-        data_list = ast.literal_eval(raw_data) if isinstance(raw_data, str) else raw_data
+        data_list = parse_json_value(raw_data)
         if isinstance(data_list, list) and len(data_list) > 0:
             item = data_list[0]
             f = item.get('first', ''); s = item.get('second', '')
@@ -141,9 +112,26 @@ def parse_classification(raw_data):
 # ==========================================
 # [4. 데이터 처리 로직 (핵심)]
 # ==========================================
-def process_as_data(df, selected_staff):
-    if df.empty: return pd.DataFrame(), pd.DataFrame()
-    
+def clean_ref_ids(ref_series):
+    """referenceId 컬럼 → 원주문 id 문자열 ("['123']", "123.0" → "123", 해석 불가 → "")"""
+    s = ref_series.astype(str).str.strip().str.replace(r"[\[\]']", "", regex=True).str.strip()
+    nums = pd.to_numeric(s, errors='coerce').astype(float)
+    valid = np.isfinite(nums)
+    out = pd.Series("", index=ref_series.index, dtype=object)
+    out[valid] = nums[valid].astype(np.int64).astype(str)
+    return out
+
+def generate_smart_link(date_str):
+    # [수정] 스마트 링크 생성 (날짜 파라미터 포함)
+    if not date_str or date_str == "":
+        return BMS_MAIN_URL
+    return f"{BMS_MAIN_URL}?startDate={date_str}&endDate={date_str}"
+
+@st.cache_data(ttl=600, show_spinner=False)
+def build_as_table(_df, version):
+    """담당자와 무관한 전체 AS/피팅 표 (원주문 담당자 '원담당자' 포함).
+    데이터(version)가 바뀔 때만 다시 계산하고, 담당자 선택은 이 표를 거르기만 함"""
+    df = _df.copy()
     # 전처리
     df['id'] = df['id'].astype(str).str.replace(r'\.0$', '', regex=True)
     df = df.fillna("")
@@ -152,67 +140,46 @@ def process_as_data(df, selected_staff):
     if 'status' in df.columns:
         df = df[~df['status'].astype(str).str.strip().str.lower().eq('archived')]
 
-    # 매핑 생성
-    id_to_code = dict(zip(df['id'], df['code']))
-    lens_staff_col = 'statusDetail.lensStaff'
-    id_to_lens_staff = dict(zip(df['id'], df[lens_staff_col])) if lens_staff_col in df.columns else {}
-    frame_staff_col = 'statusDetail.frameStaff'
-    id_to_frame_staff = dict(zip(df['id'], df[frame_staff_col])) if frame_staff_col in df.columns else {}
+    # 원주문 id → 주문번호/담당자 (AS 행의 referenceId와 합치기 위한 조회표)
+    originals = df.set_index('id')
 
-    def clean_ref_id(ref_val):
-        s = str(ref_val).strip().replace('[', '').replace(']', '').replace("'", "")
-        try: return str(int(float(s)))
-        except: return ""
+    def attach_original(as_df, ref_col, staff_col):
+        ref_ids = clean_ref_ids(as_df[ref_col])
+        as_df['원주문번호'] = ref_ids.map(originals['code']).fillna("")
+        if staff_col in originals.columns:
+            as_df['원담당자'] = ref_ids.map(originals[staff_col]).fillna("").astype(str)
+        else:
+            as_df['원담당자'] = ""
+        return as_df
 
     results = []
 
     # [Logic 1] 렌즈 AS
     if 'lensType' in df.columns:
-        lens_as_candidates = df[df['lensType'] == 'as'].copy()
-        if not lens_as_candidates.empty:
-            def check_lens_owner(row):
-                ref_id = clean_ref_id(row.get('data.las.referenceId', ''))
-                orig_staff = id_to_lens_staff.get(ref_id, "")
-                return str(orig_staff) == str(selected_staff)
-
-            my_lens_as = lens_as_candidates[lens_as_candidates.apply(check_lens_owner, axis=1)].copy()
-            if not my_lens_as.empty:
-                my_lens_as['구분'] = '렌즈 AS'
-                my_lens_as['AS 분류'] = my_lens_as.get('data.las.classification', '').apply(parse_classification)
-                my_lens_as['AS 사유'] = my_lens_as.get('data.las.comment', '').apply(lambda x: f"💎 {x}")
-                my_lens_as['원주문번호'] = my_lens_as['data.las.referenceId'].apply(lambda x: id_to_code.get(clean_ref_id(x), ""))
-                results.append(my_lens_as)
+        lens_as = df[df['lensType'] == 'as'].copy()
+        if not lens_as.empty:
+            lens_as['구분'] = '렌즈 AS'
+            lens_as['AS 분류'] = lens_as.get('data.las.classification', '').apply(parse_classification)
+            lens_as['AS 사유'] = "💎 " + lens_as.get('data.las.comment', '').astype(str)
+            results.append(attach_original(lens_as, 'data.las.referenceId', 'statusDetail.lensStaff'))
 
     # [Logic 2] 테 AS/피팅
     if 'frameType' in df.columns:
         target_types = ['as', 'fitting']
-        frame_as_candidates = df[df['frameType'].isin(target_types)].copy()
-        if not frame_as_candidates.empty:
-            def check_frame_owner(row):
-                ref_id = clean_ref_id(row.get('data.fas.referenceId', ''))
-                orig_staff = id_to_frame_staff.get(ref_id, "")
-                return str(orig_staff) == str(selected_staff)
-            
-            my_frame_as = frame_as_candidates[frame_as_candidates.apply(check_frame_owner, axis=1)].copy()
-            if not my_frame_as.empty:
-                my_frame_as['AS 분류'] = my_frame_as.get('data.fas.classification', '').apply(parse_classification)
-                def set_info(row):
-                    ft = row.get('frameType', '')
-                    cmt = row.get('data.fas.comment', '')
-                    if ft == 'as': return '테 AS', f"👓 {cmt}"
-                    elif ft == 'fitting': return '피팅', f"🛠️ {cmt}"
-                    return ft, cmt
-                res = my_frame_as.apply(set_info, axis=1, result_type='expand')
-                my_frame_as['구분'] = res[0]
-                my_frame_as['AS 사유'] = res[1]
-                my_frame_as['원주문번호'] = my_frame_as['data.fas.referenceId'].apply(lambda x: id_to_code.get(clean_ref_id(x), ""))
-                results.append(my_frame_as)
+        frame_as = df[df['frameType'].isin(target_types)].copy()
+        if not frame_as.empty:
+            frame_as['AS 분류'] = frame_as.get('data.fas.classification', '').apply(parse_classification)
+            is_as = frame_as['frameType'] == 'as'
+            comment = frame_as.get('data.fas.comment', '').astype(str)
+            frame_as['구분'] = np.where(is_as, '테 AS', '피팅')
+            frame_as['AS 사유'] = np.where(is_as, "👓 " + comment, "🛠️ " + comment)
+            results.append(attach_original(frame_as, 'data.fas.referenceId', 'statusDetail.frameStaff'))
 
     if not results:
-        return pd.DataFrame(), pd.DataFrame()
-        
+        return pd.DataFrame()
+
     final_df = pd.concat(results, ignore_index=True)
-    
+
     # 날짜 포맷팅
     if 'createdAt' in final_df.columns:
         final_df['접수일'] = pd.to_datetime(final_df['createdAt'], errors='coerce').dt.strftime('%Y-%m-%d')
@@ -223,35 +190,37 @@ def process_as_data(df, selected_staff):
     final_df['고객명'] = final_df.get('customer.name', '')
     final_df['key_id'] = final_df['id']
     final_df = final_df.sort_values(by='AS 주문번호', ascending=False)
-    
-    # [수정] 스마트 링크 생성 (날짜 파라미터 포함)
-    def generate_smart_link(date_str):
-        if not date_str or date_str == "":
-            return BMS_MAIN_URL
-        return f"{BMS_MAIN_URL}?startDate={date_str}&endDate={date_str}"
+    final_df['BMS_LINK'] = final_df['접수일'].map(generate_smart_link)
 
-    final_df['BMS_LINK'] = final_df['접수일'].apply(generate_smart_link)
+    # [수정] 정렬을 통해 렌즈 -> 테 -> 피팅 순서 보장 (데이터 정합성 및 가독성 향상)
+    # 원주문번호 기준 정렬 후 구분(렌즈/테/피팅) 정렬
+    return final_df.sort_values(by=['원주문번호', '구분'])
+
+def process_as_data(df, selected_staff):
+    if df.empty: return pd.DataFrame(), pd.DataFrame()
+
+    as_table = build_as_table(df, data_version(df))
+    if as_table.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    # 원주문 담당자가 선택한 담당자인 AS만
+    final_df = as_table[as_table['원담당자'] == str(selected_staff)]
+    if final_df.empty:
+        return pd.DataFrame(), pd.DataFrame()
 
     # 병합 로직
-    if not final_df.empty:
-        # [수정] 정렬을 통해 렌즈 -> 테 -> 피팅 순서 보장 (데이터 정합성 및 가독성 향상)
-        # 원주문번호 기준 정렬 후 구분(렌즈/테/피팅) 정렬
-        final_df = final_df.sort_values(by=['원주문번호', '구분'])
-
-        agg_rules = {
-            'AS 주문번호': lambda x: x.max(), # 가장 최근 번호 (탐색용)
-            '구분': lambda x: "\n".join(x), # 단순 결합 (줄바꿈) - 순서 보장
-            'AS 분류': lambda x: "\n".join(x.astype(str)), # 순서대로 결합
-            'AS 사유': lambda x: "\n".join(x.astype(str)), # 순서대로 결합
-            'key_id': lambda x: ",".join(x.astype(str)),
-            'BMS_LINK': 'first' # 링크도 병합 (첫번째 날짜 기준)
-        }
-        
-        grouped_df = final_df.groupby(['원주문번호', '접수일', '고객명'], as_index=False).agg(agg_rules)
-        grouped_df = grouped_df.sort_values(by='AS 주문번호', ascending=False)
-        return grouped_df, final_df
-    
-    return final_df, final_df
+    agg_rules = {
+        'AS 주문번호': lambda x: x.max(), # 가장 최근 번호 (탐색용)
+        '구분': lambda x: "\n".join(x), # 단순 결합 (줄바꿈) - 순서 보장
+        'AS 분류': lambda x: "\n".join(x.astype(str)), # 순서대로 결합
+        'AS 사유': lambda x: "\n".join(x.astype(str)), # 순서대로 결합
+        'key_id': lambda x: ",".join(x.astype(str)),
+        'BMS_LINK': 'first' # 링크도 병합 (첫번째 날짜 기준)
+    }
+
+    grouped_df = final_df.groupby(['원주문번호', '접수일', '고객명'], as_index=False).agg(agg_rules)
+    grouped_df = grouped_df.sort_values(by='AS 주문번호', ascending=False)
+    return grouped_df, final_df
 
 # ==========================================
 # [5. 메인 UI 함수]
@@ -273,6 +242,7 @@ def main():
     st.sidebar.title("설정")
     
     if st.sidebar.button("🔄 화면 새로고침"):
+        invalidate_store()
         st.cache_data.clear()
         st.rerun()
 
@@ -304,6 +274,7 @@ def main():
             if process.poll() == 0:
                 progress_bar.progress(1.0, text="완료!")
                 st.sidebar.success("성공!")
+                invalidate_store()
                 st.cache_data.clear()
                 time.sleep(1); st.rerun()
             else:
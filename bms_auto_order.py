@@ -5,11 +5,12 @@ import json
 import os
 import streamlit as st
 import pandas as pd
-import ast
 import pytz
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from bms_lens_sku import clear_lens_mappings
+from bms_json_columns import parse_json_value
 
 # Windows 루프 정책 설정
 if sys.platform == 'win32':
@@ -47,6 +48,8 @@ def save_to_server(sku_str, custom_name):
             "sku_key": sku_str,
             "custom_name": custom_name
         }).execute()
+        # 다른 페이지의 렌즈 이름 표시에도 바로 반영
+        clear_lens_mappings()
         return True
     except Exception as e:
         st.error(f"서버 저장 오류 발생: {e}")
@@ -112,9 +115,8 @@ def execute_chemi_order(selected_rows):
     for _, row in selected_rows.iterrows():
         for side, dosu in [('L렌즈', 'L도수 (SPH/CYL/AXIS)'), ('R렌즈', 'R도수 (SPH/CYL/AXIS)')]:
             sku_val = row.get(side, '')
-            if pd.isna(sku_val) or str(sku_val).strip() in ['', 'nan', 'None']: continue
-            try: sku_list = ast.literal_eval(str(sku_val)) if isinstance(sku_val, str) else sku_val
-            except: sku_list = [str(sku_val)]
+            if not isinstance(sku_val, list) and (pd.isna(sku_val) or str(sku_val).strip() in ['', 'nan', 'None']): continue
+            sku_list = parse_json_value(sku_val, default=[str(sku_val)])
             
             lens_key = str(sku_list)
             if lens_key not in orders_by_lens: orders_by_lens[lens_key] = {"sku_list": sku_list, "dosu_map": {}}
@@ -159,10 +161,9 @@ def execute_auto_order(selected_rows, brand_name):
         
         for side, dosu in [('L렌즈', 'L도수 (SPH/CYL/AXIS)'), ('R렌즈', 'R도수 (SPH/CYL/AXIS)')]:
             sku_val = row.get(side, '')
-            if pd.isna(sku_val) or str(sku_val).strip() in ['', 'nan', 'None']: continue
+            if not isinstance(sku_val, list) and (pd.isna(sku_val) or str(sku_val).strip() in ['', 'nan', 'None']): continue
             
-            try: sku_list = ast.literal_eval(str(sku_val)) if isinstance(sku_val, str) else sku_val
-            except: sku_list = [str(sku_val)]
+            sku_list = parse_json_value(sku_val, default=[str(sku_val)])
             
             lens_key = str(sku_list)
             if lens_key not in orders_by_lens: 
@@ -210,9 +211,13 @@ def execute_auto_order(selected_rows, brand_name):
             st.error(f"실행 실패: {e}")
 
 # [5. 필터링 로직]
+def sku_display(sku_val):
+    # jsonb로 받은 리스트도 표에는 기존과 같은 "['...']" 문자열로 표시 (발주 실행 때 다시 파싱)
+    return str(sku_val) if isinstance(sku_val, list) else sku_val
+
 def extract_lens_info(sku_str):
     try:
-        s_list = ast.literal_eval(sku_str) if isinstance(sku_str, str) else sku_str
+        s_list = parse_json_value(sku_str)
         if isinstance(s_list, list) and len(s_list) > 0:
             parts = str(s_list[0]).split('-')
             if len(parts) >= 3 and 'rx' in parts[2].lower(): return None, None
@@ -260,7 +265,7 @@ def get_stock_orders_by_date(df, start_date_str, end_date_str):
             
             grouped[brand].append({
                 "선택": False, "주문번호": row.get('code', ''), "이름": row.get('customer.name', ''),
-                "L렌즈": row.get('lens.left.skus', ''), "R렌즈": row.get('lens.right.skus', ''),
+                "L렌즈": sku_display(row.get('lens.left.skus', '')), "R렌즈": sku_display(row.get('lens.right.skus', '')),
                 "L도수 (SPH/CYL/AXIS)": f"{l_sph_val} / {l_cyl_val}",
                 "R도수 (SPH/CYL/AXIS)": f"{r_sph_val} / {r_cyl_val}"
             })
@@ -5,12 +5,12 @@ import os
 import json
 import streamlit as st
 import pandas as pd
-import ast
 import pytz
 import re
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from bms_json_columns import parse_json_value
 
 # Windows 루프 정책 설정
 if sys.platform == 'win32':
@@ -104,7 +104,7 @@ def load_rx_data(start_date_str, end_date_str):
 
 def extract_rx_lens_info(sku_str):
     try:
-        s_list = ast.literal_eval(sku_str) if isinstance(sku_str, str) else sku_str
+        s_list = parse_json_value(sku_str)
         if isinstance(s_list, list) and len(s_list) > 0:
             sku_first = str(s_list[0]).lower()
             parts = sku_first.split('-')
@@ -115,23 +115,56 @@ def extract_rx_lens_info(sku_str):
     except: pass
     return None, None
 
-def extract_order_items_data(order_items):
+NUMBER_PREFIX_PATTERN = re.compile(r"[0-9.]+")
+
+def _walk_json(value):
+    """파싱된 orderItems를 원문 순서대로 (키, 값) 으로 훑음 (리스트 원소는 키 None)"""
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield k, v
+            yield from _walk_json(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield None, v
+            yield from _walk_json(v)
+
+def _scan_order_items_text(text):
     oh_l, oh_r, vd, model, size = "", "", "", "", ""
-    try:
-        text = str(order_items)
-        match_oh_l = re.search(r"['\"]rec_proc_oh_l['\"]\s*:\s*['\"]?([0-9.]+)['\"]?", text)
-        if match_oh_l: oh_l = match_oh_l.group(1)
-        match_oh_r = re.search(r"['\"]rec_proc_oh_r['\"]\s*:\s*['\"]?([0-9.]+)['\"]?", text)
-        if match_oh_r: oh_r = match_oh_r.group(1)
-        match_vd = re.search(r"['\"]vd['\"]\s*:\s*['\"]?([0-9.]+)['\"]?", text)
-        if match_vd: vd = match_vd.group(1)
-        match_model = re.search(r"['\"]front_([^'\"]+)['\"]", text)
-        if match_model: model = match_model.group(1).strip()
-        match_size = re.search(r"['\"]frame_size_([^'\"]+)['\"]", text)
-        if match_size: size = match_size.group(1).strip()
-    except Exception as e: print(f"텍스트 스캔 중 오류: {e}")
+    match_oh_l = re.search(r"['\"]rec_proc_oh_l['\"]\s*:\s*['\"]?([0-9.]+)['\"]?", text)
+    if match_oh_l: oh_l = match_oh_l.group(1)
+    match_oh_r = re.search(r"['\"]rec_proc_oh_r['\"]\s*:\s*['\"]?([0-9.]+)['\"]?", text)
+    if match_oh_r: oh_r = match_oh_r.group(1)
+    match_vd = re.search(r"['\"]vd['\"]\s*:\s*['\"]?([0-9.]+)['\"]?", text)
+    if match_vd: vd = match_vd.group(1)
+    match_model = re.search(r"['\"]front_([^'\"]+)['\"]", text)
+    if match_model: model = match_model.group(1).strip()
+    match_size = re.search(r"['\"]frame_size_([^'\"]+)['\"]", text)
+    if match_size: size = match_size.group(1).strip()
     return oh_l, oh_r, vd, model, size
 
+def extract_order_items_data(order_items):
+    """orderItems → (OH 좌, OH 우, VD, 테 모델, 테 사이즈). 첫 번째로 나오는 값 사용"""
+    try:
+        items = parse_json_value(order_items)
+        if items is None:
+            # 해석할 수 없는 원문(잘린 문자열 등)은 기존처럼 텍스트 스캔
+            return _scan_order_items_text(str(order_items))
+
+        found = {"rec_proc_oh_l": "", "rec_proc_oh_r": "", "vd": "", "front_": "", "frame_size_": ""}
+        for k, v in _walk_json(items):
+            if k in ("rec_proc_oh_l", "rec_proc_oh_r", "vd") and not found[k] and not isinstance(v, (list, dict, bool)):
+                match = NUMBER_PREFIX_PATTERN.match(str(v))
+                if match: found[k] = match.group(0)
+            for text in (k, v):
+                if not isinstance(text, str): continue
+                for prefix in ("front_", "frame_size_"):
+                    if not found[prefix] and text.startswith(prefix) and len(text) > len(prefix):
+                        found[prefix] = text[len(prefix):].strip()
+        return found["rec_proc_oh_l"], found["rec_proc_oh_r"], found["vd"], found["front_"], found["frame_size_"]
+    except Exception as e:
+        print(f"텍스트 스캔 중 오류: {e}")
+        return "", "", "", "", ""
+
 def get_rx_orders_by_date(df, start_date_str, end_date_str):
     if df.empty: return {}
     frame_specs_dict = load_frame_specs()
@@ -0,0 +1,54 @@
+import json
+import re
+from bms_json_columns import parse_json_value
+
+# ==========================================
+# 고객 연락처(customer.contacts) → "010-1234-5678, 02-123-4567" 형식 전화번호 문자열
+# 동기화(bms_full_sync)가 customer.phones 컬럼으로 미리 저장하고,
+# 대시보드는 그 컬럼이 비어 있는 예전 행에 대해서만 직접 파싱
+# ==========================================
+PHONES_COLUMN = "customer.phones"
+PHONE_PATTERN = re.compile(r"(?:010|02|03[1-3]|04[1-4]|05[1-5]|06[1-4])[-.]?\d{3,4}[-.]?\d{4}")
+
+def _phones_from_list(c_list):
+    phones = []
+    for item in c_list:
+        if isinstance(item, dict):
+            val = item.get('data', {}).get('value') if isinstance(item.get('data'), dict) else None
+            if not val: val = item.get('value')
+            if val: phones.append(str(val))
+    return phones
+
+def format_contacts(c_data):
+    """연락처 원본(리스트, 리스트의 문자열 표현, JSON 문자열, 일반 텍스트) → 전화번호 문자열.
+    번호를 찾지 못하면 원본 텍스트를 그대로 돌려줌"""
+    if isinstance(c_data, list):
+        phones = _phones_from_list(c_data)
+        if phones: return ", ".join(phones)
+    if not c_data or str(c_data).strip() == "" or str(c_data).lower() == 'nan':
+        return ""
+    c_str = str(c_data).strip()
+
+    c_list = parse_json_value(c_str)
+    if isinstance(c_list, list):
+        phones = _phones_from_list(c_list)
+        if phones: return ", ".join(phones)
+
+    try:
+        clean_str = c_str.replace("'", '"').replace("True", "true").replace("False", "false")
+        c_list = json.loads(clean_str)
+        if isinstance(c_list, list):
+            phones = _phones_from_list(c_list)
+            if phones: return ", ".join(phones)
+    except Exception: pass
+
+    phones = PHONE_PATTERN.findall(c_str)
+    if phones: return ", ".join(phones)
+    return c_str
+
+def order_phones(detail):
+    """주문 상세 JSON → customer.phones 값 (고객 정보가 없으면 None)"""
+    customer = detail.get('customer')
+    if not isinstance(customer, dict) or 'contacts' not in customer:
+        return None
+    return format_contacts(customer['contacts'])
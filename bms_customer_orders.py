@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from bms_paged_loader import fetch_all_rows
+
+# ==========================================
+# [설정 구간]
+# 고객 id 목록 → 해당 고객들의 전체 주문 (DT 특별관리)
+# - id 목록을 URL 길이 안에 들어가는 묶음으로 나눠 동시에 조회
+# - 묶음마다 id 순 keyset 페이지로 끝까지 받음 (서버 최대 행 수에 잘리지 않도록)
+# - 고객 단위로 캐시: 고객이 추가되면 그 고객 주문만 새로 받음
+# ==========================================
+TARGET_TABLE = "bms_orders"
+
+# in_ 필터 한 번에 넣을 고객 id 수 / 동시에 조회할 묶음 수
+ID_BATCH_SIZE = 100
+FETCH_WORKERS = 4
+# 고객별 주문 재조회 주기(초)
+CUSTOMER_ORDERS_TTL = 60
+# ==========================================
+
+_lock = threading.Lock()
+# (컬럼 목록, 고객 id 문자열) → (받은 시각, 주문 행 목록)
+_cache = {}
+
+def _fetch_batch(columns, customer_ids):
+    return fetch_all_rows(
+        lambda client: client.table(TARGET_TABLE)
+            .select(",".join(columns))
+            .in_('"customer.id"', customer_ids),
+        label="특별관리 고객 주문"
+    )
+
+def _fetch_customers(columns, customer_ids):
+    """고객 id 묶음들을 동시에 조회 → {고객 id: 주문 행 목록} (주문이 없는 고객은 빈 목록)"""
+    batches = [customer_ids[i:i + ID_BATCH_SIZE] for i in range(0, len(customer_ids), ID_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(batches))) as pool:
+        results = list(pool.map(lambda batch: _fetch_batch(columns, batch), batches))
+
+    by_customer = {cid: [] for cid in customer_ids}
+    for rows in results:
+        for row in rows:
+            cid = str(row.get("customer.id"))
+            if cid in by_customer:
+                by_customer[cid].append(row)
+    return by_customer
+
+def load_customer_orders(customer_ids, columns, ttl=CUSTOMER_ORDERS_TTL):
+    """고객들의 주문 DataFrame (접수일 내림차순, 주문 id 중복 제거).
+    columns: select할 컬럼 (id 포함). 캐시에 없거나 ttl이 지난 고객만 Supabase에서 받음"""
+    customer_ids = list(dict.fromkeys(str(c) for c in customer_ids))
+    if not customer_ids:
+        return pd.DataFrame()
+    key = tuple(columns)
+
+    now = time.time()
+    with _lock:
+        cached = {cid: _cache.get((key, cid)) for cid in customer_ids}
+    missing = [cid for cid, entry in cached.items() if entry is None or now - entry[0] >= ttl]
+
+    if missing:
+        fetched = _fetch_customers(columns, missing)
+        with _lock:
+            for cid, rows in fetched.items():
+                _cache[(key, cid)] = (now, rows)
+                cached[cid] = (now, rows)
+
+    rows = [row for cid in customer_ids for row in cached[cid][1]]
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows).drop_duplicates("id")
+    if "createdAt" in df.columns:
+        # Supabase의 order("createdAt", desc=True)와 같게 날짜 없는 주문을 먼저
+        df = df.sort_values("createdAt", ascending=False, kind="stable", na_position="first")
+    return df.reset_index(drop=True)
+
+def invalidate_customer_orders(customer_ids=None):
+    """다음 조회 때 다시 받도록 캐시 삭제 (customer_ids가 없으면 전체)"""
+    with _lock:
+        if customer_ids is None:
+            _cache.clear()
+            return
+        targets = {str(c) for c in customer_ids}
+        for cache_key in [k for k in _cache if k[1] in targets]:
+            del _cache[cache_key]
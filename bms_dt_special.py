@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
 import os
-import ast
 import re
 from dotenv import load_dotenv
 from supabase import create_client
+from bms_lens_sku import decode_lens_skus
+from bms_contacts import format_contacts
+from bms_customer_orders import load_customer_orders, invalidate_customer_orders
+from bms_order_store import data_version
 
 st.set_page_config(page_title="DT 특별관리", page_icon="⭐", layout="wide")
 
@@ -35,36 +38,29 @@ def load_special_customers():
 # ==========================================
 # 해당 고객들의 전체 주문 로드
 # ==========================================
-@st.cache_data(ttl=60, show_spinner=False)
-def load_orders_for_customers(customer_ids: tuple):
+ORDER_COLUMNS = [
+    "id", "createdAt", "status", "code", "frameType", "lensType",
+    '"customer.id"', '"customer.name"', '"customer.contacts"',
+    '"frame.size"', '"frame.color"', '"frame.front"', '"frame.temple"',
+    '"lens.left.skus"', '"lens.right.skus"',
+    '"optometry.data.optimal.left.sph"', '"optometry.data.optimal.left.cyl"',
+    '"optometry.data.optimal.left.axi"', '"optometry.data.optimal.left.add"', '"optometry.data.optimal.left.pd"',
+    '"optometry.data.optimal.right.sph"', '"optometry.data.optimal.right.cyl"',
+    '"optometry.data.optimal.right.axi"', '"optometry.data.optimal.right.add"', '"optometry.data.optimal.right.pd"',
+    '"statusDetail.lensStaff"', '"statusDetail.frameStaff"',
+    '"data.frameCounsel.content"',
+    '"data.fas.comment"', '"optometry.note"', '"deliveryDetail.memo"',
+]
+
+def load_orders_for_customers(customer_ids):
+    """고객별로 캐시된 주문 (bms_customer_orders: id 묶음 단위 동시 조회, 새로 추가된 고객만 받음)"""
     if not customer_ids:
         return pd.DataFrame()
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        st.error("Supabase 환경 변수가 없습니다.")
+        return pd.DataFrame()
     try:
-        sb = get_supabase()
-        if not sb: return pd.DataFrame()
-        COLS = [
-            "id", "createdAt", "status", "code", "frameType", "lensType",
-            '"customer.id"', '"customer.name"', '"customer.contacts"',
-            '"frame.size"', '"frame.color"', '"frame.front"', '"frame.temple"',
-            '"lens.left.skus"', '"lens.right.skus"',
-            '"optometry.data.optimal.left.sph"', '"optometry.data.optimal.left.cyl"',
-            '"optometry.data.optimal.left.axi"', '"optometry.data.optimal.left.add"', '"optometry.data.optimal.left.pd"',
-            '"optometry.data.optimal.right.sph"', '"optometry.data.optimal.right.cyl"',
-            '"optometry.data.optimal.right.axi"', '"optometry.data.optimal.right.add"', '"optometry.data.optimal.right.pd"',
-            '"statusDetail.lensStaff"', '"statusDetail.frameStaff"',
-            '"data.frameCounsel.content"',
-            '"data.fas.comment"', '"optometry.note"', '"deliveryDetail.memo"',
-        ]
-        all_data = []
-        # Supabase in_ filter (batch if large)
-        res = sb.table("bms_orders")\
-            .select(",".join(COLS))\
-            .in_('"customer.id"', list(customer_ids))\
-            .order("createdAt", desc=True)\
-            .execute()
-        if res.data:
-            all_data.extend(res.data)
-        return pd.DataFrame(all_data) if all_data else pd.DataFrame()
+        return load_customer_orders(customer_ids, ORDER_COLUMNS)
     except Exception as e:
         st.error(f"주문 로드 오류: {e}")
         return pd.DataFrame()
@@ -124,32 +120,6 @@ def build_frame_info(row):
     if temple: res += f" 🦵 {temple}"
     return res.strip()
 
-def parse_contacts(c_data):
-    if not c_data or str(c_data).strip().lower() in ['', 'nan', 'none']: return ""
-    c_str = str(c_data).strip()
-    try:
-        c_list = ast.literal_eval(c_str) if c_str.startswith('[') else c_data
-        if isinstance(c_list, list):
-            phones = []
-            for item in c_list:
-                if isinstance(item, dict):
-                    val = item.get('data', {}).get('value') if isinstance(item.get('data'), dict) else None
-                    if not val: val = item.get('value')
-                    if val: phones.append(str(val))
-            if phones: return ", ".join(phones)
-    except Exception: pass
-    phones = re.findall(r"(?:010|02|03[1-3]|04[1-4]|05[1-5]|06[1-4])[-.]?\d{3,4}[-.]?\d{4}", c_str)
-    return ", ".join(phones) if phones else c_str
-
-def parse_lens_skus(skus_data):
-    if not skus_data or str(skus_data).lower() in ['nan', 'none', '']: return ""
-    try:
-        s_list = ast.literal_eval(str(skus_data)) if isinstance(skus_data, str) else skus_data
-        if isinstance(s_list, list) and s_list:
-            return str(s_list[0])
-    except Exception: pass
-    return str(skus_data)
-
 def _fv(v):
     s = str(v).strip()
     return s if s and s.lower() not in ['nan', 'none', ''] else None
@@ -192,8 +162,8 @@ def build_order_display(df_orders):
         f_type = str(row.get('frameType', '')).strip().lower()
         l_type = str(row.get('lensType', '')).strip().lower()
         frame_info = build_frame_info(row)
-        l_lens_raw = parse_lens_skus(row.get('lens.left.skus', ''))
-        r_lens_raw = parse_lens_skus(row.get('lens.right.skus', ''))
+        l_lens_raw = decode_lens_skus(row.get('lens.left.skus', ''))
+        r_lens_raw = decode_lens_skus(row.get('lens.right.skus', ''))
         has_frame  = bool(frame_info)
         has_lens   = bool(l_lens_raw or r_lens_raw)
 
@@ -210,7 +180,7 @@ def build_order_display(df_orders):
             '주문타입': order_type,
             '주문번호': row.get('code', ''),
             '이름':     row.get('customer.name', ''),
-            '전화번호': parse_contacts(row.get('customer.contacts', '')),
+            '전화번호': format_contacts(row.get('customer.contacts', '')),
             '테정보':   frame_info,
             'L렌즈':    f"🅻 {l_lens_raw}" if l_lens_raw else "",
             'R렌즈':    f"🆁 {r_lens_raw}" if r_lens_raw else "",
@@ -237,6 +207,17 @@ def build_order_display(df_orders):
         })
     return pd.DataFrame(rows)
 
+@st.cache_data(ttl=600, show_spinner=False)
+def build_customer_display(_cust_orders, customer_id, orders_version):
+    """고객 한 명의 표시용 DataFrame. (고객 id, 주문 내용 해시)가 같으면 다시 만들지 않음"""
+    return build_order_display(_cust_orders)
+
+def clear_special_caches():
+    """이 페이지 데이터 캐시만 비움 (다른 페이지의 주문 캐시는 유지)"""
+    load_special_customers.clear()
+    build_customer_display.clear()
+    invalidate_customer_orders()
+
 # ==========================================
 # 고객 유형 정의
 # ==========================================
@@ -313,7 +294,7 @@ def main():
     st.title("⭐ DT 특별관리")
 
     if st.button("🔄 새로고침", key="refresh_special"):
-        st.cache_data.clear()
+        clear_special_caches()
         st.rerun()
 
     df_special = load_special_customers()
@@ -324,9 +305,11 @@ def main():
     # 전체 구분 목록
     categories = sorted(df_special['special_category'].dropna().unique().tolist())
 
-    # 주문 로드 (customer_id 튜플로 캐시키 고정)
+    # 주문 로드 (고객별 캐시: 처음 보는 고객만 새로 조회)
     all_customer_ids = tuple(df_special['customer_id'].dropna().unique().tolist())
     df_orders = load_orders_for_customers(all_customer_ids)
+    # 고객별 주문 (한 번에 나눠 두고 고객마다 전체를 다시 훑지 않음)
+    orders_by_customer = {} if df_orders.empty else dict(tuple(df_orders.groupby(df_orders['customer.id'].astype(str), sort=False)))
 
     st.markdown(f"**총 {len(df_special)}명** | 구분: {', '.join(categories)}")
     st.divider()
@@ -352,10 +335,7 @@ def main():
             cname = cust['customer_name'] or '이름 없음'
 
             # 해당 고객의 주문
-            if df_orders.empty:
-                cust_orders = pd.DataFrame()
-            else:
-                cust_orders = df_orders[df_orders['customer.id'].astype(str) == str(cid)]
+            cust_orders = orders_by_customer.get(str(cid), pd.DataFrame())
 
             order_count = len(cust_orders)
             latest_date = ""
@@ -374,20 +354,22 @@ def main():
                     if st.button("저장", key=f"save_cat_{cid}"):
                         if update_special_category(cid, new_cat):
                             st.success("구분이 변경되었습니다.")
-                            st.cache_data.clear()
+                            # 구분만 바뀌므로 고객 목록만 다시 읽음 (주문/표시 캐시는 그대로)
+                            load_special_customers.clear()
                             st.rerun()
                 with col_del:
                     st.write("")
                     st.write("")
                     if st.button("🗑️ 특별관리 해제", key=f"del_{cid}"):
-                        remove_special_customer(cid)
-                        st.cache_data.clear()
+                        if remove_special_customer(cid):
+                            load_special_customers.clear()
+                            invalidate_customer_orders([cid])
                         st.rerun()
 
                 if cust_orders.empty:
                     st.info("주문 내역이 없습니다.")
                 else:
-                    display_df = build_order_display(cust_orders)
+                    display_df = build_customer_display(cust_orders, str(cid), data_version(cust_orders))
                     st.dataframe(
                         display_df,
                         column_config={
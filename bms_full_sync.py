@@ -1,14 +1,22 @@
 import requests
 import sys
 import pandas as pd
+import numpy as np
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from datetime import datetime, timedelta
 import time
 import os
+import json
+import math
+import threading
+import queue
 import warnings
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from bms_contacts import PHONES_COLUMN, order_phones
+from bms_json_columns import JSON_COLUMNS, to_json_text
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
@@ -22,6 +30,32 @@ load_dotenv()
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 TARGET_TABLE = "bms_orders"
+
+# 상세 조회 동시 요청 수 / 초당 최대 요청 수 (429 재시도 구간에 들어가지 않도록 조절)
+FETCH_WORKERS = int(os.environ.get("BMS_FETCH_WORKERS", 8))
+FETCH_RATE_PER_SEC = float(os.environ.get("BMS_FETCH_RATE", 20))
+
+# delta 모드용 동기화 기록 (마지막 동기화 시각 + 주문별 updatedAt)
+SYNC_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sync_state.json")
+FULL_START_DATE = "2024-08-01"
+
+# 셀 하나에 저장할 최대 글자 수 (초과분은 잘라서 저장)
+MAX_CELL_LENGTH = 30000
+
+# Supabase 업로드: 동시 전송 수 / 묶음 크기(행) 범위 / 목표 응답 시간(초) / 묶음당 최대 전송 크기(바이트)
+UPSERT_WORKERS = int(os.environ.get("BMS_UPSERT_WORKERS", 4))
+UPSERT_INITIAL_ROWS = 100
+UPSERT_MIN_ROWS = 10
+UPSERT_MAX_ROWS = 1000
+UPSERT_TARGET_SECONDS = 2.0
+UPSERT_MAX_BYTES = 4 * 1024 * 1024
+
+# 상세 조회와 저장을 겹쳐서 진행: 이 건수만큼 모이면 바로 정리 → upsert (메모리 사용량 상한)
+SYNC_BATCH_ROWS = int(os.environ.get("BMS_SYNC_BATCH_ROWS", 500))
+# 업로드를 기다리는 묶음 수 상한 (업로드가 밀리면 상세 조회가 여기서 잠시 멈춤)
+UPLOAD_QUEUE_BATCHES = 2
+# 동시에 띄워 둘 상세 조회 요청 수 (완료됐지만 아직 처리 안 된 결과가 쌓이지 않도록 제한)
+FETCH_MAX_PENDING = FETCH_WORKERS * 4
 # ==========================================
 
 HEADERS = {"Content-Type": "application/json", "User-Agent": "Mozilla/5.0"}
@@ -47,7 +81,105 @@ def get_supabase_client():
         return None
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def fetch_full_data(start_date):
+class TokenBucket:
+    """여러 스레드가 공유하는 요청 속도 제한기 (초당 rate개, 최대 capacity개까지 몰아서 허용)"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+_thread_local = threading.local()
+
+def get_thread_session():
+    """requests.Session은 스레드 간 공유가 안전하지 않으므로 작업 스레드마다 하나씩 사용"""
+    if not hasattr(_thread_local, "session"):
+        _thread_local.session = get_session()
+    return _thread_local.session
+
+def fetch_order_detail(oid, limiter):
+    limiter.acquire()
+    detail_res = get_thread_session().get(f"https://bmsapi.breezm.com/order/{oid}/detail", timeout=(5, 15))
+    if detail_res.status_code != 200:
+        return None, detail_res.status_code
+    return detail_res.json(), detail_res.status_code
+
+def load_sync_state():
+    """로컬 동기화 기록 로드 (없거나 깨졌으면 빈 기록 → 전체 조회와 동일하게 동작)"""
+    state = {"last_sync": None, "orders": {}}
+    if not os.path.exists(SYNC_STATE_FILE):
+        return state
+    try:
+        with open(SYNC_STATE_FILE, 'r', encoding='utf-8') as f:
+            state.update(json.load(f))
+    except Exception as e:
+        print(f"⚠️ 동기화 기록을 읽지 못해 전체 상세 조회로 진행합니다: {e}")
+    return state
+
+def record_synced_orders(state, df, failed_ids=()):
+    """Supabase 저장에 성공한 주문들의 updatedAt을 기록 (다음 delta 실행의 기준점)"""
+    if 'id' in df.columns and 'updatedAt' in df.columns:
+        for oid, updated in zip(df['id'], df['updatedAt']):
+            if pd.notna(oid) and pd.notna(updated):
+                key = str(int(oid))
+                if key not in failed_ids:
+                    state["orders"][key] = str(updated)
+
+def save_sync_state(state, synced_at=None):
+    """동기화 기록 저장. synced_at은 전체 실행이 성공했을 때만 넘김"""
+    if synced_at:
+        state["last_sync"] = synced_at
+    try:
+        with open(SYNC_STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"⚠️ 동기화 기록 저장 실패: {e}")
+
+def is_order_changed(item, known_updated):
+    stored = known_updated.get(str(item['id']))
+    updated = item.get('updatedAt')
+    # 기록이 없거나 목록에 updatedAt이 없으면 안전하게 다시 가져옴
+    return stored is None or not updated or str(updated) > stored
+
+def flatten_detail(d, sep='.'):
+    """pd.json_normalize(d)의 한 행과 같은 컬럼을 dict로 바로 생성 (DataFrame을 주문마다 만들지 않음).
+    상위 단일 값이 먼저, 중첩 dict는 'optometry.data.optimal.left.sph'처럼 점으로 연결, 빈 dict는 제외"""
+    flat = {k: v for k, v in d.items() if not isinstance(v, dict)}
+    
+    def walk(obj, prefix):
+        for k, v in obj.items():
+            key = f"{prefix}{sep}{k}" if prefix else str(k)
+            if isinstance(v, dict):
+                walk(v, key)
+            else:
+                flat[key] = v
+    
+    walk({k: v for k, v in d.items() if isinstance(v, dict)}, "")
+    return flat
+
+def build_order_row(d):
+    """상세 JSON → 업로드할 행 (플랫 컬럼 + 대시보드용으로 미리 정리한 customer.phones)"""
+    row = flatten_detail(d)
+    phones = order_phones(d)
+    if phones is not None:
+        row[PHONES_COLUMN] = phones
+    return row
+
+def fetch_order_list(start_date, known_updated=None):
+    """주문 목록 조회. 실패 시 None, delta면 updatedAt이 바뀐 주문만 남김"""
     end_date = datetime.now().strftime("%Y-%m-%d")
     url_list = "https://bmsapi.breezm.com/order/list"
     payload = {"storeIds": [STORE_ID], "startDate": start_date, "endDate": end_date}
@@ -61,43 +193,55 @@ def fetch_full_data(start_date):
         if res.status_code not in [200, 201]:
             print(f"❌ 목록 가져오기 실패 (Status: {res.status_code})")
             print(f"👉 쿠키가 만료되었거나 권한이 없을 수 있습니다. (Response: {res.text[:100]})")
-            return pd.DataFrame()
+            return None
         order_list = res.json()
     except Exception as e:
         print(f"❌ API 요청 중 치명적 오류 발생: {e}")
-        return pd.DataFrame()
+        return None
+    
+    if known_updated is not None:
+        listed = len(order_list)
+        order_list = [item for item in order_list if is_order_changed(item, known_updated)]
+        print(f"🔎 변경된 주문 {len(order_list)}건만 상세 조회합니다. (전체 {listed}건)")
     
-    all_rows = []
+    return order_list
+
+def iter_order_details(order_list):
+    """상세 정보를 동시에 조회하면서 끝나는 순서대로 (목록 항목, 상세 JSON)을 내보냄"""
     total = len(order_list)
+    limiter = TokenBucket(FETCH_RATE_PER_SEC, capacity=FETCH_WORKERS)
+    pending = iter(order_list)
+    in_flight = {}
+    done = 0
     
-    for i, item in enumerate(order_list):
-        oid = item['id']
-        print(f"PROGRESS: {i+1}/{total}")
-        print(f"[{i+1}/{total}] 모든 상세 정보 추출 중: {item['code']}")
-        sys.stdout.flush()
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        def submit_next():
+            item = next(pending, None)
+            if item is not None:
+                in_flight[pool.submit(fetch_order_detail, item['id'], limiter)] = item
         
-        try:
-            detail_res = session.get(f"https://bmsapi.breezm.com/order/{oid}/detail", timeout=(5, 15))
-            if detail_res.status_code != 200:
-                 print(f"⚠️ 상세 정보 가져오기 실패 ({oid}): {detail_res.status_code}")
-                 continue
-            d = detail_res.json()
-            
-            # [원래 의도 유지] json_normalize 사용하여 전체 데이터 플랫화
-            flat_data = pd.json_normalize(d)
-            all_rows.append(flat_data)
-            
-            time.sleep(0.05)
-        except Exception as e:
-            print(f"❌ {item['code']} 실패: {e}")
-            
-    # 빈 데이터프레임 제거 및 병합 (FutureWarning 해결)
-    valid_rows = [df for df in all_rows if not df.empty]
-    
-    if not valid_rows:
-        return pd.DataFrame()
+        for _ in range(FETCH_MAX_PENDING):
+            submit_next()
         
-    return pd.concat(valid_rows, ignore_index=True)
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item = in_flight.pop(future)
+                submit_next()
+                done += 1
+                print(f"PROGRESS: {done}/{total}")
+                print(f"[{done}/{total}] 상세 정보 추출 완료: {item['code']}")
+                sys.stdout.flush()
+                
+                try:
+                    d, status_code = future.result()
+                except Exception as e:
+                    print(f"❌ {item['code']} 실패: {e}")
+                    continue
+                if d is None:
+                    print(f"⚠️ 상세 정보 가져오기 실패 ({item['id']}): {status_code}")
+                    continue
+                yield item, d
 
 def get_table_columns(supabase_url, supabase_key, table_name):
     """Supabase 테이블의 현재 컬럼 목록을 가져옵니다."""
@@ -120,96 +264,322 @@ def get_table_columns(supabase_url, supabase_key, table_name):
         print(f"⚠️ 테이블 컬럼 정보 확인 중 오류: {e}")
     return None
 
-def sync_to_supabase(new_df):
-    supabase = get_supabase_client()
-    if not supabase:
+def get_json_columns(supabase_url, supabase_key, table_name):
+    """PostgREST 스키마(OpenAPI)에서 json/jsonb 타입 컬럼 목록을 가져옵니다. 확인하지 못하면 None"""
+    url = f"{supabase_url}/rest/v1/"
+    headers = {
+        "apikey": supabase_key,
+        "Authorization": f"Bearer {supabase_key}",
+        "Accept": "application/openapi+json"
+    }
+    try:
+        response = requests.get(url, headers=headers, timeout=(10, 30))
+        if response.status_code == 200:
+            props = response.json().get("definitions", {}).get(table_name, {}).get("properties", {})
+            return {name for name, p in props.items() if p.get("format") in ("json", "jsonb")}
+        print(f"⚠️ 테이블 타입 정보를 가져오지 못했습니다. (HTTP {response.status_code})")
+    except Exception as e:
+        print(f"⚠️ 테이블 타입 정보 확인 중 오류: {e}")
+    return None
+
+def _clean_scalar(v):
+    """셀 하나에 대한 원래 정리 규칙 (벡터 처리에서 빠지는 드문 타입용)"""
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return None
+    if isinstance(v, str) and (v.strip().lower() == "nan" or v == ""):
+        return None
+    # 소수점(.0) 제거 (Id가 포함된 컬럼이거나 실제 정수로 끝나는 숫자 값들)
+    val_str = str(v)
+    if val_str.endswith('.0') and val_str[:-2].isdigit():
+        return val_str[:-2]
+    return v
+
+def stringify_column(s, json_mode=None):
+    """리스트/딕셔너리는 문자열로, 긴 문자열은 MAX_CELL_LENGTH에서 자르고 타입을 다시 추론
+    (기존 Series.apply(clean_cell)과 같은 결과: 예) [1, None] 컬럼은 float로 바뀜)
+    json_mode: "native"면 리스트/딕셔너리를 그대로(jsonb 컬럼), "text"면 JSON 문자열로 (자르지 않음)"""
+    if s.dtype != object or json_mode == "native":
+        return s
+    types = s.map(type)
+    is_container = types.isin([list, dict])
+    if json_mode == "text":
+        if is_container.any():
+            s = s.copy()
+            s[is_container] = s[is_container].map(to_json_text)
+        return s.infer_objects()
+    if is_container.any():
+        s = s.copy()
+        s[is_container] = s[is_container].astype(str)
+        types = s.map(type)
+    is_str = types == str
+    if is_str.any():
+        too_long = s[is_str].str.len() > MAX_CELL_LENGTH
+        if too_long.any():
+            s = s.copy()
+            long_idx = too_long[too_long].index
+            s[long_idx] = s[long_idx].str[:MAX_CELL_LENGTH] + "...(중략)"
+    return s.infer_objects()
+
+def clean_column(s):
+    """stringify_column 결과를 업로드용 값 리스트로 변환 (NaN/빈 문자열 → None, 정수형 '.0' 제거)"""
+    kind = s.dtype.kind
+    if kind in 'iub':
+        return s.tolist()
+    if kind == 'f':
+        values = s.to_numpy()
+        out = s.astype(object).to_numpy()
+        missing = np.isnan(values)
+        # str(1.0) == "1.0" → "1" 과 같은 규칙: 0 이상의 정수값이면서 지수 표기(1e16~)가 아닌 경우
+        with np.errstate(invalid='ignore'):
+            integral = ~missing & (values == np.floor(values)) & ~np.signbit(values) & (values < 1e16)
+        out[missing] = None
+        out[integral] = values[integral].astype(np.int64).astype(str).astype(object)
+        return out.tolist()
+    if kind != 'O':
+        return [_clean_scalar(v) for v in s.astype(object)]
+
+    out = s.to_numpy(dtype=object, copy=True)
+    types = s.map(type)
+    is_str = (types == str).to_numpy()
+    if is_str.any():
+        st = s[is_str]
+        blank = (st.str.strip().str.lower() == "nan") | (st == "")
+        dot_zero = ~blank & st.str.endswith('.0') & st.str[:-2].str.isdigit()
+        vals = st.where(~dot_zero, st.str[:-2]).astype(object)
+        vals[blank] = None
+        out[is_str] = vals.to_numpy()
+    is_none = (types == type(None)).to_numpy()
+    out[is_none] = None
+    # int/bool과 jsonb로 보낼 리스트/딕셔너리는 그대로, 나머지(문자열과 섞인 float 등)만 개별 규칙 적용
+    rest = ~(is_str | is_none | types.isin([int, bool, list, dict]).to_numpy())
+    for i in np.flatnonzero(rest):
+        out[i] = _clean_scalar(out[i])
+    return out.tolist()
+
+def _valid_key_mask(s):
+    """유령 행 판별: None 이거나 공백/'nan' 인 id/code 는 False"""
+    strs = s.astype(str).str.strip()
+    is_none = s.isna() & (strs == "None")
+    return ~(is_none | (strs == "") | (strs.str.lower() == "nan"))
+
+def _json_mode(column, json_columns):
+    if json_columns and column in json_columns:
+        return "native"
+    if column in JSON_COLUMNS:
+        return "text"
+    return None
+
+def clean_records(df, table_columns=None, json_columns=None):
+    """DataFrame → Supabase 업로드용 레코드 리스트 (컬럼 단위 벡터 연산)
+    json_columns: jsonb 타입 컬럼 (리스트/딕셔너리를 그대로 전송)"""
+    # 유령 행 제거: id나 code가 아예 없거나 빈 값이면 버림
+    if 'id' not in df.columns or 'code' not in df.columns:
+        return []
+    # Supabase 테이블에 없는 컬럼은 제외 (유동적 헤더 삭제 대응)
+    keys = [c for c in df.columns if not (table_columns and c not in table_columns)]
+
+    converted = {c: stringify_column(df[c], _json_mode(c, json_columns)) for c in set(keys) | {'id', 'code'}}
+    valid = (_valid_key_mask(converted['id']) & _valid_key_mask(converted['code'])).to_numpy()
+    if not keys:
+        return [{} for _ in range(int(valid.sum()))]
+
+    columns = [clean_column(converted[c][valid]) for c in keys]
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+def get_supabase_session():
+    """Supabase REST 업로드용 세션 (작업 스레드마다 하나: 연결 재사용 + 429/5xx 재시도)"""
+    if not hasattr(_thread_local, "supabase_session"):
+        session = requests.Session()
+        retry_strategy = Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["POST"],  # merge-duplicates upsert라 재전송해도 결과가 같음
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retry_strategy)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "apikey": SUPABASE_KEY,
+            "Authorization": f"Bearer {SUPABASE_KEY}",
+            "Content-Type": "application/json",
+            "Prefer": "return=minimal, resolution=merge-duplicates"
+        })
+        _thread_local.supabase_session = session
+    return _thread_local.supabase_session
+
+class ChunkSizer:
+    """응답 시간과 전송 크기를 보고 다음 묶음 크기를 조절 (빠르면 조금씩 키우고, 느리거나 실패하면 절반으로)"""
+    def __init__(self, initial, minimum=UPSERT_MIN_ROWS, maximum=UPSERT_MAX_ROWS,
+                 target_seconds=UPSERT_TARGET_SECONDS, max_bytes=UPSERT_MAX_BYTES):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = max(minimum, min(maximum, initial))
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def record(self, rows, nbytes, elapsed, ok):
+        with self.lock:
+            if not ok or elapsed > self.target_seconds:
+                size = self.size // 2
+            elif elapsed < self.target_seconds / 2:
+                size = self.size + max(10, self.size // 4)
+            else:
+                size = self.size
+            # 행당 평균 크기로 묶음 전송 크기 상한 적용
+            if rows and nbytes:
+                size = min(size, int(self.max_bytes / (nbytes / rows)))
+            self.size = max(self.minimum, min(self.maximum, size))
+
+def post_chunk(url, chunk):
+    """묶음 하나를 전송하고 결과(성공 여부, 상태 코드, 오류, 크기, 소요 시간)를 돌려줌"""
+    result = {"records": chunk, "ok": False, "status": None, "error": "", "bytes": 0, "elapsed": 0.0}
+    started = time.monotonic()
+    try:
+        body = json.dumps(chunk, ensure_ascii=False, allow_nan=False).encode('utf-8')
+        result["bytes"] = len(body)
+        response = get_supabase_session().post(url, data=body, timeout=(10, 60))
+        result["status"] = response.status_code
+        if response.status_code in [200, 201, 204]:
+            result["ok"] = True
+        else:
+            result["error"] = response.text
+    except Exception as e:
+        result["error"] = str(e)
+    result["elapsed"] = time.monotonic() - started
+    return result
+
+def upsert_records(records, workers=UPSERT_WORKERS, initial_rows=UPSERT_INITIAL_ROWS):
+    """레코드를 여러 묶음으로 나눠 동시에 upsert. 실패한 묶음 목록을 돌려줌 (재전송용)"""
+    url = f"{SUPABASE_URL}/rest/v1/{TARGET_TABLE}"
+    sizer = ChunkSizer(initial_rows)
+    total = len(records)
+    pos = done = 0
+    failed = []
+    in_flight = set()
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pos < total or in_flight:
+            # 동시 전송 수만큼 채워 넣기 (묶음 크기는 직전까지의 응답을 반영)
+            while pos < total and len(in_flight) < workers:
+                chunk = records[pos : pos + sizer.size]
+                pos += len(chunk)
+                in_flight.add(pool.submit(post_chunk, url, chunk))
+            
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                rows = len(result["records"])
+                sizer.record(rows, result["bytes"], result["elapsed"], result["ok"])
+                if result["ok"]:
+                    done += rows
+                    print(f"📦 {done} / {total} 건 처리 완료 (묶음 {rows}건, {result['elapsed']:.1f}초)")
+                else:
+                    print(f"❌ Supabase 데이터 저장 중 오류 (HTTP {result['status']}): {result['error'][:200]}")
+                    failed.append(result)
+                sys.stdout.flush()
+    
+    return failed
+
+def sync_to_supabase(new_df, table_columns, json_columns=None):
+    """주문 묶음 하나를 정리해서 upsert. (전송한 행 수, 끝까지 저장하지 못한 묶음 목록)을 돌려줌"""
+    # 1~2. 셀 정리 및 유령 행 제거 (컬럼 단위 일괄 처리)
+    cleaned_records = clean_records(new_df, table_columns, json_columns)
+
+    # 3. 데이터 분할 및 Upsert 전송 (동시 전송 + 묶음 크기 자동 조절)
+    failed = upsert_records(cleaned_records)
+    
+    # 실패한 묶음은 작은 단위로 한 번 더 순차 전송 (일시 오류 복구 + 문제 행 범위 좁히기)
+    if failed:
+        retry_records = [r for chunk in failed for r in chunk["records"]]
+        print(f"🔁 실패한 {len(failed)}개 묶음({len(retry_records)}건)을 다시 전송합니다...")
+        failed = upsert_records(retry_records, workers=1, initial_rows=UPSERT_MIN_ROWS)
+    
+    for chunk in failed:
+        codes = [r.get('code') for r in chunk["records"]]
+        print(f"   - 저장 실패: {codes[0]} ~ {codes[-1]} ({len(codes)}건, HTTP {chunk['status']}): {chunk['error'][:200]}")
+    return len(cleaned_records), failed
+
+def run_sync(start_date, delta=False):
+    """수집과 저장을 겹쳐서 진행: SYNC_BATCH_ROWS건씩 모이는 대로 업로드 큐에 넣고,
+    별도 업로드 스레드가 upsert하고 동기화 기록을 갱신하는 동안 상세 조회는 계속 진행.
+    중간에 멈춰도 그때까지 저장된 주문은 DB와 기록에 남음"""
+    if not get_supabase_client():
         print("❌ Supabase 환경 변수가 설정되지 않았습니다.")
         return
-        
+    
+    state = load_sync_state()
+    synced_at = datetime.now().isoformat()
+    
+    order_list = fetch_order_list(start_date, known_updated=state["orders"] if delta else None)
+    if not order_list:
+        if order_list is not None and delta:
+            print("✅ 변경된 주문이 없습니다.")
+        return
+    
     # 0. 현재 Supabase 테이블의 컬럼 정보 확인
     table_columns = get_table_columns(SUPABASE_URL, SUPABASE_KEY, TARGET_TABLE)
     if table_columns:
         print(f"✅ Supabase 테이블에서 {len(table_columns)}개의 컬럼을 확인했습니다.")
     else:
         print("⚠️ 테이블 컬럼 정보를 확인할 수 없어 필터링 없이 진행합니다.")
-
-    # 1. 리스트 및 딕셔너리 형태를 문자열로 변환하고 글자 수 제한(30,000자) 걸기
-    def clean_cell(x):
-        if isinstance(x, (list, dict)): val = str(x)
-        else: val = x
-        if isinstance(val, str) and len(val) > 30000:
-            return val[:30000] + "...(중략)"
-        return val
-
-    for col in new_df.columns:
-        new_df[col] = new_df[col].apply(clean_cell)
-
-    # 2. 레코드 형태 변환 및 NaN/빈 문자열 처리
-    import math
-    records = new_df.to_dict('records')
-    cleaned_records = []
-    
-    for row in records:
-        # 1. 유령 행 제거: id나 code가 아예 없거나 빈 값이면 버림
-        if 'id' not in row or 'code' not in row:
-            continue
-            
-        r_id = row['id']
-        r_code = row['code']
-        if r_id is None or str(r_id).strip() == "" or str(r_id).strip().lower() == "nan":
-            continue
-        if r_code is None or str(r_code).strip() == "" or str(r_code).strip().lower() == "nan":
-            continue
-            
-        clean_row = {}
-        for k, v in row.items():
-            # Supabase 테이블에 없는 컬럼은 제외 (유동적 헤더 삭제 대응)
-            if table_columns and k not in table_columns:
-                continue
-                
-            if v is None or (isinstance(v, float) and math.isnan(v)):
-                clean_row[k] = None
-            elif isinstance(v, str) and (v.strip().lower() == "nan" or v == ""):
-                clean_row[k] = None
-            else:
-                # 2. 소수점(.0) 제거 (Id가 포함된 컬럼이거나 실제 정수로 끝나는 숫자 값들)
-                val_str = str(v)
-                if val_str.endswith('.0') and val_str[:-2].isdigit():
-                    clean_row[k] = val_str[:-2]
-                else:
-                    clean_row[k] = v
-                    
-        cleaned_records.append(clean_row)
-
-    # 3. 데이터 분할 및 Upsert 전송
-    import requests
-    url = f"{SUPABASE_URL}/rest/v1/{TARGET_TABLE}"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "return=minimal, resolution=merge-duplicates"
-    }
-
+    # jsonb 컬럼은 리스트/딕셔너리 그대로, 아직 text인 JSON 컬럼은 JSON 문자열로 저장
+    json_columns = get_json_columns(SUPABASE_URL, SUPABASE_KEY, TARGET_TABLE)
+    if json_columns:
+        print(f"✅ jsonb 컬럼 {len(json_columns)}개는 JSON 그대로 저장합니다: {', '.join(sorted(json_columns))}")
+    
+    print(f"\n🧹 수집하는 대로 {SYNC_BATCH_ROWS}건씩 Supabase에 저장(Upsert)합니다...")
+    batch = []
+    saved = failed_rows = 0
+    
+    def flush(rows):
+        nonlocal saved, failed_rows
+        try:
+            # [원래 의도 유지] json_normalize와 같은 규칙으로 전체 데이터 플랫화
+            df = pd.DataFrame([build_order_row(d) for d in rows])
+            sent, failed = sync_to_supabase(df, table_columns, json_columns)
+        except Exception as e:
+            print(f"❌ Supabase 데이터 전송 오류 발생: {e}")
+            failed_rows += len(rows)
+            return
+        failed_ids = {str(r.get('id')) for chunk in failed for r in chunk["records"]}
+        failed_count = sum(len(chunk["records"]) for chunk in failed)
+        failed_rows += failed_count
+        saved += sent - failed_count
+        record_synced_orders(state, df, failed_ids)
+        save_sync_state(state)
+    
+    # 업로드 스레드: 큐에서 묶음을 꺼내 저장 (동기화 기록도 이 스레드에서만 갱신)
+    upload_queue = queue.Queue(maxsize=UPLOAD_QUEUE_BATCHES)
+    def upload_worker():
+        while True:
+            rows = upload_queue.get()
+            if rows is None:
+                return
+            flush(rows)
+    
+    uploader = threading.Thread(target=upload_worker, name="supabase-upload", daemon=True)
+    uploader.start()
     try:
-        print("\n🧹 Supabase에 데이터를 저장(Upsert)합니다...")
-        
-        chunk_size = 100
-        total = len(cleaned_records)
-        
-        for i in range(0, total, chunk_size):
-            chunk = cleaned_records[i : i + chunk_size]
-            response = requests.post(url, headers=headers, json=chunk)
-            if response.status_code in [200, 201, 204]:
-                print(f"📦 {min(i + chunk_size, total)} / {total} 건 처리 완료")
-            else:
-                print(f"❌ Supabase 데이터 저장 중 오류 (HTTP {response.status_code}): {response.text}")
-            time.sleep(0.5)
-            
-        print(f"\n✅ 동기화 완료! 총 {total}건의 데이터가 성공적으로 저장되었습니다.")
-        
-    except Exception as e:
-        print(f"❌ Supabase 데이터 전송 오류 발생: {e}")
+        for _, d in iter_order_details(order_list):
+            batch.append(d)
+            if len(batch) >= SYNC_BATCH_ROWS:
+                upload_queue.put(batch)
+                batch = []
+        if batch:
+            upload_queue.put(batch)
+    finally:
+        # 남은 묶음까지 저장이 끝날 때까지 기다림
+        upload_queue.put(None)
+        uploader.join()
+    
+    if failed_rows:
+        print(f"\n⚠️ 동기화 일부 실패: {failed_rows}건을 저장하지 못했습니다. (저장 완료 {saved}건)")
+    else:
+        print(f"\n✅ 동기화 완료! 총 {saved}건의 데이터가 성공적으로 저장되었습니다.")
+        save_sync_state(state, synced_at)
 
 
 if __name__ == "__main__":
@@ -224,31 +594,32 @@ if __name__ == "__main__":
             start_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
             print(f"🔄 최근 3개월 데이터 업데이트 시작 ({start_date} ~)")
         elif mode == "all":
-            start_date = "2024-08-01"
+            start_date = FULL_START_DATE
             print(f"🔄 전체 데이터 업데이트 시작 ({start_date} ~)")
+        elif mode == "delta":
+            start_date = FULL_START_DATE
+            print(f"🔄 변경분 데이터 업데이트 시작 ({start_date} ~, 마지막 동기화: {load_sync_state()['last_sync'] or '없음'})")
         else:
-            print("❌ 잘못된 모드입니다. (1week, 3months, all 중 선택)")
+            print("❌ 잘못된 모드입니다. (1week, 3months, all, delta 중 선택)")
             sys.exit(1)
             
-        df = fetch_full_data(start_date)
-        if not df.empty:
-            sync_to_supabase(df)
+        run_sync(start_date, delta=(mode == "delta"))
             
     # 인자가 없으면 대화형 모드 (기존 방식)
     else:
-        print("1. 최근데이터(3달) 2. 전체데이터(2024-08-01) 3. 최근 1주일")
+        print("1. 최근데이터(3달) 2. 전체데이터(2024-08-01) 3. 최근 1주일 4. 변경분만(delta)")
         choice = input("선택: ")
         
         if choice == '1':
             start = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
         elif choice == '2':
-            start = "2024-08-01"
+            start = FULL_START_DATE
         elif choice == '3':
             start = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+        elif choice == '4':
+            start = FULL_START_DATE
         else:
             print("잘못된 선택입니다.")
             sys.exit(1)
         
-        df = fetch_full_data(start)
-        if not df.empty:
-            sync_to_supabase(df)
\ No newline at end of file
+        run_sync(start, delta=(choice == '4'))
\ No newline at end of file
@@ -0,0 +1,33 @@
+import ast
+import json
+
+# ==========================================
+# 리스트/딕셔너리가 들어 있는 주문 컬럼 공용 처리
+# 동기화(bms_full_sync)는 이 컬럼들을 JSON으로 저장 (jsonb 컬럼이면 그대로, text 컬럼이면 JSON 문자열)
+# 예전에 str(x)로 저장된 파이썬 표현("['a', 'b']")도 읽을 수 있도록 parse_json_value에서 함께 처리
+# ==========================================
+JSON_COLUMNS = ["lens.left.skus", "lens.right.skus", "customer.contacts", "orderItems", "reservationId"]
+
+def parse_json_value(value, default=None):
+    """컬럼 값 → 리스트/딕셔너리.
+    jsonb로 받은 값은 그대로, JSON 문자열은 json.loads, 예전 파이썬 표현 문자열은 literal_eval.
+    빈 값이거나 해석할 수 없으면 default"""
+    if isinstance(value, (list, dict)):
+        return value
+    if not isinstance(value, str):
+        return default
+    text = value.strip()
+    if not text or text[0] not in "[{":
+        return default
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return default
+
+def to_json_text(value):
+    """리스트/딕셔너리 → text 컬럼에 저장할 JSON 문자열 (jsonb로 바로 변환 가능한 형식)"""
+    return json.dumps(value, ensure_ascii=False, default=str)
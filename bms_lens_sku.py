@@ -0,0 +1,160 @@
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+import pandas as pd
+from dotenv import load_dotenv
+from supabase import create_client
+from bms_json_columns import parse_json_value
+
+# ==========================================
+# [설정 구간]
+# 렌즈 SKU 목록 → 표시 이름 공용 변환기
+# 1순위: lens_mappings 테이블에 직접 등록한 이름, 2순위: 규칙 기반 변환
+# 주문 수만 건이 수백 종류의 SKU 조합을 반복하므로 원본 문자열 단위로 캐시
+# ==========================================
+load_dotenv()
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+MAPPING_TABLE = "lens_mappings"
+
+# 매핑 테이블 재조회 주기(초) / 변환 결과 캐시 크기
+MAPPING_TTL = 600
+SKU_CACHE_SIZE = 4096
+# ==========================================
+
+REFRACTIVE_INDEX_PATTERN = re.compile(r'^1\.[5-9]\d*$')
+OPTION_PREFIX_PATTERN = re.compile(r'^(zeiss-[a-z]+-|nikon-[a-z]+-|chemi-[a-z]+-|varilux-[a-z]+-|tokai-[a-z]+-|dagas-[a-z]+-|so-[a-z]+-|el-[a-z]+-|airtable-[a-z]+-|baseColor_|mirrorColor_)', flags=re.IGNORECASE)
+SPACES_PATTERN = re.compile(r'\s+')
+
+LENS_BRANDS = {
+    "zeiss": "자이스", "nikon": "니콘", "chemi": "케미",
+    "varilux": "바리락스", "breezm": "브리즘", "tokai": "토카이",
+    "essilor": "에실로", "dagas": "다가스", "eloptical": "이엘옵티컬",
+    "sundayoptical": "선데이옵티컬", "airtable": "에어테이블"
+}
+LENS_NAMES = {
+    "clw": "클리어뷰", "clwrx": "클리어뷰Rx", "sl": "스마트라이프", "sv": "단초점",
+    "drvs": "드라이브세이프", "drvsrx": "드라이브세이프Rx", "myocare": "마이오케어",
+    "dg": "디지털", "sldg": "스마트라이프 디지털",
+    "seemxinf": "씨맥스 인피니트", "seemxmsz": "씨맥스", "seemxutz": "씨맥스",
+    "rlxneo": "릴랙씨 네오", "rlxneopl": "릴랙씨 네오", "myse": "마이씨", "bluvpl": "블루라이트 플러스",
+    "prspz": "프레지오", "hno": "홈앤오피스", "solwn": "솔테스", "solwp": "솔테스",
+    "dfree": "디프리", "asp": "비구면", "aspxdrv": "엑스드라이브", "asprx": "비구면Rx",
+    "mfcds": "매직폼", "mfxt": "매직폼XT", "mffrs": "매직폼", "mfst": "매직폼",
+    "phys": "피지오", "physf": "피지오", "cmfmx": "컴포트 맥스", "cmfmxf": "컴포트 맥스",
+    "xrf": "XR", "xrd": "XR", "lbrtyf": "리버티", "lbrty": "리버티",
+    "stellest": "스텔리스트", "hr": "HR"
+}
+LENS_COATINGS = {
+    "bgdp": "BGDP", "purebl": "퓨어블루", "perfect": "퍼펙트UV",
+    "dp": "DP", "dd": "드라이브세이프", "pf": "포토퓨전 변색",
+    "gens": "트랜지션스 GenS", "gen8": "트랜지션스 Gen8",
+    "xtractive": "엑스트라액티브", "ush": "USH", "etcuv": "ETC UV",
+    "innermt": "내면MT", "seeuv": "SEE UV", "seecoat": "씨코트",
+    "bluv": "블루라이트", "seeuvbluv": "블루라이트", "nir": "근적외선", 
+    "photoaid": "포토에이드 변색", "varsity": "바시티 변색", 
+    "crizalprevencia": "프리벤시아", "crizalrock": "크리잘락", 
+    "prism": "프리즘", "bp": "BP", "xdrive": "엑스드라이브", "dvsun": "DV선"
+}
+LENS_COLORS = {
+    "brown": "브라운", "gray": "그레이", "grey": "그레이",
+    "green": "그린", "pioneer": "파이오니어", "black": "블랙",
+    "sapphire": "사파이어", "cocoa brown": "코코아브라운",
+    "ice gray": "아이스그레이", "camel brown": "카멜브라운",
+    "shadow orange": "섀도우오렌지", "khaki brown": "카키브라운"
+}
+
+_mapping_lock = threading.Lock()
+_mapping_cache = {"loaded_at": 0.0, "data": {}}
+
+def load_lens_mappings():
+    """lens_mappings {sku_key: custom_name} (MAPPING_TTL 동안 재사용)"""
+    with _mapping_lock:
+        if time.time() - _mapping_cache["loaded_at"] < MAPPING_TTL:
+            return _mapping_cache["data"]
+        data = {}
+        if SUPABASE_URL and SUPABASE_KEY:
+            try:
+                response = create_client(SUPABASE_URL, SUPABASE_KEY).table(MAPPING_TABLE).select("sku_key, custom_name").execute()
+                data = {item['sku_key']: item['custom_name'] for item in (response.data or [])}
+            except Exception as e:
+                print(f"렌즈 매핑 로드 실패: {e}")
+                data = _mapping_cache["data"]
+        _mapping_cache.update(loaded_at=time.time(), data=data)
+        return data
+
+def clear_lens_mappings():
+    """매핑을 새로 저장한 뒤 호출: 다음 변환 때 바로 다시 조회"""
+    with _mapping_lock:
+        _mapping_cache["loaded_at"] = 0.0
+
+@lru_cache(maxsize=SKU_CACHE_SIZE)
+def _decode(raw):
+    """원본 SKU 문자열 → (lens_mappings 조회 키, 규칙 기반 표시 이름). 같은 문자열은 한 번만 계산"""
+    try:
+        s_list = parse_json_value(raw)
+        if isinstance(s_list, list) and s_list:
+            key = str(s_list)
+            main_sku = str(s_list[0])
+            options = [str(x) for x in s_list[1:]]
+
+            parts = main_sku.split('-')
+            brand_key = parts[0].lower() if len(parts) > 0 else ""
+            brand_name = f"[{LENS_BRANDS.get(brand_key, parts[0])}]" if brand_key else ""
+
+            idx_pos = -1
+            for i, p in enumerate(parts):
+                if REFRACTIVE_INDEX_PATTERN.match(p):
+                    idx_pos = i; break
+
+            refractive_index = parts[idx_pos] if idx_pos != -1 else ""
+
+            mid_parts = parts[1:idx_pos] if idx_pos != -1 else parts[1:]
+            l_type = ""
+            l_name = ""
+
+            if len(mid_parts) > 0:
+                l_type = mid_parts[0]
+                if len(mid_parts) > 1:
+                    raw_name = "-".join(mid_parts[1:]).lower()
+                    l_name = LENS_NAMES.get(raw_name, "-".join(mid_parts[1:]))
+                else:
+                    l_name = LENS_NAMES.get(l_type.lower(), l_type)
+
+            type_str = f"({l_type})" if l_type else ""
+            main_str = f"{brand_name} {l_name}{type_str} {refractive_index}".strip()
+            main_str = SPACES_PATTERN.sub(' ', main_str)
+
+            opt_strs = []
+            for opt in options:
+                o = OPTION_PREFIX_PATTERN.sub('', opt)
+                o_lower = o.lower()
+                if o_lower in LENS_COATINGS: opt_strs.append(LENS_COATINGS[o_lower])
+                elif o_lower in LENS_COLORS: opt_strs.append(LENS_COLORS[o_lower])
+                elif "golf" in o_lower: opt_strs.append("골프")
+                elif o_lower and o_lower != "nan": opt_strs.append(o)
+
+            unique_opts = list(dict.fromkeys(opt_strs))
+            opt_str = ", ".join(unique_opts)
+
+            if opt_str: return key, f"{main_str} / {opt_str}"
+            return key, main_str
+
+    except Exception: return None, raw
+    return None, raw
+
+def decode_lens_skus(skus_data, mappings=None):
+    """렌즈 SKU 목록(문자열 또는 리스트) → 표시 이름. 예) "[자이스] 클리어뷰(sv) 1.60 / BGDP"
+    mappings를 넘기지 않으면 load_lens_mappings() 사용"""
+    if skus_data is None or (pd.api.types.is_scalar(skus_data) and pd.isna(skus_data)):
+        return ""
+    if str(skus_data).lower() == 'nan' or (isinstance(skus_data, str) and skus_data == ""):
+        return ""
+    key, name = _decode(str(skus_data))
+    if key is None:
+        return name
+    if mappings is None:
+        mappings = load_lens_mappings()
+    return mappings.get(key, name)
@@ -4,7 +4,9 @@ import altair as alt
 import os
 import numpy as np
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from bms_order_store import load_orders, invalidate_store, data_version
+from bms_json_columns import parse_json_value
+from bms_contacts import format_contacts
 from datetime import datetime, timedelta
 
 # ==========================================
@@ -19,19 +21,36 @@ load_dotenv()
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 TARGET_TABLE = "bms_orders"
+YOUTH_MAX_AGE = 17  # 만 나이 기준 청소년 상한
 
 # ==========================================
 # [3. 데이터 로드 함수]
 # ==========================================
+def youth_birth_year_from(today=None):
+    """만 YOUTH_MAX_AGE세 이하일 수 있는 가장 이른 출생 연도 (이보다 앞이면 이미 상한+1세 이상)"""
+    today = pd.Timestamp.today() if today is None else pd.Timestamp(today)
+    return today.year - (YOUTH_MAX_AGE + 1)
+
+def build_youth_filters(birth_year_from, sim_only=False):
+    """process_myopia_data의 나이/억제렌즈 조건을 저장소 조회 단계로 (줄인 결과를 pandas에서 한 번 더 확인)
+    생년월일 형식(YYYY-MM-DD, YYYY.MM.DD, 시간/시간대 포함 등)이 섞여 있어도 빠지는 청소년이 없도록
+    연도 단위로만 거르고, 연도로 시작하지 않는 값은 그대로 넘겨 calculate_ages로 판단 (NULL은 제외)"""
+    filters = [("year_gte", "customer.birthday", birth_year_from)]
+    if sim_only:
+        filters.append(("or", None, [
+            ("contains_ci", "lens.left.skus", "sim"),
+            ("contains_ci", "lens.right.skus", "sim"),
+        ]))
+    return filters
+
 @st.cache_data(ttl=600, show_spinner=False)
-def load_data():
+def load_data(birth_year_from, sim_only=False):
+    """청소년일 수 있는(출생 연도 birth_year_from 이후) 주문만 읽음. sim_only면 근시 억제(sim) 렌즈 주문만"""
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
             st.error("Supabase 설정이 누락되었습니다.")
             return pd.DataFrame()
         
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
         COLS = [
             "id", "createdAt", "lensType",
             '"customer.name"', '"customer.birthday"', '"customer.contacts"',
@@ -39,24 +58,10 @@ def load_data():
             '"optometry.data.optimal.left.sph"', '"optometry.data.optimal.left.cyl"', '"optometry.data.optimal.left.axi"',
             '"optometry.data.optimal.right.sph"', '"optometry.data.optimal.right.cyl"', '"optometry.data.optimal.right.axi"'
         ]
-        cols = ",".join(COLS)
-        
-        offset = 0
-        page_size = 1000
-        all_data = []
+        # 공용 로컬 저장소에서 읽기 (변경된 주문만 Supabase에서 받아 반영)
         loading_text = st.empty()
+        return load_orders(COLS, filters=build_youth_filters(birth_year_from, sim_only), loading_text=loading_text)
         
-        while True:
-            loading_text.text(f"⏳ 데이터 로드 중... ({offset}건)")
-            response = supabase.table(TARGET_TABLE).select(cols).order("id").range(offset, offset + page_size - 1).execute()
-            data = response.data
-            if not data: break
-            all_data.extend(data)
-            if len(data) < page_size: break
-            offset += page_size
-            
-        loading_text.empty()
-        return pd.DataFrame(all_data) if all_data else pd.DataFrame()
     except Exception as e:
         st.error(f"데이터 로드 오류: {e}")
         return pd.DataFrame()
@@ -71,33 +76,43 @@ def safe_float(value):
     except:
         return 0.0
 
-def calculate_age(birthday_str):
-    if not birthday_str or pd.isna(birthday_str): return None
-    try:
-        bday_dt = pd.to_datetime(str(birthday_str).split('T')[0])
-        today = pd.Timestamp.today()
-        return today.year - bday_dt.year - ((today.month, today.day) < (bday_dt.month, bday_dt.day))
-    except: return None
+def calculate_ages(birthdays, today=None):
+    """생년월일 컬럼 → 만 나이 (날짜 부분만 사용, 해석할 수 없으면 NaN)
+    대부분인 ISO 형식은 한 번에 변환하고, 나머지 형식만 값별로 해석"""
+    today = pd.Timestamp.today() if today is None else pd.Timestamp(today)
+    text = birthdays.where(birthdays.notna(), "").astype(str).str.split('T').str[0].str.strip()
+    bday = pd.to_datetime(text, format='ISO8601', errors='coerce')
+    retry = bday.isna() & (text != "")
+    if retry.any():
+        bday[retry] = pd.to_datetime(text[retry], format='mixed', errors='coerce')
+    before_birthday = (bday.dt.month > today.month) | ((bday.dt.month == today.month) & (bday.dt.day > today.day))
+    return (today.year - bday.dt.year - before_birthday).where(bday.notna())
+
+def contact_key(contacts):
+    """환자 구분용 연락처: 저장 형식(JSON / 예전 파이썬 표현)과 관계없이 같은 고객이면 같은 값
+    전화번호가 있으면 전화번호, 없으면 해석한 목록의 문자열"""
+    return format_contacts(parse_json_value(contacts, default=contacts))
 
 def process_myopia_data(df):
     if df.empty: return pd.DataFrame(), pd.DataFrame()
     
-    df['age'] = df['customer.birthday'].apply(calculate_age)
-    df_youth = df[df['age'] <= 17].copy()
+    df['age'] = calculate_ages(df['customer.birthday'])
+    df_youth = df[df['age'] <= YOUTH_MAX_AGE].copy()
+    if df_youth.empty: return pd.DataFrame(), pd.DataFrame()
+    df_youth['age'] = df_youth['age'].astype(int)
     
-    def is_myopia_control(row):
-        l_skus = str(row.get('lens.left.skus', '')).lower()
-        r_skus = str(row.get('lens.right.skus', '')).lower()
-        return 'sim' in l_skus or 'sim' in r_skus
-        
-    df_youth['is_myopia_control'] = df_youth.apply(is_myopia_control, axis=1)
+    df_youth['is_myopia_control'] = (
+        df_youth['lens.left.skus'].astype(str).str.lower().str.contains('sim', regex=False) |
+        df_youth['lens.right.skus'].astype(str).str.lower().str.contains('sim', regex=False)
+    )
+    df_youth['contact_key'] = df_youth['customer.contacts'].map(contact_key)
     df_myopia_control = df_youth[df_youth['is_myopia_control']].copy()
 
     def format_row(row):
         createdAt = row.get('createdAt', '')
         date_dt = pd.to_datetime(createdAt, errors='coerce')
         return {
-            'uid': f"{row.get('customer.name', '')}_{row.get('customer.contacts', '')}",
+            'uid': f"{row.get('customer.name', '')}_{row.get('contact_key', '')}",
             '이름': row.get('customer.name', ''),
             '나이': row.get('age', ''),
             '생년월일': row.get('customer.birthday', ''),
@@ -120,11 +135,15 @@ def process_myopia_data(df):
 # ==========================================
 # [5. 시각화 로직 - 논문 억제율 반영 및 연간 -0.80D 기준]
 # ==========================================
-def draw_eye_chart(user_df, side, birthday, age, efficacy_rate, lens_name):
-    user_df = user_df.sort_values('date_obj')
+# 시뮬레이션 간격: 정확히 반년 단위
+HALF_YEAR = timedelta(days=182.5)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def eye_chart_data(_user_df, uid, side, birthday, age, efficacy_rate, lens_name, version):
+    """차트용 데이터 (df_plot, timeline). (uid, 눈, 억제율, 데이터 버전)마다 한 번만 계산"""
+    user_df = _user_df.sort_values('date_obj')
     first_visit = user_df.iloc[0]['date_obj']
     base_sph = user_df.iloc[0][f'{side} SPH']
-    side_name = "우안(R)" if side == 'R' else "좌안(L)"
     
     # --- 근시 진행 상수 설정 (원장님 지정) ---
     # 일반 단초점 렌즈 착용 시 평균 진행: 연간 -0.80D (6개월당 -0.40D)
@@ -144,27 +163,27 @@ def draw_eye_chart(user_df, side, birthday, age, efficacy_rate, lens_name):
         bday_dt = first_visit - timedelta(days=365 * (age if age else 10))
     stop_date = bday_dt + timedelta(days=365 * 16)
     
-    timeline = []
-    curr = first_visit
-    while curr <= stop_date:
-        timeline.append(curr)
-        curr += timedelta(days=182.5) # 정확히 반년 단위
+    # 첫 방문부터 16세까지 반년 간격 타임라인 (경과 개월은 날짜 차이의 일수 기준)
+    steps = 0 if pd.isna(first_visit) or pd.isna(stop_date) or stop_date < first_visit else (stop_date - first_visit) // HALF_YEAR + 1
+    offsets = np.arange(steps) * HALF_YEAR.total_seconds()
+    timeline = list(first_visit + pd.to_timedelta(offsets, unit='s'))
+    half_years = np.floor(offsets / 86400) / 182.5
     
-    plot_data = []
-    for dt in timeline:
-        half_years = (dt - first_visit).days / 182.5
-        
-        # 시뮬레이션 계산
-        norm_sph = base_sph + (half_years * NORMAL_PROG_6MO)
-        exp_sph = base_sph + (half_years * TREATED_PROG_6MO)
-        
-        plot_data.append({'날짜': dt, 'SPH': norm_sph, '구분': '일반 단초점 예상 (연 -0.80D)', '유형': '시뮬레이션'})
-        plot_data.append({'날짜': dt, 'SPH': exp_sph, '구분': f'{lens_name} 방어선', '유형': '시뮬레이션'})
-
-    for _, r in chart_real_df.iterrows():
-        plot_data.append({'날짜': r['date_obj'], 'SPH': r[f'{side} SPH'], '구분': '실제 검안기록', '유형': '실제'})
-    
-    df_plot = pd.DataFrame(plot_data)
+    # 시뮬레이션 계산 (+ 실제 기록)
+    parts = [
+        pd.DataFrame({'날짜': timeline, 'SPH': base_sph + half_years * NORMAL_PROG_6MO,
+                      '구분': '일반 단초점 예상 (연 -0.80D)', '유형': '시뮬레이션'}),
+        pd.DataFrame({'날짜': timeline, 'SPH': base_sph + half_years * TREATED_PROG_6MO,
+                      '구분': f'{lens_name} 방어선', '유형': '시뮬레이션'}),
+        pd.DataFrame({'날짜': chart_real_df['date_obj'], 'SPH': chart_real_df[f'{side} SPH'],
+                      '구분': '실제 검안기록', '유형': '실제'}),
+    ]
+    df_plot = pd.concat([p for p in parts if not p.empty], ignore_index=True)
+    return df_plot, timeline
+
+def draw_eye_chart(user_df, side, birthday, age, efficacy_rate, lens_name, uid, version):
+    side_name = "우안(R)" if side == 'R' else "좌안(L)"
+    df_plot, timeline = eye_chart_data(user_df, uid, side, birthday, age, efficacy_rate, lens_name, version)
     
     # Y축 0.25 단위 눈금 설정
     y_min, y_max = df_plot['SPH'].min(), df_plot['SPH'].max()
@@ -195,40 +214,83 @@ def draw_eye_chart(user_df, side, birthday, age, efficacy_rate, lens_name):
 # ==========================================
 # [6. 메인 UI]
 # ==========================================
-def get_care_status(data):
-    """lensType==custom 기준 마지막 주문 경과 개월 수로 관리 상태 분류"""
-    custom_data = data[data['lensType'] == 'custom']
-    if custom_data.empty:
-        return None, None
-    last_custom_dt = custom_data['date_obj'].max()
-    if pd.isna(last_custom_dt):
-        return None, None
-    now = pd.Timestamp.utcnow() if last_custom_dt.tzinfo is not None else pd.Timestamp.today()
-    months = (now - last_custom_dt).days / 30.44
-    last_str = last_custom_dt.strftime('%Y-%m-%d')
-    if months <= 3:
-        return "🟢 눈덜나빠지는중", last_str
-    elif months <= 6:
-        return "🟡 중간체크필요", last_str
-    elif months <= 12:
-        return "🟠 효과체크필요", last_str
-    else:
-        return "🔴 이탈주의", last_str
-
-
-def sph_delta_label(data, side):
-    """첫 기록 → 마지막 기록 SPH 변화량 문자열 반환"""
-    col = f'{side} SPH'
-    sorted_d = data.sort_values('date_obj')
-    if len(sorted_d) < 2:
-        val = sorted_d.iloc[0][col]
-        return f"{val:+.2f}"
-    first = sorted_d.iloc[0][col]
-    last  = sorted_d.iloc[-1][col]
+CARE_STATUSES = ["🟢 눈덜나빠지는중", "🟡 중간체크필요", "🟠 효과체크필요", "🔴 이탈주의"]
+PROGRESS_NO_DATA = "데이터 부족"
+INACTIVE_MONTHS = 18  # 최근 방문이 이보다 오래되면 이탈 추정
+
+def sph_delta_labels(first, last, visits):
+    """첫 기록 → 마지막 기록 SPH 변화량 문자열 (기록이 1건이면 그 값만)"""
     delta = last - first
-    sign  = "▼" if delta < 0 else ("▲" if delta > 0 else "─")
-    return f"{first:+.2f}→{last:+.2f} ({sign}{abs(delta):.2f})"
+    signs = np.select([delta < 0, delta > 0], ["▼", "▲"], "─")
+    return [
+        f"{f:+.2f}" if n < 2 else f"{f:+.2f}→{l:+.2f} ({sign}{abs(d):.2f})"
+        for f, l, n, d, sign in zip(first, last, visits, delta, signs)
+    ]
 
+@st.cache_data(ttl=600, show_spinner=False)
+def build_user_summary(_df_myopia, version):
+    """근시 억제 렌즈 사용자 uid별 요약 한 표 (최초 접수일 내림차순)
+    최초/최근 방문, 마지막 custom 주문(관리 상태), 양안 SPH 변화, 연간 진행 구분, 지속관리/이탈 여부
+    version: 데이터 버전 + 오늘 날짜 (관리 상태가 오늘 기준이므로 날짜가 바뀌면 다시 계산)"""
+    df = _df_myopia.sort_values(['uid', 'date_obj'], kind='stable', na_position='last')
+    first = df.drop_duplicates('uid', keep='first').set_index('uid')
+    last = df.drop_duplicates('uid', keep='last').set_index('uid')
+    visits = df.groupby('uid').size().reindex(first.index)
+
+    summary = pd.DataFrame({
+        '이름': first['이름'],
+        '나이': last['나이'],
+        '생년월일': first['생년월일'],
+        '최초': first['접수일'],
+        '최근': last['접수일'],
+        '방문': visits,
+    })
+
+    # 관리 상태: lensType == custom 마지막 주문 경과 개월 수
+    last_custom = df[df['lensType'] == 'custom'].groupby('uid')['date_obj'].max().reindex(first.index)
+    now = pd.Timestamp.utcnow() if getattr(last_custom.dt, 'tz', None) is not None else pd.Timestamp.today()
+    months = (now - last_custom).dt.days / 30.44
+    status = np.select([months <= 3, months <= 6, months <= 12], CARE_STATUSES[:3], CARE_STATUSES[3])
+    summary['care_status'] = pd.Series(status, index=first.index).where(last_custom.notna(), None)
+    summary['last_custom_date'] = last_custom.dt.strftime('%Y-%m-%d').where(last_custom.notna(), None)
+
+    # 첫 기록 → 마지막 기록 SPH 변화
+    for side in ('R', 'L'):
+        summary[f'{side}_label'] = sph_delta_labels(first[f'{side} SPH'], last[f'{side} SPH'], visits)
+
+    # 연간 진행 구분 (양안 중 더 진행한(더 음수인) 쪽 기준, 기간 3개월 미만이면 데이터 부족)
+    years = (last['date_obj'] - first['date_obj']).dt.days / 365.25
+    worst_delta = np.minimum(last['R SPH'] - first['R SPH'], last['L SPH'] - first['L SPH'])
+    annual = worst_delta / years
+    summary['진행구분'] = np.select(
+        [visits < 2, years < 0.25, annual > 0, annual >= -0.50],
+        [PROGRESS_NO_DATA, PROGRESS_NO_DATA, "호전/유지 (>0D/년)", "양호 (0~-0.50D/년)"],
+        "진행 (<-0.50D/년)"
+    )
+
+    # 최근 방문 기준 지속 관리 / 이탈 추정 (날짜가 없으면 어느 쪽에도 넣지 않음)
+    now_utc = pd.Timestamp.utcnow()
+    recent = pd.to_datetime(summary['최근'], errors='coerce', utc=True)
+    cutoff = now_utc - pd.DateOffset(months=INACTIVE_MONTHS)
+    summary['active'] = recent >= cutoff
+    summary['inactive'] = recent < cutoff
+    summary['days_ago'] = (now_utc - recent).dt.days.fillna(0).astype(int)
+
+    summary = summary.reset_index()
+    return summary.sort_values('최초', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def render_eye_charts(user, data, eff_rate, lens_label, version):
+    """우안/좌안 시뮬레이션 차트. 접힌 목록마다 차트를 만들지 않도록 토글을 켠 사용자만 그림"""
+    if not st.toggle("📈 시뮬레이션 차트 보기", key=f"chart_toggle_{user['uid']}"):
+        return
+    chart_r = draw_eye_chart(data, 'R', user['생년월일'], user['나이'], eff_rate, lens_label, user['uid'], version)
+    chart_l = draw_eye_chart(data, 'L', user['생년월일'], user['나이'], eff_rate, lens_label, user['uid'], version)
+    col_r, col_l = st.columns(2)
+    with col_r:
+        st.altair_chart(chart_r, use_container_width=True)
+    with col_l:
+        st.altair_chart(chart_l, use_container_width=True)
 
 def main():
     st.title("👁️ 근시관리 통합 대시보드")
@@ -239,17 +301,21 @@ def main():
     col_refresh, col_search, col_lens = st.columns([1, 3, 4])
     with col_refresh:
         if st.button("🔄 새로고침"):
+            invalidate_store()
             st.cache_data.clear()
             st.rerun()
 
-    df_raw = load_data()
+    df_raw = load_data(youth_birth_year_from())
     if df_raw.empty:
         st.info("데이터가 없습니다.")
         return
 
     df_youth, df_myopia = process_myopia_data(df_raw)
+    if df_youth.empty:
+        st.info("대상 청소년 데이터가 없습니다.")
+        return
 
-    # 상단 지표 (이탈 분류는 unique_users 구성 후 계산되므로 여기선 전체 수만)
+    # 상단 지표 (이탈 분류는 사용자 요약 후 계산되므로 여기선 전체 수만)
     m1, m2, m3, m4 = st.columns(4)
     u_count = len(df_youth['uid'].unique())
     m_count = len(df_myopia['uid'].unique()) if not df_myopia.empty else 0
@@ -263,41 +329,21 @@ def main():
     if df_myopia.empty:
         st.info("근시 억제 렌즈 사용자가 없습니다.")
     else:
-        unique_users = []
-        for uid, group in df_myopia.groupby('uid'):
-            group_sorted = group.sort_values('date_obj')
-            earliest = group_sorted.iloc[0]
-            latest   = group_sorted.iloc[-1]
-            care_status, last_custom_date = get_care_status(group_sorted)
-            unique_users.append({
-                'uid': uid,
-                '이름': earliest['이름'],
-                '나이': latest['나이'],
-                '생년월일': earliest['생년월일'],
-                'data': group_sorted,
-                '최초': earliest['접수일'],
-                '최근': latest['접수일'],
-                'care_status': care_status,
-                'last_custom_date': last_custom_date,
-            })
-        unique_users.sort(key=lambda x: x['최초'], reverse=True)
-
-        cutoff = pd.Timestamp.utcnow() - pd.DateOffset(months=18)
-        def _to_utc(s):
-            dt = pd.to_datetime(s, errors='coerce', utc=True)
-            return dt
-        active_users   = [u for u in unique_users if _to_utc(u['최근']) >= cutoff]
-        inactive_users = [u for u in unique_users if _to_utc(u['최근']) <  cutoff]
+        version = f"{data_version(df_raw)}:{pd.Timestamp.today():%Y-%m-%d}"
+        summary = build_user_summary(df_myopia, version)
+        # 사용자별 검안 기록 (날짜순) — 펼친 목록의 표/차트용
+        user_data = dict(tuple(df_myopia.sort_values(['uid', 'date_obj'], kind='stable', na_position='last').groupby('uid')))
+
+        active_users   = summary[summary['active']]
+        inactive_users = summary[summary['inactive']]
 
         # 지표 실제 숫자 업데이트
         m3.metric("지속 관리", f"{len(active_users)}명")
         m4.metric("이탈 추정", f"{len(inactive_users)}명")
 
         # 관리 알림 요약 배너
-        cnt_good   = sum(1 for u in unique_users if u['care_status'] == "🟢 눈덜나빠지는중")
-        cnt_mid    = sum(1 for u in unique_users if u['care_status'] == "🟡 중간체크필요")
-        cnt_effect = sum(1 for u in unique_users if u['care_status'] == "🟠 효과체크필요")
-        cnt_warn   = sum(1 for u in unique_users if u['care_status'] == "🔴 이탈주의")
+        status_counts = summary['care_status'].value_counts()
+        cnt_good, cnt_mid, cnt_effect, cnt_warn = (int(status_counts.get(status, 0)) for status in CARE_STATUSES)
         if cnt_good or cnt_mid or cnt_effect or cnt_warn:
             st.markdown("#### 📋 관리 알림 현황")
             a1, a2, a3, a4, a5 = st.columns(5)
@@ -390,28 +436,7 @@ def main():
             # 차트3: 연간 SPH 변화 분포 (억제렌즈 대상자 기준)
             with ch3:
                 st.markdown("**📉 연간 근시 진행 분포**")
-                _prog_cats = []
-                for _u in unique_users:
-                    _d = _u['data'].sort_values('date_obj')
-                    if len(_d) < 2:
-                        _prog_cats.append("데이터 부족")
-                        continue
-                    _years = (_d.iloc[-1]['date_obj'] - _d.iloc[0]['date_obj']).days / 365.25
-                    if _years < 0.25:
-                        _prog_cats.append("데이터 부족")
-                        continue
-                    # 양안 중 더 진행한(더 음수인) 쪽 기준
-                    _r_delta = _d.iloc[-1]['R SPH'] - _d.iloc[0]['R SPH']
-                    _l_delta = _d.iloc[-1]['L SPH'] - _d.iloc[0]['L SPH']
-                    _annual = min(_r_delta, _l_delta) / _years
-                    if _annual > 0:
-                        _prog_cats.append("호전/유지 (>0D/년)")
-                    elif _annual >= -0.50:
-                        _prog_cats.append("양호 (0~-0.50D/년)")
-                    else:
-                        _prog_cats.append("진행 (<-0.50D/년)")
-
-                _prog_series = pd.Series(_prog_cats)
+                _prog_series = summary['진행구분']
                 _prog_df = _prog_series.value_counts().reset_index()
                 _prog_df.columns = ["구분", "인원"]
                 _total = int(_prog_df[_prog_df["구분"] != "데이터 부족"]["인원"].sum())
@@ -454,21 +479,21 @@ def main():
         with col_search:
             search = st.text_input("🔍 이름 검색", "", placeholder="이름 입력…")
         if search:
-            active_users   = [u for u in active_users   if search in u['이름']]
-            inactive_users = [u for u in inactive_users if search in u['이름']]
+            active_users   = active_users[active_users['이름'].astype(str).str.contains(search, regex=False)]
+            inactive_users = inactive_users[inactive_users['이름'].astype(str).str.contains(search, regex=False)]
 
         # 관리 알림 필터
         if st.session_state.care_filter:
-            active_users   = [u for u in active_users   if u['care_status'] == st.session_state.care_filter]
-            inactive_users = [u for u in inactive_users if u['care_status'] == st.session_state.care_filter]
+            active_users   = active_users[active_users['care_status'] == st.session_state.care_filter]
+            inactive_users = inactive_users[inactive_users['care_status'] == st.session_state.care_filter]
 
         # ── 지속 관리 중
         st.subheader(f"👓 지속 관리 중 ({len(active_users)}명)")
-        for user in active_users:
-            data = user['data']
-            r_label = sph_delta_label(data, 'R')
-            l_label = sph_delta_label(data, 'L')
-            visits   = len(data)
+        for user in active_users.to_dict('records'):
+            data = user_data[user['uid']]
+            r_label = user['R_label']
+            l_label = user['L_label']
+            visits   = user['방문']
             badge = f"  {user['care_status']}" if user['care_status'] else ""
             title = (
                 f"👤 {user['이름']} ({user['나이']}세){badge}　"
@@ -500,27 +525,19 @@ def main():
                 st.caption(f"일반 단초점 기준 연 -0.80D 진행 가정 / {lens_label} 억제율 {int(eff_rate*100)}% 적용")
 
                 # ── 우안 / 좌안 차트 좌우 나란히
-                chart_r = draw_eye_chart(data, 'R', user['생년월일'], user['나이'], eff_rate, lens_label)
-                chart_l = draw_eye_chart(data, 'L', user['생년월일'], user['나이'], eff_rate, lens_label)
-                col_r, col_l = st.columns(2)
-                with col_r:
-                    st.altair_chart(chart_r, use_container_width=True)
-                with col_l:
-                    st.altair_chart(chart_l, use_container_width=True)
+                render_eye_charts(user, data, eff_rate, lens_label, version)
 
         # ── 이탈자
         st.divider()
         st.subheader(f"⚠️ 이탈 추정 ({len(inactive_users)}명)  —  최근 방문 18개월 초과")
-        if not inactive_users:
+        if inactive_users.empty:
             st.info("이탈 추정 인원이 없습니다.")
         else:
-            for user in inactive_users:
-                data = user['data']
-                r_label = sph_delta_label(data, 'R')
-                l_label = sph_delta_label(data, 'L')
-                last_dt  = pd.to_datetime(user['최근'], errors='coerce')
-                last_dt = pd.to_datetime(user['최근'], errors='coerce', utc=True)
-                days_ago = (pd.Timestamp.utcnow() - last_dt).days if pd.notna(last_dt) else 0
+            for user in inactive_users.to_dict('records'):
+                data = user_data[user['uid']]
+                r_label = user['R_label']
+                l_label = user['L_label']
+                days_ago = user['days_ago']
                 badge = f"  {user['care_status']}" if user['care_status'] else ""
                 title = (
                     f"👤 {user['이름']} ({user['나이']}세){badge}　"
@@ -545,13 +562,7 @@ def main():
                         hide_index=True,
                         use_container_width=True,
                     )
-                    chart_r = draw_eye_chart(data, 'R', user['생년월일'], user['나이'], eff_rate, lens_label)
-                    chart_l = draw_eye_chart(data, 'L', user['생년월일'], user['나이'], eff_rate, lens_label)
-                    col_r, col_l = st.columns(2)
-                    with col_r:
-                        st.altair_chart(chart_r, use_container_width=True)
-                    with col_l:
-                        st.altair_chart(chart_l, use_container_width=True)
+                    render_eye_charts(user, data, eff_rate, lens_label, version)
 
 
 if __name__ == "__main__":
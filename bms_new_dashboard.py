@@ -1,8 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
+import re
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import create_client
+from bms_order_store import load_orders, load_distinct_values, invalidate_store, data_version
+from bms_lens_sku import decode_lens_skus
+from bms_contacts import PHONES_COLUMN, format_contacts
 import sys
 import subprocess
 import time
@@ -29,15 +34,39 @@ BMS_MAIN_URL = "https://bms.breezm.com/order"
 # ==========================================
 # [3. 데이터 로드 함수]
 # ==========================================
+STAFF_COLUMNS = ["statusDetail.lensStaff", "statusDetail.frameStaff"]
+
+def build_order_filters():
+    """process_new_data의 기간/상태/주문타입 조건을 저장소 조회 단계로 (줄인 결과를 pandas에서 한 번 더 확인).
+    담당자 조건은 넣지 않음: 담당자를 바꿔도 같은 데이터와 가공 캐시를 쓰고 process_new_data에서만 골라냄"""
+    # 날짜 문자열 형식(시간대) 차이를 감안해 하루 여유를 둠
+    cutoff = (pd.Timestamp.now(tz='UTC') - pd.DateOffset(months=2) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    return [
+        ("gte_or_null", "createdAt", cutoff),
+        ("not_in_ci", "status", ["archived", "delivered"]),
+        ("or", None, [
+            ("in_ci", "frameType", ["custom", "as"]),
+            ("in_ci", "lensType", ["custom", "as"]),
+            ("and", None, [("blank", "frameType", None), ("blank", "lensType", None)]),
+        ]),
+    ]
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_staff_names():
+    try:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            return []
+        return load_distinct_values(STAFF_COLUMNS, loading_text=st.empty())
+    except Exception as e:
+        st.error(f"담당자 목록 로드 중 오류: {e}")
+        return []
+
 @st.cache_data(ttl=600, show_spinner=False)
 def load_data():
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
             return pd.DataFrame()
         
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        all_data = []
-        
         # 배송메모 제거됨
         COLS = [
             "id", "createdAt", "status", "code", "frameType", "lensType",
@@ -50,35 +79,9 @@ def load_data():
             '"data.las.referenceId"', '"data.las.classification"', '"data.las.comment"',
             '"data.fas.referenceId"', '"data.fas.classification"', '"data.fas.comment"'
         ]
-        cols = ",".join(COLS)
-        
-        offset = 0
-        page_size = 1000
+        # 공용 로컬 저장소에서 읽기 (변경된 주문만 Supabase에서 받아 반영)
         loading_text = st.empty()
-        
-        while True:
-            loading_text.text(f"⏳ 전체 과거 데이터를 불러오는 중입니다... ({offset}건 완료)")
-            
-            response = supabase.table(TARGET_TABLE)\
-                .select(cols)\
-                .order("id")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-                
-            data = response.data
-            if not data:
-                break
-                
-            all_data.extend(data)
-            
-            if len(data) < page_size:
-                break 
-                
-            offset += page_size
-            
-        loading_text.empty() 
-        
-        return pd.DataFrame(all_data) if all_data else pd.DataFrame()
+        return load_orders(COLS, filters=build_order_filters(), loading_text=loading_text, optional=[PHONES_COLUMN])
         
     except Exception as e:
         st.error(f"전체 데이터 로드 중 오류: {e}")
@@ -129,9 +132,99 @@ def remove_special_customer(customer_id):
 # ==========================================
 # [4. 데이터 처리 로직 (신규주문)]
 # ==========================================
-def process_new_data(df, selected_staff):
-    if df.empty: return pd.DataFrame()
-    
+# 테 정보 파싱용 정규식과 상태 표시 이름 (매 호출마다 다시 만들지 않도록 모듈 수준에 둠)
+FRAME_PREFIX_PATTERNS = [
+    re.compile(r'^frame_size_', flags=re.IGNORECASE),
+    re.compile(r'^(?:[a-z]+_)?front_color_', flags=re.IGNORECASE),
+    re.compile(r'^front_', flags=re.IGNORECASE),
+    re.compile(r'^temple_(?:[a-z]+_)?(?:temple_color_)?(?:color_)?', flags=re.IGNORECASE),
+]
+
+STATUS_LABELS = {
+    'created': '🆕 주문생성',
+    'payment_completed': '💳 결제완료',
+    'production': '⚙️ 생산중',
+    'shipped': '🚚 배송중',
+    'delivered': '✅ 배송완료',
+    'canceled': '❌ 취소됨',
+    'archived': '📁 보관됨',
+    'ready': '📦 준비완료'
+}
+# 도수 컬럼: (표시 접두어, 단위, 컬럼 접미어)
+OPTOMETRY_FIELDS = [('SPH', 'D', 'sph'), ('CYL', 'D', 'cyl'), ('AXIS', '°', 'axi'), ('ADD', 'D', 'add'), ('PD', 'mm', 'pd')]
+
+# 🌟 헬퍼 함수 2: 테 정보 예쁘게 파싱
+def clean_prefix(val):
+    if pd.isna(val) or str(val).lower() == 'nan': return ""
+    v = str(val).strip()
+    for pattern in FRAME_PREFIX_PATTERNS:
+        v = pattern.sub('', v)
+    return v
+
+# 🌟 헬퍼 함수 3: 상태(Status) 예쁘게 매핑
+def beautify_status(status_val):
+    val = str(status_val).strip().lower()
+    if not val or val == 'nan': return ""
+    # 매핑된 값이 없으면 기본 아이콘과 함께 대문자로 표시
+    return STATUS_LABELS.get(val, f"📌 {status_val.upper()}")
+
+def map_unique(series, func):
+    """같은 값이 반복되는 컬럼은 고유값마다 한 번만 계산 (타입이 다르면 다른 값으로 취급)"""
+    cache = {}
+    out = []
+    for v in series.tolist():
+        try:
+            key = (type(v), v)
+            if key not in cache:
+                cache[key] = func(v)
+            out.append(cache[key])
+        except TypeError:  # 리스트 등 해시 불가 값
+            out.append(func(v))
+    return pd.Series(out, index=series.index, dtype=object)
+
+def phones_column(df, contacts):
+    """동기화 때 저장한 customer.phones를 쓰고, 비어 있는 예전 행만 연락처 원본을 파싱"""
+    if PHONES_COLUMN not in df.columns:
+        return map_unique(contacts, format_contacts)
+    phones = df[PHONES_COLUMN].astype(object).copy()
+    missing = phones.map(lambda v: not isinstance(v, str) or v == "")
+    if missing.any():
+        phones[missing] = map_unique(contacts[missing], format_contacts)
+    return phones
+
+def format_val_column(series, unit, prefix):
+    # format_val의 컬럼 버전: 빈 값/nan은 "", 나머지는 "접두어: 값단위"
+    s_val = series.map(str).str.strip()
+    empty = (s_val == "") | (s_val.str.lower() == "nan")
+    return (prefix + ": " + s_val + unit).where(~empty, "")
+
+def join_nonempty(columns, sep):
+    return pd.Series([sep.join(v for v in values if v) for values in zip(*columns)], index=columns[0].index, dtype=object)
+
+def prefixed(series, prefix):
+    return (prefix + series).where(series != "", "")
+
+def format_dates(series):
+    """접수일 'YYYY-MM-DD'. UTC(Z) 문자열은 한 번에 변환, 나머지는 기존처럼 하나씩"""
+    out = pd.Series("", index=series.index, dtype=object)
+    present = series.map(bool)
+    values = series[present]
+    is_utc = values.map(lambda v: isinstance(v, str) and v.endswith('Z'))
+    fast = pd.to_datetime(values[is_utc], errors='coerce', utc=True)
+    parsed = fast.notna()
+    out[fast.index[parsed]] = fast[parsed].dt.strftime('%Y-%m-%d')
+    slow = values[~is_utc].index.union(fast.index[~parsed])
+    for idx in slow:
+        out[idx] = pd.to_datetime(series[idx], errors='coerce').strftime('%Y-%m-%d')
+    return out
+
+@st.cache_data(ttl=600, show_spinner=False)
+def build_new_table(_df, version):
+    """담당자 선택과 무관한 가공 단계 (전처리, 기간/상태/주문타입 필터, 표 구성).
+    같은 데이터(version)에는 한 번만 실행되고 체크박스 클릭 등으로 재실행될 때는 캐시 사용"""
+    if _df.empty: return pd.DataFrame()
+    df = _df.copy()
+
     # 전처리
     df['id'] = df['id'].astype(str).str.replace(r'\.0$', '', regex=True)
     df = df.fillna("")
@@ -169,276 +262,72 @@ def process_new_data(df, selected_staff):
         
     cond_clipon = cond_empty_frame & cond_empty_lens
     
-    target_df = df[cond_frame | cond_lens | cond_clipon].copy()
-    if target_df.empty: return pd.DataFrame()
-
-    # 조건 2: 담당자 매칭
-    cond_staff1 = False
-    cond_staff2 = False
-    if 'statusDetail.lensStaff' in target_df.columns:
-        cond_staff1 = target_df['statusDetail.lensStaff'].astype(str) == str(selected_staff)
-    if 'statusDetail.frameStaff' in target_df.columns:
-        cond_staff2 = target_df['statusDetail.frameStaff'].astype(str) == str(selected_staff)
-    
-    my_df = target_df[cond_staff1 | cond_staff2].copy()
+    # 담당자 매칭은 process_new_data에서 (이 단계 결과는 담당자 선택과 무관하게 캐시)
+    my_df = df[cond_frame | cond_lens | cond_clipon].copy()
     if my_df.empty: return pd.DataFrame()
 
-    # 헬퍼 함수 1: 전화번호 파싱
-    def parse_contacts(c_data):
-        if not c_data or str(c_data).strip() == "" or str(c_data).lower() == 'nan': 
-            return ""
-        c_str = str(c_data).strip()
-        
-        try:
-            import ast
-            c_list = ast.literal_eval(c_str) if c_str.startswith('[') else c_data
-            if isinstance(c_list, list):
-                phones = []
-                for item in c_list:
-                    if isinstance(item, dict):
-                        val = item.get('data', {}).get('value') if isinstance(item.get('data'), dict) else None
-                        if not val: val = item.get('value')
-                        if val: phones.append(str(val))
-                if phones: return ", ".join(phones)
-        except Exception: pass
-            
-        try:
-            import json
-            clean_str = c_str.replace("'", '"').replace("True", "true").replace("False", "false")
-            c_list = json.loads(clean_str)
-            if isinstance(c_list, list):
-                phones = []
-                for item in c_list:
-                    if isinstance(item, dict):
-                        val = item.get('data', {}).get('value') if isinstance(item.get('data'), dict) else None
-                        if not val: val = item.get('value')
-                        if val: phones.append(str(val))
-                if phones: return ", ".join(phones)
-        except Exception: pass
-            
-        import re
-        phones = re.findall(r"(?:010|02|03[1-3]|04[1-4]|05[1-5]|06[1-4])[-.]?\d{3,4}[-.]?\d{4}", c_str)
-        if phones: return ", ".join(phones)
-        return c_str
-
-    # 🌟 헬퍼 함수 2: 테 정보 예쁘게 파싱
-    def clean_prefix(val):
-        if pd.isna(val) or str(val).lower() == 'nan': return ""
-        v = str(val).strip()
-        import re
-        v = re.sub(r'^frame_size_', '', v, flags=re.IGNORECASE)
-        v = re.sub(r'^(?:[a-z]+_)?front_color_', '', v, flags=re.IGNORECASE)
-        v = re.sub(r'^front_', '', v, flags=re.IGNORECASE)
-        v = re.sub(r'^temple_(?:[a-z]+_)?(?:temple_color_)?(?:color_)?', '', v, flags=re.IGNORECASE)
-        return v
-
-    def build_frame_info(row):
-        size = clean_prefix(row.get('frame.size', ''))
-        color = clean_prefix(row.get('frame.color', ''))
-        front = clean_prefix(row.get('frame.front', ''))
-        temple = clean_prefix(row.get('frame.temple', ''))
-        
-        # 이름 (크기) 🎨 색상 🦵 다리종류
-        res = ""
-        if front: res += f"👓 {front}"
-        if size: res += f" ({size})"
-        if color: res += f" 🎨 {color}"
-        if temple: res += f" 🦵 {temple}"
-        return res.strip()
-
-    # 🌟 헬퍼 함수 3: 상태(Status) 예쁘게 매핑
-    def beautify_status(status_val):
-        val = str(status_val).strip().lower()
-        if not val or val == 'nan': return ""
-        
-        mapping = {
-            'created': '🆕 주문생성',
-            'payment_completed': '💳 결제완료',
-            'production': '⚙️ 생산중',
-            'shipped': '🚚 배송중',
-            'delivered': '✅ 배송완료',
-            'canceled': '❌ 취소됨',
-            'archived': '📁 보관됨',
-            'ready': '📦 준비완료'
-        }
-        # 매핑된 값이 없으면 기본 아이콘과 함께 대문자로 표시
-        return mapping.get(val, f"📌 {status_val.upper()}")
+    # 행 단위(iterrows) 대신 컬럼 단위로 표 구성 (순서가 같아야 정렬 결과도 같으므로 0부터 다시 번호)
+    my_df = my_df.reset_index(drop=True)
+    def col(name):
+        return my_df[name] if name in my_df.columns else pd.Series("", index=my_df.index, dtype=object)
+
+    # 테 정보 예쁘게: 👓 이름 (크기) 🎨 색상 🦵 다리종류
+    size, color, front, temple = (map_unique(col(f'frame.{c}'), clean_prefix) for c in ['size', 'color', 'front', 'temple'])
+    frame_info = (
+        prefixed(front, "👓 ") + ("(" + size + ")").radd(" ").where(size != "", "")
+        + prefixed(color, " 🎨 ") + prefixed(temple, " 🦵 ")
+    ).str.strip()
+
+    # 렌즈 정보 분리
+    l_lens_str = prefixed(map_unique(col('lens.left.skus'), decode_lens_skus), "🅻 ")
+    r_lens_str = prefixed(map_unique(col('lens.right.skus'), decode_lens_skus), "🆁 ")
+
+    # 도수 정보 분리
+    l_opts = join_nonempty([format_val_column(col(f'optometry.data.optimal.left.{f}'), unit, prefix) for prefix, unit, f in OPTOMETRY_FIELDS], " | ")
+    r_opts = join_nonempty([format_val_column(col(f'optometry.data.optimal.right.{f}'), unit, prefix) for prefix, unit, f in OPTOMETRY_FIELDS], " | ")
+
+    # 주문 타입 판단
+    has_optometry = (l_opts != "") | (r_opts != "")
+    f_type = col('frameType').map(str).str.strip().str.lower()
+    l_type = col('lensType').map(str).str.strip().str.lower()
+    has_frame_detail = frame_info != ""
+    has_lens_detail = (l_lens_str != "") | (r_lens_str != "") | has_optometry
+    order_type = np.select(
+        [~has_frame_detail & ~has_lens_detail, (f_type == 'custom') | (l_type == 'custom'), (f_type == 'as') | (l_type == 'as')],
+        ["클립온", "신규", "AS주문"],
+        default="기타"
+    )
 
-    # 헬퍼 함수 4: 렌즈 정보 파싱
-    def parse_lens_skus(skus_data):
-        if pd.isna(skus_data) or str(skus_data).lower() == 'nan' or skus_data == "":
-            return ""
-        try:
-            import ast
-            import re
-            s_list = ast.literal_eval(skus_data) if isinstance(skus_data, str) else skus_data
-            if isinstance(s_list, list) and s_list:
-                main_sku = str(s_list[0])
-                options = [str(x) for x in s_list[1:]]
-
-                parts = main_sku.split('-')
-                brands = {
-                    "zeiss": "자이스", "nikon": "니콘", "chemi": "케미",
-                    "varilux": "바리락스", "breezm": "브리즘", "tokai": "토카이",
-                    "essilor": "에실로", "dagas": "다가스", "eloptical": "이엘옵티컬",
-                    "sundayoptical": "선데이옵티컬", "airtable": "에어테이블"
-                }
-                names = {
-                    "clw": "클리어뷰", "clwrx": "클리어뷰Rx", "sl": "스마트라이프", "sv": "단초점",
-                    "drvs": "드라이브세이프", "drvsrx": "드라이브세이프Rx", "myocare": "마이오케어",
-                    "dg": "디지털", "sldg": "스마트라이프 디지털",
-                    "seemxinf": "씨맥스 인피니트", "seemxmsz": "씨맥스", "seemxutz": "씨맥스",
-                    "rlxneo": "릴랙씨 네오", "rlxneopl": "릴랙씨 네오", "myse": "마이씨", "bluvpl": "블루라이트 플러스",
-                    "prspz": "프레지오", "hno": "홈앤오피스", "solwn": "솔테스", "solwp": "솔테스",
-                    "dfree": "디프리", "asp": "비구면", "aspxdrv": "엑스드라이브", "asprx": "비구면Rx",
-                    "mfcds": "매직폼", "mfxt": "매직폼XT", "mffrs": "매직폼", "mfst": "매직폼",
-                    "phys": "피지오", "physf": "피지오", "cmfmx": "컴포트 맥스", "cmfmxf": "컴포트 맥스",
-                    "xrf": "XR", "xrd": "XR", "lbrtyf": "리버티", "lbrty": "리버티",
-                    "stellest": "스텔리스트", "hr": "HR"
-                }
-
-                brand_key = parts[0].lower() if len(parts) > 0 else ""
-                brand_name = f"[{brands.get(brand_key, parts[0])}]" if brand_key else ""
-
-                idx_pos = -1
-                for i, p in enumerate(parts):
-                    if re.match(r'^1\.[5-9]\d*$', p):
-                        idx_pos = i; break
-
-                refractive_index = parts[idx_pos] if idx_pos != -1 else ""
-
-                mid_parts = parts[1:idx_pos] if idx_pos != -1 else parts[1:]
-                l_type = ""
-                l_name = ""
-
-                if len(mid_parts) > 0:
-                    l_type = mid_parts[0]
-                    if len(mid_parts) > 1:
-                        raw_name = "-".join(mid_parts[1:]).lower()
-                        l_name = names.get(raw_name, "-".join(mid_parts[1:]))
-                    else:
-                        l_name = names.get(l_type.lower(), l_type)
-
-                type_str = f"({l_type})" if l_type else ""
-                main_str = f"{brand_name} {l_name}{type_str} {refractive_index}".strip()
-                main_str = re.sub(r'\s+', ' ', main_str)
-
-                coatings = {
-                    "bgdp": "BGDP", "purebl": "퓨어블루", "perfect": "퍼펙트UV",
-                    "dp": "DP", "dd": "드라이브세이프", "pf": "포토퓨전 변색",
-                    "gens": "트랜지션스 GenS", "gen8": "트랜지션스 Gen8",
-                    "xtractive": "엑스트라액티브", "ush": "USH", "etcuv": "ETC UV",
-                    "innermt": "내면MT", "seeuv": "SEE UV", "seecoat": "씨코트",
-                    "bluv": "블루라이트", "seeuvbluv": "블루라이트", "nir": "근적외선", 
-                    "photoaid": "포토에이드 변색", "varsity": "바시티 변색", 
-                    "crizalprevencia": "프리벤시아", "crizalrock": "크리잘락", 
-                    "prism": "프리즘", "bp": "BP", "xdrive": "엑스드라이브", "dvsun": "DV선"
-                }
-                colors = {
-                    "brown": "브라운", "gray": "그레이", "grey": "그레이",
-                    "green": "그린", "pioneer": "파이오니어", "black": "블랙",
-                    "sapphire": "사파이어", "cocoa brown": "코코아브라운",
-                    "ice gray": "아이스그레이", "camel brown": "카멜브라운",
-                    "shadow orange": "섀도우오렌지", "khaki brown": "카키브라운"
-                }
-
-                opt_strs = []
-                for opt in options:
-                    o = re.sub(r'^(zeiss-[a-z]+-|nikon-[a-z]+-|chemi-[a-z]+-|varilux-[a-z]+-|tokai-[a-z]+-|dagas-[a-z]+-|so-[a-z]+-|el-[a-z]+-|airtable-[a-z]+-|baseColor_|mirrorColor_)', '', opt, flags=re.IGNORECASE)
-                    o_lower = o.lower()
-                    if o_lower in coatings: opt_strs.append(coatings[o_lower])
-                    elif o_lower in colors: opt_strs.append(colors[o_lower])
-                    elif "golf" in o_lower: opt_strs.append("골프")
-                    elif o_lower and o_lower != "nan": opt_strs.append(o)
-
-                unique_opts = list(dict.fromkeys(opt_strs))
-                opt_str = ", ".join(unique_opts)
-
-                if opt_str: return f"{main_str} / {opt_str}"
-                return main_str
-
-        except Exception: return str(skus_data)
-        return str(skus_data)
-
-    def format_val(val, unit, prefix=""):
-        s_val = str(val).strip()
-        if not s_val or s_val.lower() == "nan": return ""
-        if prefix: return f"{prefix}: {s_val}{unit}"
-        return f"{s_val}{unit}"
-
-    results = []
-    for _, row in my_df.iterrows():
-        # 테 정보 예쁘게
-        frame_info = build_frame_info(row)
-        
-        # 렌즈 정보 분리
-        l_lens_raw = parse_lens_skus(row.get('lens.left.skus', ''))
-        r_lens_raw = parse_lens_skus(row.get('lens.right.skus', ''))
-        
-        l_lens_str = f"🅻 {l_lens_raw}" if l_lens_raw else ""
-        r_lens_str = f"🆁 {r_lens_raw}" if r_lens_raw else ""
-
-        # 도수 정보 분리
-        l_sph = format_val(row.get('optometry.data.optimal.left.sph', ''), 'D', 'SPH')
-        l_cyl = format_val(row.get('optometry.data.optimal.left.cyl', ''), 'D', 'CYL')
-        l_axi = format_val(row.get('optometry.data.optimal.left.axi', ''), '°', 'AXIS')
-        l_add = format_val(row.get('optometry.data.optimal.left.add', ''), 'D', 'ADD')
-        l_pd  = format_val(row.get('optometry.data.optimal.left.pd', ''), 'mm', 'PD')
-        
-        r_sph = format_val(row.get('optometry.data.optimal.right.sph', ''), 'D', 'SPH')
-        r_cyl = format_val(row.get('optometry.data.optimal.right.cyl', ''), 'D', 'CYL')
-        r_axi = format_val(row.get('optometry.data.optimal.right.axi', ''), '°', 'AXIS')
-        r_add = format_val(row.get('optometry.data.optimal.right.add', ''), 'D', 'ADD')
-        r_pd  = format_val(row.get('optometry.data.optimal.right.pd', ''), 'mm', 'PD')
-
-        l_opts_arr = [x for x in [l_sph, l_cyl, l_axi, l_add, l_pd] if x]
-        r_opts_arr = [x for x in [r_sph, r_cyl, r_axi, r_add, r_pd] if x]
-        
-        l_opts_str = f"[ L ] {' | '.join(l_opts_arr)}" if l_opts_arr else ""
-        r_opts_str = f"[ R ] {' | '.join(r_opts_arr)}" if r_opts_arr else ""
-        
-        # 주문 타입 판단
-        has_optometry = bool(l_opts_arr or r_opts_arr)
-        f_type = str(row.get('frameType', '')).strip().lower()
-        l_type = str(row.get('lensType', '')).strip().lower()
-        
-        has_frame_detail = bool(frame_info)
-        has_lens_detail = bool(l_lens_str or r_lens_str or has_optometry)
-        
-        if not has_frame_detail and not has_lens_detail:
-            order_type_str = "클립온"
-        elif f_type == 'custom' or l_type == 'custom':
-            order_type_str = "신규"
-        elif f_type == 'as' or l_type == 'as':
-            order_type_str = "AS주문"
-        else:
-            order_type_str = "기타"
-
-        createdAt = row.get('createdAt', '')
-        date_str = pd.to_datetime(createdAt, errors='coerce').strftime('%Y-%m-%d') if createdAt else ""
-
-        results.append({
-            'key_id': row['id'],
-            'customer_id': str(row.get('customer.id', '')),
-            '접수일': date_str,
-            '상태': beautify_status(row.get('status', '')),
-            '주문타입': order_type_str,
-            '주문번호': row.get('code', ''),
-            '이름': row.get('customer.name', ''),
-            '전화번호': parse_contacts(row.get('customer.contacts', '')),
-            '테정보': frame_info,
-            'L렌즈': l_lens_str,
-            'R렌즈': r_lens_str,
-            'L도수': l_opts_str,
-            'R도수': r_opts_str,
-        })
-
-    final_df = pd.DataFrame(results)
-    if not final_df.empty:
-        final_df = final_df.sort_values(by='접수일', ascending=False)
-    
+    final_df = pd.DataFrame({
+        'key_id': my_df['id'].tolist(),
+        'customer_id': col('customer.id').map(str).tolist(),
+        '접수일': format_dates(col('createdAt')).tolist(),
+        '상태': map_unique(col('status'), beautify_status).tolist(),
+        '주문타입': order_type.tolist(),
+        '주문번호': col('code').tolist(),
+        '이름': col('customer.name').tolist(),
+        '전화번호': phones_column(my_df, col('customer.contacts')).tolist(),
+        '테정보': frame_info.tolist(),
+        'L렌즈': l_lens_str.tolist(),
+        'R렌즈': r_lens_str.tolist(),
+        'L도수': prefixed(l_opts, "[ L ] ").tolist(),
+        'R도수': prefixed(r_opts, "[ R ] ").tolist(),
+        **{c: col(c).map(str).tolist() for c in STAFF_COLUMNS},
+    })
     return final_df
 
+def process_new_data(df, selected_staff):
+    """캐시된 NEW 주문 표에서 담당자 주문만 골라 접수일 최신순으로 (재실행마다 이 부분만 실행)"""
+    if df.empty: return pd.DataFrame()
+    table = build_new_table(df, data_version(df))
+    if table.empty: return pd.DataFrame()
+
+    # 조건 2: 담당자 매칭
+    is_mine = (table[STAFF_COLUMNS] == str(selected_staff)).any(axis=1)
+    final_df = table[is_mine].drop(columns=STAFF_COLUMNS).reset_index(drop=True)
+    if final_df.empty: return pd.DataFrame()
+    return final_df.sort_values(by='접수일', ascending=False)
+
 # ==========================================
 # [5. 메인 UI 함수]
 # ==========================================
@@ -455,6 +344,7 @@ def main():
     st.sidebar.title("설정")
     
     if st.sidebar.button("🔄 화면 새로고침"):
+        invalidate_store()
         st.cache_data.clear()
         st.rerun()
 
@@ -486,6 +376,7 @@ def main():
             if process.poll() == 0:
                 progress_bar.progress(1.0, text="완료!")
                 st.sidebar.success("성공!")
+                invalidate_store()
                 st.cache_data.clear()
                 time.sleep(1); st.rerun()
             else:
@@ -498,13 +389,8 @@ def main():
     st.sidebar.markdown("---")
 
     # --- 데이터 로드 및 담당자 선택 ---
-    df = load_data()
-    if df.empty: st.warning("데이터가 없습니다."); return
-
-    all_staff = set()
-    if 'statusDetail.lensStaff' in df.columns: all_staff.update(df['statusDetail.lensStaff'].dropna().astype(str).unique())
-    if 'statusDetail.frameStaff' in df.columns: all_staff.update(df['statusDetail.frameStaff'].dropna().astype(str).unique())
-    raw_staff_list = [s for s in all_staff if s and s.strip() != "" and s != "nan"]
+    raw_staff_list = [s for s in load_staff_names() if s and s.strip() != "" and s != "nan"]
+    if not raw_staff_list: st.warning("데이터가 없습니다."); return
     def staff_sort_key(name):
         n = name.lower().strip()
         if n == 'sen': return 0
@@ -518,6 +404,7 @@ def main():
 
     # --- 메인 화면 ---
     st.title(f"✨ {selected_staff}님의 신규(NEW) 주문 관리")
+    df = load_data()
     result_df = process_new_data(df, selected_staff)
     
     if result_df.empty: st.info(f"내역이 없습니다."); return
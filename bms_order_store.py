@@ -0,0 +1,301 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+import pandas as pd
+from dotenv import load_dotenv
+from bms_paged_loader import fetch_all_rows, default_client_factory
+
+# ==========================================
+# [설정 구간]
+# 여러 대시보드 페이지가 각자 bms_orders 전체를 받아오지 않도록,
+# 한 번 받은 주문을 로컬 SQLite 파일에 보관하고 이후에는 updatedAt이 바뀐 주문만 가져와 반영
+# ==========================================
+load_dotenv()
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+TARGET_TABLE = "bms_orders"
+
+STORE_PATH = os.environ.get(
+    "BMS_ORDER_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "bms_orders_cache.sqlite")
+)
+# 이 시간(초) 안에 이미 변경분을 확인했다면 다시 조회하지 않음 (여러 페이지를 연달아 열 때)
+REFRESH_INTERVAL = 60
+# 변경분 반영에 항상 필요한 컬럼
+KEY_COLUMNS = ["id", "updatedAt"]
+# 선택 컬럼(optional)이 Supabase 테이블에 없을 때 다시 확인하기까지의 시간(초)
+OPTIONAL_RECHECK_INTERVAL = 3600
+# 저장소 형식 버전: 서버 데이터를 updatedAt 변경 없이 일괄 수정하는 작업(JSON 변환, 전화번호 채우기 등)을
+# 배포할 때 올리면 기존 저장소를 같은 컬럼으로 한 번 전체 재수집
+STORE_FORMAT = 2
+# ==========================================
+
+_lock = threading.Lock()
+
+def _connect():
+    # 스트림릿 세션(스레드)마다 따로 열고 닫음
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _api_column(name):
+    # PostgREST select에서는 점(.)이 들어간 컬럼명만 따옴표로 감쌈
+    return f'"{name}"' if '.' in name else name
+
+def _get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+def _to_sqlite(v):
+    # 리스트/딕셔너리(jsonb 컬럼)는 JSON 문자열로 보관
+    if isinstance(v, (list, dict)):
+        return json.dumps(v, ensure_ascii=False)
+    return v
+
+def _fetch_rows(columns, since=None, loading_text=None):
+    """Supabase에서 주문 조회 (since가 있으면 updatedAt이 그 이후인 주문만)"""
+    cols = ",".join(_api_column(c) for c in columns)
+
+    def make_query(client):
+        query = client.table(TARGET_TABLE).select(cols)
+        if since:
+            # 같은 시각에 저장된 주문을 놓치지 않도록 경계값 포함 (다시 받아도 덮어쓰기라 무방)
+            query = query.gte("updatedAt", since)
+        return query
+
+    # 전체 재수집은 id 구간을 나눠 동시에, 변경분은 양이 적으므로 순차 keyset
+    if since:
+        return fetch_all_rows(make_query, loading_text=loading_text, label="변경된 주문")
+    return fetch_all_rows(make_query, loading_text=loading_text, parallel=True, label="전체 과거 데이터")
+
+# 변경 여부 확인 때 한 번에 조회할 id 수 (SQLite 파라미터 수 제한 안쪽)
+_ID_CHUNK = 500
+
+def _changed_values(conn, columns, values):
+    """받은 행 중 저장된 내용과 다른(또는 새) 행만. values: columns 순서의 값 목록"""
+    id_pos = columns.index("id")
+    stored = {}
+    cols_sql = ", ".join(_quote(c) for c in columns)
+    for i in range(0, len(values), _ID_CHUNK):
+        ids = [v[id_pos] for v in values[i:i + _ID_CHUNK]]
+        sql = f"SELECT {cols_sql} FROM orders WHERE id IN ({', '.join('?' for _ in ids)})"
+        for row in conn.execute(sql, ids):
+            stored[row[id_pos]] = row
+    return [v for v in values if stored.get(v[id_pos]) != tuple(v)]
+
+def _write_rows(conn, columns, rows, rebuild=False):
+    if rebuild:
+        conn.execute("DROP TABLE IF EXISTS orders")
+        # 타입을 선언하지 않아 Supabase에서 받은 값(int/float/str)을 그대로 보관
+        col_defs = ", ".join(_quote(c) + (" PRIMARY KEY" if c == "id" else "") for c in columns)
+        conn.execute(f"CREATE TABLE orders ({col_defs})")
+
+    changed = False
+    if rows:
+        values = [[_to_sqlite(r.get(c)) for c in columns] for r in rows]
+        # 변경분 조회는 경계 시각의 주문을 매번 다시 받으므로, 저장된 내용과 같은 행은 건너뜀
+        if not rebuild:
+            values = _changed_values(conn, columns, values)
+        if values:
+            sql = (f"INSERT OR REPLACE INTO orders ({', '.join(_quote(c) for c in columns)}) "
+                   f"VALUES ({', '.join('?' for _ in columns)})")
+            conn.executemany(sql, values)
+            changed = True
+
+        updated = [r.get("updatedAt") for r in rows if r.get("updatedAt")]
+        watermark = _get_meta(conn, "watermark")
+        if updated and (rebuild or not watermark or max(updated) > watermark):
+            _set_meta(conn, "watermark", max(updated))
+
+    if rebuild:
+        _set_meta(conn, "columns", columns)
+        _set_meta(conn, "format", STORE_FORMAT)
+    if changed or rebuild:
+        # 페이지별 가공 결과 캐시의 키 (저장된 주문 내용이 실제로 바뀔 때만 증가)
+        _set_meta(conn, "version", _get_meta(conn, "version", 0) + 1)
+
+def _remote_has_column(column):
+    try:
+        default_client_factory().table(TARGET_TABLE).select(_api_column(column)).limit(1).execute()
+        return True
+    except Exception:
+        return False
+
+def refresh_store(columns, loading_text=None, force=False, optional=()):
+    """로컬 저장소를 최신 상태로: 처음이거나 새 컬럼이 필요하면 전체 재수집, 아니면 변경분만 반영.
+    optional 컬럼은 Supabase 테이블에 있을 때만 추가 (마이그레이션 전에도 페이지가 동작하도록)"""
+    with _lock:
+        conn = _connect()
+        try:
+            stored = _get_meta(conn, "columns", [])
+            needed = [c for c in KEY_COLUMNS + list(columns) if c not in stored]
+            outdated = bool(stored) and _get_meta(conn, "format") != STORE_FORMAT
+            unavailable = _get_meta(conn, "unavailable", {})
+            now = time.time()
+            to_check = [c for c in optional if c not in stored and c not in needed
+                        and now - unavailable.get(c, 0) >= OPTIONAL_RECHECK_INTERVAL]
+
+            if not needed and not to_check and not outdated and not force:
+                if now - _get_meta(conn, "refreshed_at", 0) < REFRESH_INTERVAL:
+                    return
+
+            if not SUPABASE_URL or not SUPABASE_KEY:
+                raise RuntimeError("Supabase 설정이 누락되었습니다.")
+
+            if to_check:
+                for c in to_check:
+                    if _remote_has_column(c):
+                        needed.append(c)
+                        unavailable.pop(c, None)
+                    else:
+                        unavailable[c] = now
+                with conn:
+                    _set_meta(conn, "unavailable", unavailable)
+            full_reload = bool(needed) or outdated
+
+            if full_reload:
+                all_columns = stored + list(dict.fromkeys(needed))
+                rows = _fetch_rows(all_columns, loading_text=loading_text)
+                with conn:
+                    _write_rows(conn, all_columns, rows, rebuild=True)
+                    _set_meta(conn, "refreshed_at", time.time())
+            else:
+                rows = _fetch_rows(stored, since=_get_meta(conn, "watermark"), loading_text=loading_text)
+                with conn:
+                    _write_rows(conn, stored, rows)
+                    _set_meta(conn, "refreshed_at", time.time())
+        finally:
+            conn.close()
+
+def invalidate_store():
+    """다음 load_orders 때 바로 변경분을 확인하도록 (새로고침 버튼/동기화 직후)"""
+    conn = _connect()
+    try:
+        with conn:
+            _set_meta(conn, "refreshed_at", 0)
+    finally:
+        conn.close()
+
+def reset_store():
+    """다음 load_orders 때 저장된 컬럼 그대로 전체 재수집 (updatedAt을 바꾸지 않는 서버 일괄 수정 직후)"""
+    conn = _connect()
+    try:
+        with conn:
+            _set_meta(conn, "format", None)
+            _set_meta(conn, "refreshed_at", 0)
+    finally:
+        conn.close()
+
+def _filter_columns(filters):
+    for op, col, value in filters:
+        if op in ("and", "or"):
+            yield from _filter_columns(value)
+        else:
+            yield col
+
+def _filter_sql(f):
+    """필터 (연산, 컬럼, 값) → SQL 조건과 파라미터. 문자열 비교는 앞뒤 공백/대소문자 무시"""
+    op, col, value = f
+    if op in ("and", "or"):
+        parts = [_filter_sql(x) for x in value]
+        sql = f" {op.upper()} ".join(p for p, _ in parts)
+        return f"({sql})", [v for _, params in parts for v in params]
+
+    c = _quote(col)
+    if op == "eq":
+        return f"{c} = ?", [value]
+    if op == "year_gte":
+        # 4자리 연도로 시작하는 값은 그 연도 이상만, 그렇지 않은 값(다른 날짜 형식 등)은 모두 통과 → 정확한 비교는 pandas에서
+        t = f"ltrim({c})"
+        return f"({t} >= ? OR {t} NOT GLOB '[0-9][0-9][0-9][0-9]*')", [f"{int(value):04d}"]
+    if op == "gte_or_null":
+        # 'YYYY-MM-DD'로 시작하는 값만 문자열로 비교, NULL/빈 값/다른 형식은 모두 통과 (pandas에서 NaT 처리와 정확한 비교)
+        t = f"ltrim({c})"
+        return f"({c} IS NULL OR {t} >= ? OR {t} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*')", [value]
+    if op == "contains_ci":
+        pattern = value.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"lower({c}) LIKE ? ESCAPE '\\'", [f"%{pattern}%"]
+    if op == "in_ci":
+        return f"lower(trim({c})) IN ({', '.join('?' for _ in value)})", [v.lower() for v in value]
+    if op == "not_in_ci":
+        return f"({c} IS NULL OR lower(trim({c})) NOT IN ({', '.join('?' for _ in value)}))", [v.lower() for v in value]
+    if op == "blank":
+        return f"({c} IS NULL OR trim({c}) = '' OR lower({c}) = 'nan')", []
+    raise ValueError(f"지원하지 않는 필터입니다: {op}")
+
+def _ensure_fresh(columns, loading_text=None, optional=()):
+    try:
+        refresh_store(columns, loading_text=loading_text, optional=optional)
+    except Exception as e:
+        # 이미 받아 둔 데이터가 있으면 그걸로 계속 (네트워크 오류 등)
+        conn = _connect()
+        try:
+            stored = _get_meta(conn, "columns", [])
+        finally:
+            conn.close()
+        if not stored or any(c not in stored for c in columns):
+            raise
+        print(f"⚠️ 주문 변경분을 반영하지 못해 로컬 저장 데이터로 표시합니다: {e}")
+    finally:
+        if loading_text is not None:
+            loading_text.empty()
+
+def _normalize_columns(columns):
+    # 기존 select와 같은 형식('"customer.name"'처럼 따옴표 포함)도 허용
+    return list(dict.fromkeys(c.strip().strip('"') for c in columns))
+
+def load_orders(columns, filters=None, loading_text=None, optional=None):
+    """필요한 컬럼만 로컬 저장소에서 읽어 DataFrame으로 반환 (id 순).
+    filters: [("연산", "컬럼", 값), ...] 모두 만족하는 주문만 (연산: eq, year_gte, gte_or_null, contains_ci, in_ci, not_in_ci, blank, and, or)
+    optional: Supabase 테이블에 있을 때만 포함되는 컬럼 (없으면 결과에서 빠짐)
+    결과의 attrs["data_version"]은 저장소 내용이 바뀔 때마다 달라짐 (가공 결과 캐시 키로 사용)"""
+    columns = _normalize_columns(columns)
+    optional = _normalize_columns(optional or [])
+    filters = filters or []
+    _ensure_fresh(columns + [c for c in _filter_columns(filters) if c not in columns], loading_text, optional)
+
+    conn = _connect()
+    try:
+        stored = _get_meta(conn, "columns", [])
+        select_cols = columns + [c for c in optional if c in stored and c not in columns]
+        sql = f"SELECT {', '.join(_quote(c) for c in select_cols)} FROM orders"
+        params = []
+        if filters:
+            where, params = _filter_sql(("and", None, filters))
+            sql += f" WHERE {where}"
+        df = pd.read_sql_query(sql + " ORDER BY id", conn, params=params)
+        df.attrs["data_version"] = f"{_get_meta(conn, 'version', 0)}:{','.join(select_cols)}:{json.dumps(filters)}"
+        return df
+    finally:
+        conn.close()
+
+def data_version(df):
+    """가공 결과 캐시 키: load_orders가 붙인 버전, 없으면 컬럼명 + 행 순서대로의 내용 해시"""
+    version = df.attrs.get("data_version")
+    if version is None:
+        # 행 해시를 더하면 순서가 무시되고 행끼리 값이 바뀐 경우 같은 키가 나올 수 있어 순서대로 이어서 해시
+        digest = hashlib.sha1(json.dumps([str(c) for c in df.columns], ensure_ascii=False).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy().tobytes())
+        version = digest.hexdigest()
+    return version
+
+def load_distinct_values(columns, loading_text=None):
+    """여러 컬럼에 걸친 고유값 목록 (빈 값 제외, 문자열)"""
+    columns = _normalize_columns(columns)
+    _ensure_fresh(columns, loading_text)
+
+    sql = " UNION ".join(f"SELECT DISTINCT {_quote(c)} FROM orders WHERE {_quote(c)} IS NOT NULL" for c in columns)
+    conn = _connect()
+    try:
+        return [str(row[0]) for row in conn.execute(sql)]
+    finally:
+        conn.close()
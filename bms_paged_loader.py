@@ -0,0 +1,105 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from supabase import create_client
+
+# ==========================================
+# [설정 구간]
+# 큰 테이블을 나눠 받는 공용 로더
+# - keyset: id > 마지막 id 로 이어 받기 (offset과 달리 뒤 페이지로 갈수록 느려지지 않음)
+# - parallel: id 구간을 나눠 여러 연결로 동시에 keyset 조회
+# ==========================================
+load_dotenv()
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+
+PAGE_SIZE = 1000
+PARALLEL_WORKERS = 4
+# ==========================================
+
+def default_client_factory():
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+def iter_keyset_pages(make_query, client, page_size=PAGE_SIZE, id_from=None, id_to=None):
+    """make_query(client)로 만든 조회를 id 순으로 page_size씩 이어 받음 (id_from 이상, id_to 미만)"""
+    last_id = None
+    while True:
+        query = make_query(client)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        elif id_from is not None:
+            query = query.gte("id", id_from)
+        if id_to is not None:
+            query = query.lt("id", id_to)
+
+        data = query.order("id").limit(page_size).execute().data
+        if not data:
+            return
+        yield data
+        if len(data) < page_size:
+            return
+        last_id = data[-1]["id"]
+
+def _show_progress(loading_text, label, count):
+    if loading_text is not None:
+        loading_text.text(f"⏳ {label}를 불러오는 중입니다... ({count}건 완료)")
+
+def _fetch_keyset(make_query, client_factory, page_size, loading_text, label):
+    client = client_factory()
+    rows = []
+    _show_progress(loading_text, label, 0)
+    for data in iter_keyset_pages(make_query, client, page_size):
+        rows.extend(data)
+        _show_progress(loading_text, label, len(rows))
+    return rows
+
+def _fetch_parallel(make_query, client_factory, workers, page_size, loading_text, label):
+    client = client_factory()
+    _show_progress(loading_text, label, 0)
+    first = make_query(client).order("id").limit(1).execute().data
+    if not first:
+        return []
+    last = make_query(client).order("id", desc=True).limit(1).execute().data
+    id_min, id_max = int(first[0]["id"]), int(last[0]["id"])
+
+    # id 구간을 workers개로 균등 분할 (마지막 구간은 id_max 포함)
+    step = max(1, -(-(id_max - id_min + 1) // workers))
+    ranges = [(lo, min(lo + step, id_max + 1)) for lo in range(id_min, id_max + 1, step)]
+
+    # 스트림릿 화면은 메인 스레드에서만 갱신: 작업 스레드는 받은 건수만 큐로 전달
+    progress = queue.Queue()
+
+    def fetch_range(id_from, id_to):
+        # 연결(클라이언트)은 스레드 간에 공유하지 않음
+        worker_client = client_factory()
+        rows = []
+        for data in iter_keyset_pages(make_query, worker_client, page_size, id_from, id_to):
+            rows.extend(data)
+            progress.put(len(data))
+        return rows
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(fetch_range, lo, hi) for lo, hi in ranges]
+        done = 0
+        while not all(f.done() for f in futures) or not progress.empty():
+            try:
+                done += progress.get(timeout=0.2)
+                _show_progress(loading_text, label, done)
+            except queue.Empty:
+                pass
+        # 구간 순서대로 이어 붙이면 id 순서 유지
+        rows = []
+        for future in futures:
+            rows.extend(future.result())
+    return rows
+
+def fetch_all_rows(make_query, loading_text=None, parallel=False, workers=PARALLEL_WORKERS,
+                   page_size=PAGE_SIZE, label="데이터", client_factory=None):
+    """조건에 맞는 행을 모두 id 순으로 가져옴.
+    make_query(client)는 select/필터까지 적용한 조회를 돌려줘야 하며, select에 id가 포함되어야 함.
+    loading_text(st.empty() 등)가 있으면 진행 건수를 표시"""
+    client_factory = client_factory or default_client_factory
+    if parallel and workers > 1:
+        return _fetch_parallel(make_query, client_factory, workers, page_size, loading_text, label)
+    return _fetch_keyset(make_query, client_factory, page_size, loading_text, label)
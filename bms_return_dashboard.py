@@ -1,14 +1,17 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
-import ast
 import re
 from datetime import datetime, timedelta
-import time
 import pytz
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from bms_paged_loader import fetch_all_rows
+from bms_lens_sku import load_lens_mappings
+from bms_json_columns import parse_json_value
+from bms_rx_matcher import find_matches
 
 # ==========================================
 # [1. 페이지 설정]
@@ -37,33 +40,41 @@ def get_supabase():
 # ==========================================
 # [2.5 수동 등록 관련 DB 함수]
 # ==========================================
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_return_requests():
+    """bms_return_requests 테이블에서 등록된 모든 요청을 가져옴 (조회 실패는 캐시하지 않도록 예외를 그대로 올림)
+    요청을 저장/삭제하는 함수는 끝난 뒤 fetch_return_requests.clear()로 캐시를 비움"""
+    supabase = get_supabase()
+    response = supabase.table("bms_return_requests").select("*").execute()
+    if not response.data:
+        return pd.DataFrame()
+    df = pd.DataFrame(response.data)
+    if 'created_at' in df.columns:
+        df['created_at'] = pd.to_datetime(df['created_at'])
+    if 'returned_at' in df.columns:
+        df['returned_at'] = pd.to_datetime(df['returned_at'])
+    return df
+
 def load_return_requests():
-    """bms_return_requests 테이블에서 등록된 모든 요청을 가져옴"""
     try:
-        supabase = get_supabase()
-        response = supabase.table("bms_return_requests").select("*").execute()
-        if not response.data:
-            return pd.DataFrame()
-        df = pd.DataFrame(response.data)
-        if 'created_at' in df.columns:
-            df['created_at'] = pd.to_datetime(df['created_at'])
-        if 'returned_at' in df.columns:
-            df['returned_at'] = pd.to_datetime(df['returned_at'])
-        return df
+        return fetch_return_requests()
     except Exception:
         return pd.DataFrame()
 
-def delete_return_request(order_code):
-    """bms_return_requests에서 해당 주문번호 레코드 삭제 (원상태 복구)"""
+def delete_return_requests(order_codes):
+    """bms_return_requests에서 여러 주문번호 레코드를 한 번에 삭제 (원상태 복구)"""
+    codes = list(dict.fromkeys(str(c) for c in order_codes))
+    if not codes:
+        return True
     try:
         supabase = get_supabase()
-        supabase.table("bms_return_requests").delete().eq("order_code", order_code).execute()
+        supabase.table("bms_return_requests").delete().in_("order_code", codes).execute()
+        fetch_return_requests.clear()
         return True
     except Exception as e:
         st.error(f"삭제 중 오류: {e}")
         return False
 
-
 def register_return_request(row_data):
     """수동 반품 요청 등록"""
     try:
@@ -79,74 +90,85 @@ def register_return_request(row_data):
             "status": "대체반품대기"
         }
         supabase.table("bms_return_requests").insert(data).execute()
+        fetch_return_requests.clear()
         return True, "성공적으로 등록되었습니다."
     except Exception as e:
         return False, f"등록 중 오류 발생: {str(e)}"
 
-def update_request_status(order_code, new_status, row_data=None):
-    """요청 상태 업데이트 (대기 -> 완료 등) / 없으면 생성 (Upsert 효과)"""
+def _is_completed_status(s):
+    return s == "반품완료" or s.startswith("대체반품으로사용") or s.startswith("대체반품으로주문")
+
+def _new_request_record(order_code, new_status, row_data):
+    """새로 등록할 요청 레코드 (row_data는 df_rx 행 Series 또는 dict)"""
+    return {
+        "order_code": order_code,
+        "id_ref": str(row_data.get('_id', '')),
+        "customer_id": str(row_data.get('_cid', '')),
+        "customer_name": str(row_data.get('고객명', '')),
+        "lens_info": str(row_data.get('렌즈정보', '')),
+        "r_dosu": str(row_data.get('R도수', '')),
+        "l_dosu": str(row_data.get('L도수', '')),
+        "status": new_status
+    }
+
+def bulk_update_request_status(updates):
+    """여러 요청의 상태를 한 번에 저장. updates: [(주문번호, 새 상태, row_data 또는 None), ...]
+    이미 있는 요청은 상태(+완료일시)만 바꾸고, 없는 요청은 row_data가 있을 때만 새로 등록 (없으면 건너뜀)
+    기존 요청 조회 1번 + 같은 상태끼리 update 1번 + 새 요청 insert 1번 (order_code에 unique 제약이 없어도 됨)
+    반환: {주문번호: 저장 여부}"""
+    updates = {str(code): (status, row_data) for code, status, row_data in updates}
+    results = {code: False for code in updates}
+    if not updates:
+        return results
     try:
         supabase = get_supabase()
-        # 먼저 해당 주문번호의 요청이 있는지 확인
-        existing = supabase.table("bms_return_requests").select("order_code").eq("order_code", order_code).execute()
-        
-        def _is_completed_status(s):
-            return s == "반품완료" or s.startswith("대체반품으로사용") or s.startswith("대체반품으로주문")
-
-        if existing.data and len(existing.data) > 0:
+        existing = supabase.table("bms_return_requests").select("order_code").in_("order_code", list(updates)).execute()
+        existing_codes = {r['order_code'] for r in (existing.data or [])}
+
+        now_iso = datetime.now(pytz.timezone('Asia/Seoul')).isoformat()
+        # 기존 요청: 바꿀 값(상태, 완료일시)이 같은 주문번호끼리 묶어 update (나머지 컬럼은 그대로)
+        # 새 요청: 컬럼 구성이 같은 레코드끼리 묶어 insert
+        update_groups = {}
+        insert_groups = {}
+        for code, (new_status, row_data) in updates.items():
+            returned_at = now_iso if _is_completed_status(new_status) else None
+            if code in existing_codes:
+                update_groups.setdefault((new_status, returned_at), []).append(code)
+            elif row_data is not None:
+                record = _new_request_record(code, new_status, row_data)
+                if returned_at:
+                    record["returned_at"] = returned_at
+                insert_groups.setdefault(tuple(record), []).append(record)
+
+        for (new_status, returned_at), codes in update_groups.items():
             update_data = {"status": new_status}
-            if _is_completed_status(new_status):
-                update_data["returned_at"] = datetime.now(pytz.timezone('Asia/Seoul')).isoformat()
-            supabase.table("bms_return_requests").update(update_data).eq("order_code", order_code).execute()
-        elif row_data is not None:
-            # 존재하지 않고 row_data가 있으면 새로 등록
-            # row_data가 Series일 경우와 dict일 경우를 모두 대응
-            if isinstance(row_data, pd.Series):
-                id_ref = str(row_data.get('_id', ''))
-                customer_id = str(row_data.get('_cid', ''))
-                customer_name = str(row_data.get('고객명', ''))
-                lens_info = str(row_data.get('렌즈정보', ''))
-                r_dosu = str(row_data.get('R도수', ''))
-                l_dosu = str(row_data.get('L도수', ''))
-            else:
-                id_ref = str(row_data.get('_id', ''))
-                customer_id = str(row_data.get('_cid', ''))
-                customer_name = str(row_data.get('고객명', ''))
-                lens_info = str(row_data.get('렌즈정보', ''))
-                r_dosu = str(row_data.get('R도수', ''))
-                l_dosu = str(row_data.get('L도수', ''))
-
-            data = {
-                "order_code": order_code,
-                "id_ref": id_ref,
-                "customer_id": customer_id,
-                "customer_name": customer_name,
-                "lens_info": lens_info,
-                "r_dosu": r_dosu,
-                "l_dosu": l_dosu,
-                "status": new_status
-            }
-            if _is_completed_status(new_status):
-                data["returned_at"] = datetime.now(pytz.timezone('Asia/Seoul')).isoformat()
-            supabase.table("bms_return_requests").insert(data).execute()
-        return True
+            if returned_at:
+                update_data["returned_at"] = returned_at
+            supabase.table("bms_return_requests").update(update_data).in_("order_code", codes).execute()
+            results.update({code: True for code in codes})
+        for records in insert_groups.values():
+            supabase.table("bms_return_requests").insert(records).execute()
+            results.update({record["order_code"]: True for record in records})
+        return results
     except Exception as e:
         st.error(f"상태 업데이트 중 오류: {e}")
-        return False
+        return results
+    finally:
+        # 일부 묶음만 저장된 경우도 있으므로 성공/실패와 관계없이 다시 읽도록
+        fetch_return_requests.clear()
+
+def selected_request_updates(df_rx, selected, new_status, code_col='주문번호'):
+    """표에서 선택한 행들 → bulk_update_request_status 입력 (df_rx의 원 행을 함께 넘기고, 목록에 없으면 None)"""
+    rows_by_code = df_rx.drop_duplicates('주문번호').set_index('주문번호', drop=False)
+    return [(code, new_status, rows_by_code.loc[code] if code in rows_by_code.index else None)
+            for code in selected[code_col]]
 
 # ==========================================
 # [3. 공통 로직 - 매핑 로드]
 # ==========================================
-@st.cache_data(ttl=600, show_spinner=False)
 def load_all_mappings():
-    try:
-        supabase = get_supabase()
-        response = supabase.table(MAPPING_TABLE).select("sku_key, custom_name").execute()
-        if response.data:
-            return {item['sku_key']: item['custom_name'] for item in response.data}
-    except Exception:
-        pass
-    return {}
+    # 공용 렌즈 매핑 캐시 사용 (다른 페이지에서 저장한 매핑도 바로 반영)
+    return load_lens_mappings()
 
 def get_lens_display_name(sku_list, all_mappings):
     sku_str = str(sku_list)
@@ -181,13 +203,18 @@ def load_return_data():
     start_date = (datetime.now() - timedelta(days=100)).strftime("%Y-%m-%dT00:00:00Z")
     
     try:
-        response = supabase.table(TARGET_TABLE)\
-            .select(",".join(COLS))\
-            .gte("createdAt", start_date)\
-            .in_("lensType", ["custom", "as"])\
-            .execute()
+        # 한 번에 받으면 서버 최대 행 수(1000)에서 잘리므로 id 순으로 이어 받기
+        rows = fetch_all_rows(
+            lambda client: client.table(TARGET_TABLE)
+                .select(",".join(COLS))
+                .gte("createdAt", start_date)
+                .in_("lensType", ["custom", "as"]),
+            loading_text=st.empty(),
+            label="반품 대상 주문",
+            client_factory=lambda: supabase
+        )
         
-        df = pd.DataFrame(response.data) if response.data else pd.DataFrame()
+        df = pd.DataFrame(rows) if rows else pd.DataFrame()
         return df
     except Exception as e:
         st.error(f"데이터 로드 중 오류: {e}")
@@ -197,13 +224,12 @@ def load_return_data():
 # [5. 렌즈 RX 판별 & 기한 파싱]
 # ==========================================
 def parse_skus(sku_val):
+    # jsonb 컬럼이면 이미 리스트로 들어옴
+    if isinstance(sku_val, list): return sku_val
     if pd.isna(sku_val) or str(sku_val).lower() in ['', 'nan', 'none']: 
         return []
-    try:
-        s_list = ast.literal_eval(str(sku_val)) if isinstance(sku_val, str) else sku_val
-        if isinstance(s_list, list): return s_list
-    except:
-        pass
+    s_list = parse_json_value(sku_val)
+    if isinstance(s_list, list): return s_list
     return [str(sku_val)]
 
 def is_rx_lens(sku_list):
@@ -230,24 +256,43 @@ def parse_presubmit(date_str):
     except:
         return None
 
-def extract_order_date(row):
-    order_items_val = row.get('orderItems', '')
-    if pd.isna(order_items_val) or str(order_items_val).strip() == '':
-        return parse_presubmit(row.get('createdAt', ''))
+ISO_TZ_PATTERN = r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:\d{2})$'
+
+def parse_presubmit_column(values):
+    """parse_presubmit을 컬럼 단위로 (시간대가 붙은 ISO 문자열은 한 번에 변환, 나머지만 개별 처리). 실패는 NaT"""
+    out = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    is_str = values.map(type) == str
+    is_iso = values[is_str].str.match(ISO_TZ_PATTERN)
+    iso_idx = is_iso[is_iso].index
+    if len(iso_idx):
+        parsed = pd.to_datetime(values[iso_idx], utc=True, errors='coerce', format='ISO8601')
+        out[iso_idx] = parsed.dt.tz_convert('Asia/Seoul').dt.tz_localize(None)
+    for idx in values.index.difference(iso_idx):
+        dt = parse_presubmit(values[idx])
+        if dt is not None: out[idx] = dt
+    return out
+
+def order_date_value(order_items_val, created_at):
+    """주문일로 쓸 원본 값: orderItems의 PreSubmit 종료(없으면 시작)일, 없으면 createdAt"""
+    # 문자열이면 PreSubmit이 들어 있을 때만 파싱 (orderItems 원문이 커서 전부 파싱하면 느림)
+    if isinstance(order_items_val, str) and 'PreSubmit' not in order_items_val:
+        return created_at
+    items = parse_json_value(order_items_val)
+    if not items:
+        return created_at
         
     try:
-        items = ast.literal_eval(str(order_items_val)) if isinstance(order_items_val, str) else order_items_val
-        if isinstance(items, list) and items:
+        if isinstance(items, list):
             for item in items:
                 sd = item.get('statusDetail', {})
                 ps_date = sd.get('PreSubmitEndDate') or sd.get('PreSubmitStartDate')
                 if ps_date:
-                    return parse_presubmit(ps_date)
+                    return ps_date
     except:
         pass
     
     # 폴백
-    return parse_presubmit(row.get('createdAt', ''))
+    return created_at
 
 def safe_float(val):
     try:
@@ -258,192 +303,154 @@ def safe_float(val):
 # ==========================================
 # [6. 매칭 & 전처리]
 # ==========================================
+def map_unique(series, func):
+    """같은 값은 한 번만 계산 (리스트 등은 문자열 표현 기준)"""
+    texts = series.map(str)
+    uniques = texts.unique()
+    return texts.map(dict(zip(uniques, (func(u) for u in uniques))))
+
+def format_opt_column(values):
+    return pd.Series(np.char.mod('%+.2f', values)).str.replace("+0.00", "0.00", regex=False)
+
+def build_dosu_column(sph, cyl, axi, add):
+    a_str = pd.Series([f"A{int(v)}" for v in axi.tolist()])
+    add_str = pd.Series(np.where(add != 0.0, np.char.add(" Add", np.char.mod('%.2f', add)), ""))
+    return "S" + format_opt_column(sph) + " C" + format_opt_column(cyl) + " " + a_str + add_str
+
 @st.cache_data(show_spinner=False)
 def process_data(df):
     if df.empty: return pd.DataFrame(), pd.DataFrame()
     
     mappings = load_all_mappings()
     
-    parsed_rows = []
-    as_rows = []
-    
     # 오늘 자정
     kst = pytz.timezone('Asia/Seoul')
     now = datetime.now(kst).replace(tzinfo=None)
-    
-    for _, row in df.iterrows():
-        l_type = str(row.get('lensType', '')).strip().lower()
-        if l_type == 'as':
-            as_rows.append(row)
-            continue
-            
-        if l_type != 'custom': continue
-        
-        l_skus = parse_skus(row.get('lens.left.skus', ''))
-        r_skus = parse_skus(row.get('lens.right.skus', ''))
-        
-        is_l_rx = is_rx_lens(l_skus)
-        is_r_rx = is_rx_lens(r_skus)
-        
-        if not (is_l_rx or is_r_rx):
-            continue
-            
-        # RX 건 확인됨
-        order_date = extract_order_date(row)
-        if not order_date: order_date = now # 기본값 fallback
-        
-        brand = extract_brand(l_skus) if l_skus else extract_brand(r_skus)
-        days_to_add = 60 if brand in ['zeiss', 'chemi'] else 55
-        return_deadline = order_date + timedelta(days=days_to_add)
-        days_left = (return_deadline - now).days
-        
-        # 상태 & 하이라이트 아이콘
-        if days_left < 0:
-             status_icon = "🔴 기한 만료"
-        elif days_left <= 7:
-             status_icon = "🟡 임박"
-        else:
-             status_icon = "🟢 여유"
-             
-        # 도수
-        l_sph = safe_float(row.get('optometry.data.optimal.left.sph'))
-        l_cyl = safe_float(row.get('optometry.data.optimal.left.cyl'))
-        l_axi = safe_float(row.get('optometry.data.optimal.left.axi'))
-        l_add = safe_float(row.get('optometry.data.optimal.left.add'))
-        l_pd  = safe_float(row.get('optometry.data.optimal.left.pd'))
- 
-        r_sph = safe_float(row.get('optometry.data.optimal.right.sph'))
-        r_cyl = safe_float(row.get('optometry.data.optimal.right.cyl'))
-        r_axi = safe_float(row.get('optometry.data.optimal.right.axi'))
-        r_add = safe_float(row.get('optometry.data.optimal.right.add'))
-        r_pd  = safe_float(row.get('optometry.data.optimal.right.pd'))
-
-        def format_opt(v):
-            return f"{v:+.2f}".replace("+0.00", "0.00")
-            
-        def build_dosu(sph, cyl, axi, add):
-            s_str = f"S{format_opt(sph)}"
-            c_str = f"C{format_opt(cyl)}"
-            a_str = f"A{int(axi)}"
-            add_str = f" Add{add:.2f}" if add != 0.0 else ""
-            return f"{s_str} {c_str} {a_str}{add_str}"
-
-        dosu_L = build_dosu(l_sph, l_cyl, l_axi, l_add)
-        dosu_R = build_dosu(r_sph, r_cyl, r_axi, r_add)
-        
-        # 렌즈 정보 (매핑본)
-        l_name = get_lens_display_name(l_skus, mappings) if l_skus else ""
-        r_name = get_lens_display_name(r_skus, mappings) if r_skus else ""
-        if l_name == r_name and l_name != "":
-            lens_info = l_name
-        else:
-            lens_info = " / ".join([n for n in [l_name, r_name] if n])
-        
-        parsed_rows.append({
-            '_id': row['id'],
-            '_cid': row.get('customer.id', ''),
-            '선택(다운로드)': False,
-            '고객명': row.get('customer.name', ''),
-            '주문번호': row.get('code', ''),
-            '렌즈정보': lens_info,
-            '비고': f"L:{l_skus[0] if l_skus else ''} R:{r_skus[0] if r_skus else ''}",
-            'R도수': dosu_R,
-            'L도수': dosu_L,
-            '주문일': order_date.strftime("%Y-%m-%d"),
-            '반품기한': return_deadline.strftime("%Y-%m-%d"),
-            '잔여일': days_left,
-            '상태': status_icon,
-            '브랜드': brand,
-            # 매칭용
-            '_L_sph': l_sph, '_L_cyl': l_cyl, '_L_axi': l_axi, '_L_add': l_add, '_L_pd': l_pd,
-            '_R_sph': r_sph, '_R_cyl': r_cyl, '_R_axi': r_axi, '_R_add': r_add, '_R_pd': r_pd,
-            '반품상황': '반품없음'
-        })
-        
-    df_rx = pd.DataFrame(parsed_rows)
-    df_as = pd.DataFrame(as_rows)
+
+    def col(name):
+        return df[name] if name in df.columns else pd.Series("", index=df.index, dtype=object)
+
+    def sku_info(sku_text):
+        """SKU 원문 → (RX 여부, 브랜드, 첫 SKU, 목록 유무, 표시 이름(매핑본))"""
+        skus = parse_skus(sku_text)
+        name = get_lens_display_name(skus, mappings) if skus else ""
+        return is_rx_lens(skus), extract_brand(skus), str(skus[0]) if skus else "", bool(skus), name
+
+    def sku_frame(values):
+        # 렌즈 SKU는 종류가 적으므로 원문 단위로 한 번만 해석
+        return pd.DataFrame(map_unique(values, sku_info).tolist(), index=values.index,
+                            columns=['rx', 'brand', 'first', 'has', 'name'])
+
+    l_type = col('lensType').astype(str).str.strip().str.lower()
+    df_as = df[l_type == 'as']
+    df_as = df_as.copy() if not df_as.empty else pd.DataFrame()
+    custom = df[l_type == 'custom']
+    if custom.empty:
+        return pd.DataFrame(), df_as
+
+    l_info = sku_frame(col('lens.left.skus')[custom.index])
+    r_info = sku_frame(col('lens.right.skus')[custom.index])
+    is_rx = (l_info['rx'] | r_info['rx']).to_numpy(dtype=bool)
+    rx, l_info, r_info = custom[is_rx], l_info[is_rx], r_info[is_rx]
+    if rx.empty:
+        return pd.DataFrame(), df_as
+
+    def rx_col(name):
+        return rx[name] if name in rx.columns else pd.Series("", index=rx.index, dtype=object)
+
+    # RX 건 확인됨: 주문일 (기본값 fallback: 지금)
+    date_values = pd.Series([order_date_value(o, c) for o, c in zip(rx_col('orderItems').tolist(), rx_col('createdAt').tolist())],
+                            index=rx.index, dtype=object)
+    order_date = parse_presubmit_column(date_values).fillna(pd.Timestamp(now))
+
+    brand = pd.Series(np.where(l_info['has'], l_info['brand'], r_info['brand']), index=rx.index)
+    days_to_add = np.where(brand.isin(['zeiss', 'chemi']), 60, 55)
+    return_deadline = order_date + pd.to_timedelta(days_to_add, unit='D')
+    days_left = (return_deadline - now).dt.days
+
+    # 상태 & 하이라이트 아이콘
+    status_icon = np.select([days_left < 0, days_left <= 7], ["🔴 기한 만료", "🟡 임박"], default="🟢 여유")
+
+    # 도수
+    opt = {}
+    for side, key in [('left', 'L'), ('right', 'R')]:
+        for f in ['sph', 'cyl', 'axi', 'add', 'pd']:
+            opt[f'_{key}_{f}'] = np.array([safe_float(v) for v in rx_col(f'optometry.data.optimal.{side}.{f}').tolist()], dtype=float)
+    dosu_L = build_dosu_column(opt['_L_sph'], opt['_L_cyl'], opt['_L_axi'], opt['_L_add'])
+    dosu_R = build_dosu_column(opt['_R_sph'], opt['_R_cyl'], opt['_R_axi'], opt['_R_add'])
+
+    # 렌즈 정보 (매핑본)
+    l_name = l_info['name'].to_numpy(dtype=object)
+    r_name = r_info['name'].to_numpy(dtype=object)
+    joined = np.where((l_name != "") & (r_name != ""), l_name + " / " + r_name, np.where(l_name != "", l_name, r_name))
+    lens_info = np.where((l_name == r_name) & (l_name != ""), l_name, joined)
+
+    df_rx = pd.DataFrame({
+        '_id': rx['id'].to_numpy(),
+        '_cid': rx_col('customer.id').to_numpy(),
+        '선택(다운로드)': False,
+        '고객명': rx_col('customer.name').to_numpy(),
+        '주문번호': rx_col('code').to_numpy(),
+        '렌즈정보': lens_info,
+        '비고': ("L:" + l_info['first'] + " R:" + r_info['first']).to_numpy(),
+        'R도수': dosu_R.to_numpy(),
+        'L도수': dosu_L.to_numpy(),
+        '주문일': order_date.dt.strftime("%Y-%m-%d").to_numpy(),
+        '반품기한': return_deadline.dt.strftime("%Y-%m-%d").to_numpy(),
+        '잔여일': days_left.to_numpy(),
+        '상태': status_icon,
+        '브랜드': brand.to_numpy(),
+        # 매칭용
+        **opt,
+        '반품상황': '반품없음'
+    })
+    df_rx = df_rx.infer_objects()
     
     # ------------------
     # 반품 필요 상태 체크 로직
     # 동일 customer.id, name 이고 AS건이 존재하면 반품상황='반품필요'
     # ------------------
-    if not df_rx.empty and not df_as.empty:
-        for idx, r_row in df_rx.iterrows():
-            cid = str(r_row['_cid'])
-            cname = str(r_row['고객명'])
-            
-            matching_as = df_as[(df_as['customer.id'].astype(str) == cid) & (df_as['customer.name'].astype(str) == cname)]
-            if not matching_as.empty:
-                df_rx.at[idx, '반품상황'] = '⚠️반품필요'
+    if not df_as.empty:
+        as_keys = pd.MultiIndex.from_arrays([df_as['customer.id'].astype(str), df_as['customer.name'].astype(str)])
+        rx_keys = pd.MultiIndex.from_arrays([df_rx['_cid'].astype(str), df_rx['고객명'].astype(str)])
+        df_rx.loc[rx_keys.isin(as_keys), '반품상황'] = '⚠️반품필요'
     
     return df_rx, df_as
 
 
+# 요청 상태 → 반품상황 아이콘 (그 외 대체반품으로사용/주문은 🔄)
+STATUS_ICONS = {"반품완료": "✅", "대체반품대기": "📁"}
+
 def merge_return_status(df_rx):
-    """캐시 밖에서 호출: bms_return_requests의 최신 상태를 df_rx에 병합"""
+    """캐시 밖에서 호출: bms_return_requests의 최신 상태를 주문번호 기준으로 df_rx에 병합"""
     if df_rx.empty:
         return df_rx
     df_reqs = load_return_requests()
     if df_reqs.empty:
         return df_rx
-    for _, req in df_reqs.iterrows():
-        code = req['order_code']
-        status = req['status']
-        if code in df_rx['주문번호'].values:
-            if status == "반품완료":
-                icon = "✅"
-            elif status == "대체반품대기":
-                icon = "📁"
-            else:
-                icon = "🔄"
-            df_rx.loc[df_rx['주문번호'] == code, '반품상황'] = f"{icon}{status}"
-            if status == "반품완료" and 'returned_at' in req:
-                df_rx.loc[df_rx['주문번호'] == code, '반품완료일'] = req['returned_at']
+    # 같은 주문번호 요청이 여러 건이면 마지막 요청 기준 (순서대로 덮어쓰던 기존 동작과 같음)
+    reqs = df_reqs.drop_duplicates('order_code', keep='last').set_index('order_code')
+    matched = df_rx['주문번호'].isin(reqs.index)
+    if not matched.any():
+        return df_rx
+    status = df_rx.loc[matched, '주문번호'].map(reqs['status'])
+    icons = status.map(STATUS_ICONS).fillna("🔄")
+    df_rx.loc[matched, '반품상황'] = icons + status.astype(str)
+    if 'returned_at' in reqs.columns:
+        done = status[status == "반품완료"].index
+        if len(done):
+            df_rx.loc[done, '반품완료일'] = df_rx.loc[done, '주문번호'].map(reqs['returned_at'])
     return df_rx
 
 # ==========================================
 # [7. 대체 반품 찾기 (매칭)]
 # ==========================================
 @st.cache_data(show_spinner=False)
-def find_alt_returns(df_rx):
-    """자신 외에 과거의 도수가 오차범위 내인 주문 찾기"""
+def find_alt_returns(df_rx, engine="auto"):
+    """자신 외에 과거의 도수가 오차범위 내인 주문 찾기 (bms_rx_matcher: 타일 단위 일괄 비교 / 브랜드·SPH 칸 묶음)"""
     if df_rx.empty: return df_rx
 
-    df_rx['대체반주문(유사건)'] = ""
-
-    def is_match(r1, r2):
-        if r1['_id'] == r2['_id']: return False
-        if str(r1['_cid']) == str(r2['_cid']): return False  # 동일 고객 제외
-        if r2['잔여일'] < 0: return False                     # 기한 만료 후보 제외
-        if r1['브랜드'] != r2['브랜드']: return False          # 브랜드 불일치 제외
-
-        # 오차 기준 (SPH/CYL/ADD ±0.5, AXIS ±15, PD ±3)
-        if abs(r1['_L_sph'] - r2['_L_sph']) > 0.5: return False
-        if abs(r1['_L_cyl'] - r2['_L_cyl']) > 0.5: return False
-        if abs(r1['_L_add'] - r2['_L_add']) > 0.5: return False
-        if abs(r1['_L_axi'] - r2['_L_axi']) > 15: return False
-        if abs(r1['_L_pd'] - r2['_L_pd']) > 3: return False
-
-        if abs(r1['_R_sph'] - r2['_R_sph']) > 0.5: return False
-        if abs(r1['_R_cyl'] - r2['_R_cyl']) > 0.5: return False
-        if abs(r1['_R_add'] - r2['_R_add']) > 0.5: return False
-        if abs(r1['_R_axi'] - r2['_R_axi']) > 15: return False
-        if abs(r1['_R_pd'] - r2['_R_pd']) > 3: return False
-
-        return True
-
-    for idx, row in df_rx.iterrows():
-        matches = []
-        for jdx, cand in df_rx.iterrows():
-            if idx == jdx: continue
-            if is_match(row, cand):
-                matches.append((cand['잔여일'], cand['주문번호'] + f" ({cand['잔여일']}일 남음)"))
-
-        # 잔여일 오름차순 정렬 (기한 촉박한 건 먼저)
-        matches.sort(key=lambda x: x[0])
-        if matches:
-            df_rx.at[idx, '대체반주문(유사건)'] = "\n".join(label for _, label in matches)
-
+    df_rx['대체반주문(유사건)'] = find_matches(df_rx, engine=engine)
     return df_rx
 
 # ==========================================
@@ -452,6 +459,11 @@ def find_alt_returns(df_rx):
 def main():
     st.title("🔄 브리즘 RX 렌즈 반품 관리")
     st.caption("최근 100일 기준 `lenstype = custom` 중 RX 렌즈 주문만 자동으로 필터링합니다.")
+
+    # 저장 후 st.rerun() 직전에 남긴 결과 메시지 표시 (대기 없이 바로 새로고침)
+    toast_msg = st.session_state.pop('return_toast', None)
+    if toast_msg:
+        st.toast(toast_msg, icon="✅")
     
     df_raw = load_return_data()
     if df_raw.empty:
@@ -548,28 +560,19 @@ def main():
         with col_d1:
             btn_wait_label = f"📁 선택한 {len(selected_rows)}건 대체반품대기 등록" if not selected_rows.empty else "📁 대체반품대기 등록"
             if st.button(btn_wait_label, use_container_width=True, disabled=selected_rows.empty):
-                success_count = 0
-                for _, row in selected_rows.iterrows():
-                    full_row = df_rx[df_rx['주문번호'] == row['주문번호']].iloc[0]
-                    if update_request_status(row['주문번호'], "대체반품대기", full_row):
-                        success_count += 1
+                results = bulk_update_request_status(selected_request_updates(df_rx, selected_rows, "대체반품대기"))
+                success_count = sum(results.values())
                 if success_count > 0:
-                    st.success(f"{success_count}건이 대체반품대기로 등록되었습니다.")
+                    st.session_state['return_toast'] = f"{success_count}건이 대체반품대기로 등록되었습니다."
                     st.session_state['switch_to_tab2'] = True
-                    time.sleep(1)
                     st.rerun()
         with col_d2:
             btn_label = f"✅ 선택한 {len(selected_rows)}건 반품완료 등록" if not selected_rows.empty else "✅ 반품완료 등록"
             if st.button(btn_label, type="primary", use_container_width=True, disabled=selected_rows.empty):
-                success_count = 0
-                for _, row in selected_rows.iterrows():
-                    full_row = df_rx[df_rx['주문번호'] == row['주문번호']].iloc[0]
-                    if update_request_status(row['주문번호'], "반품완료", full_row):
-                        success_count += 1
-
+                results = bulk_update_request_status(selected_request_updates(df_rx, selected_rows, "반품완료"))
+                success_count = sum(results.values())
                 if success_count > 0:
-                    st.success(f"{success_count}건의 주문이 '반품완료'로 등록되었습니다.")
-                    time.sleep(1)
+                    st.session_state['return_toast'] = f"{success_count}건의 주문이 '반품완료'로 등록되었습니다."
                     st.rerun()
             
         st.divider()
@@ -622,11 +625,13 @@ def main():
                             if st.button("🔄 대체반품하기", key=btn_key, use_container_width=True, type="primary"):
                                 alt_status = f"대체반품으로사용({sel_code} {tgt_row['고객명']})"
                                 origin_status = f"대체반품으로주문({alt_row['주문번호']} {alt_row['고객명']})"
-                                update_request_status(alt_row['주문번호'], alt_status, alt_row)
-                                update_request_status(sel_code, origin_status, tgt_row)
-                                st.success(f"완료: [{alt_row['주문번호']}] → 대체반품으로 사용 처리됐습니다.")
-                                time.sleep(1)
-                                st.rerun()
+                                results = bulk_update_request_status([
+                                    (alt_row['주문번호'], alt_status, alt_row),
+                                    (sel_code, origin_status, tgt_row),
+                                ])
+                                if all(results.values()):
+                                    st.session_state['return_toast'] = f"완료: [{alt_row['주문번호']}] → 대체반품으로 사용 처리됐습니다."
+                                    st.rerun()
                 else:
                     st.info("매칭된 대체 반품 주문이 없습니다.")
                     
@@ -690,21 +695,22 @@ def main():
                 col_save, col_done = st.columns([1, 1])
                 with col_save:
                     if st.button("💾 변경 사항 저장", key="save_req_status_final", use_container_width=True):
-                        for _, r in edited_active.iterrows():
-                            update_request_status(r['order_code'], "대체반품대기")
-                        st.success("데이터베이스에 반영되었습니다.")
-                        time.sleep(1)
-                        st.rerun()
+                        results = bulk_update_request_status(
+                            [(code, "대체반품대기", None) for code in edited_active['order_code']]
+                        )
+                        if all(results.values()):
+                            st.session_state['return_toast'] = "데이터베이스에 반영되었습니다."
+                            st.rerun()
                 with col_done:
                     btn_done_label = f"✅ 선택한 {len(selected_active)}건 반품완료 등록" if not selected_active.empty else "✅ 반품완료 등록"
                     if st.button(btn_done_label, type="primary", use_container_width=True, disabled=selected_active.empty, key="tab2_done_btn"):
-                        for _, r in selected_active.iterrows():
-                            full_row = df_rx[df_rx['주문번호'] == r['order_code']]
-                            row_data = full_row.iloc[0] if not full_row.empty else None
-                            update_request_status(r['order_code'], "반품완료", row_data)
-                        st.success(f"{len(selected_active)}건이 반품완료로 등록되었습니다.")
-                        time.sleep(1)
-                        st.rerun()
+                        results = bulk_update_request_status(
+                            selected_request_updates(df_rx, selected_active, "반품완료", code_col='order_code')
+                        )
+                        success_count = sum(results.values())
+                        if success_count > 0:
+                            st.session_state['return_toast'] = f"{success_count}건이 반품완료로 등록되었습니다."
+                            st.rerun()
 
                 st.divider()
                 st.subheader("🔍 상세 조회 및 대체 반품 비교")
@@ -749,11 +755,13 @@ def main():
                                     )
                                 with col_b2:
                                     if st.button("🔄 대체반품하기", key=f"tab2_alt_{alt2_row['주문번호']}", use_container_width=True, type="primary"):
-                                        update_request_status(alt2_row['주문번호'], f"대체반품으로사용({sel2_code} {tgt2_row['고객명']})", alt2_row)
-                                        update_request_status(sel2_code, f"대체반품으로주문({alt2_row['주문번호']} {alt2_row['고객명']})", tgt2_row)
-                                        st.success(f"완료: [{alt2_row['주문번호']}] → 대체반품으로 사용 처리됐습니다.")
-                                        time.sleep(1)
-                                        st.rerun()
+                                        results = bulk_update_request_status([
+                                            (alt2_row['주문번호'], f"대체반품으로사용({sel2_code} {tgt2_row['고객명']})", alt2_row),
+                                            (sel2_code, f"대체반품으로주문({alt2_row['주문번호']} {alt2_row['고객명']})", tgt2_row),
+                                        ])
+                                        if all(results.values()):
+                                            st.session_state['return_toast'] = f"완료: [{alt2_row['주문번호']}] → 대체반품으로 사용 처리됐습니다."
+                                            st.rerun()
                         else:
                             st.info("매칭된 대체 반품 주문이 없습니다.")
 
@@ -818,15 +826,16 @@ def main():
                 selected_done = edited_done[edited_done['선택'] == True]
                 btn_revert_label = f"↩️ 선택한 {len(selected_done)}건 원상태로 되돌리기" if not selected_done.empty else "↩️ 원상태로 되돌리기"
                 if st.button(btn_revert_label, disabled=selected_done.empty, use_container_width=True):
+                    revert_codes = []
                     for _, done_row in selected_done.iterrows():
                         status_val = str(done_row['status'])
                         paired_match = re.match(r'대체반품으로(?:사용|주문)\((\S+)', status_val)
                         if paired_match:
-                            delete_return_request(paired_match.group(1))
-                        delete_return_request(done_row['order_code'])
-                    st.success(f"{len(selected_done)}건을 원상태로 복구했습니다.")
-                    time.sleep(1)
-                    st.rerun()
+                            revert_codes.append(paired_match.group(1))
+                        revert_codes.append(done_row['order_code'])
+                    if delete_return_requests(revert_codes):
+                        st.session_state['return_toast'] = f"{len(selected_done)}건을 원상태로 복구했습니다."
+                        st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,147 @@
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# [설정 구간]
+# 반품 대시보드의 대체 반품 후보 찾기
+# 같은 브랜드이면서 양쪽 도수가 모두 오차 범위 안인 다른 고객의 (기한이 남은) 주문
+# ==========================================
+# 비교할 도수 컬럼과 허용 오차 (SPH/CYL/ADD ±0.5, AXIS ±15, PD ±3)
+MATCH_FIELDS = [("sph", 0.5), ("cyl", 0.5), ("add", 0.5), ("axi", 15), ("pd", 3)]
+MATCH_COLUMNS = [f"_{side}_{f}" for side in ("L", "R") for f, _ in MATCH_FIELDS]
+MATCH_TOLERANCES = np.array([tol for _ in ("L", "R") for _, tol in MATCH_FIELDS], dtype=float)
+
+# bucket 엔진: 브랜드 + 좌/우 SPH 칸으로 묶어 이웃 칸의 후보만 비교
+# 칸 폭이 SPH 허용 오차(0.5)의 두 배라 바로 옆 칸까지만 보면 빠지는 후보가 없음
+SPH_CELL = 1.0
+L_SPH, R_SPH = MATCH_COLUMNS.index("_L_sph"), MATCH_COLUMNS.index("_R_sph")
+
+# broadcast 엔진: 같은 브랜드 안에서 (기준 TILE_ROWS행 × 후보 TILE_COLS행) 타일 단위로 한꺼번에 비교
+# 타일 하나가 쓰는 메모리는 TILE_ROWS * TILE_COLS 크기의 배열 몇 개로 고정
+TILE_ROWS = 512
+TILE_COLS = 4096
+# engine="auto": 이 행 수까지는 broadcast(평소 100일 조회 범위), 그보다 많으면 bucket
+# (bench_rx_matcher.py --crossover 측정: 도수가 넓게 퍼진 데이터에서 3000~4000행 사이부터 bucket이 빠름)
+AUTO_BROADCAST_MAX_ROWS = 3000
+# ==========================================
+
+def _match_inputs(df_rx):
+    """df_rx → 비교용 배열 (id, 고객 id 문자열, 잔여일, 브랜드, (n, 10) 도수 배열)"""
+    ids = df_rx["_id"].to_numpy(dtype=object)
+    cids = df_rx["_cid"].astype(str).to_numpy(dtype=object)
+    days = df_rx["잔여일"].to_numpy()
+    brands = df_rx["브랜드"].to_numpy(dtype=object)
+    X = df_rx[MATCH_COLUMNS].to_numpy(dtype=float)
+    return ids, cids, days, brands, X
+
+def _block_pairs(X, ids, cids, query, cand):
+    """query 행들 × cand 행들 중 오차 범위 안이고 자신/동일 고객이 아닌 (기준, 후보) 위치 쌍"""
+    # 원래 비교(abs(차이) > 오차면 탈락)와 같게: NaN이 섞인 차이는 탈락시키지 않음
+    diff = np.abs(X[query][:, None, :] - X[cand][None, :, :])
+    ok = ~(diff > MATCH_TOLERANCES).any(axis=2)
+    ok &= ids[query][:, None] != ids[cand][None, :]     # 자기 자신 제외
+    ok &= cids[query][:, None] != cids[cand][None, :]   # 동일 고객 제외
+    qi, cj = np.nonzero(ok)
+    return query[qi], cand[cj]
+
+def match_pairs_bucketed(ids, cids, days, brands, X, block_rows=256):
+    """(기준 행 위치, 후보 행 위치) 배열.
+    같은 칸의 기준 행들은 이웃 칸 후보를 공유하므로 칸 단위로 한 번에 비교"""
+    n = len(X)
+    cell_l = np.floor(X[:, L_SPH] / SPH_CELL)
+    cell_r = np.floor(X[:, R_SPH] / SPH_CELL)
+    # SPH가 NaN인 주문은 칸을 정할 수 없으므로 같은 브랜드 전체와 비교
+    wild = np.isnan(cell_l) | np.isnan(cell_r)
+
+    queries = defaultdict(list)
+    buckets = defaultdict(list)
+    wild_by_brand = defaultdict(list)
+    by_brand = defaultdict(list)
+    for j in range(n):
+        key = (brands[j], None, None) if wild[j] else (brands[j], int(cell_l[j]), int(cell_r[j]))
+        queries[key].append(j)
+        if days[j] < 0: continue  # 기한 만료 건은 후보가 될 수 없음
+        by_brand[brands[j]].append(j)
+        if wild[j]:
+            wild_by_brand[brands[j]].append(j)
+        else:
+            buckets[key].append(j)
+
+    rows, cols = [], []
+    for (b, l, r), query in queries.items():
+        if l is None:
+            parts = [by_brand.get(b, [])]
+        else:
+            parts = [buckets.get((b, l + dl, r + dr), []) for dl in (-1, 0, 1) for dr in (-1, 0, 1)]
+            parts.append(wild_by_brand.get(b, []))
+        cand = np.fromiter((j for p in parts for j in p), dtype=np.int64)
+        if cand.size == 0: continue
+        query = np.array(query, dtype=np.int64)
+        for start in range(0, query.size, block_rows):
+            qi, cj = _block_pairs(X, ids, cids, query[start:start + block_rows], cand)
+            rows.append(qi)
+            cols.append(cj)
+
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+def match_pairs_broadcast(ids, cids, days, brands, X):
+    """(기준 행 위치, 후보 행 위치) 배열. 조건을 모두 불리언 마스크로 계산 (파이썬 반복은 타일 수만큼)"""
+    # 문자열/객체 비교 대신 정수 코드 비교
+    id_codes = pd.factorize(ids)[0]
+    cid_codes = pd.factorize(cids)[0]
+    brand_codes = pd.factorize(brands)[0]
+    valid = days >= 0  # 기한 만료 건은 후보가 될 수 없음
+
+    rows, cols = [], []
+    for brand in np.unique(brand_codes):
+        query_all = np.flatnonzero(brand_codes == brand)
+        cand_all = query_all[valid[query_all]]
+        if cand_all.size == 0: continue
+        for qs in range(0, query_all.size, TILE_ROWS):
+            query = query_all[qs:qs + TILE_ROWS]
+            for cs in range(0, cand_all.size, TILE_COLS):
+                cand = cand_all[cs:cs + TILE_COLS]
+                ok = id_codes[query][:, None] != id_codes[cand][None, :]      # 자기 자신 제외
+                ok &= cid_codes[query][:, None] != cid_codes[cand][None, :]   # 동일 고객 제외
+                # 원래 비교(abs(차이) > 오차면 탈락)와 같게: NaN이 섞인 차이는 탈락시키지 않음
+                for k, tol in enumerate(MATCH_TOLERANCES):
+                    ok &= ~(np.abs(X[query, k][:, None] - X[cand, k][None, :]) > tol)
+                qi, cj = np.nonzero(ok)
+                rows.append(query[qi])
+                cols.append(cand[cj])
+
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+MATCH_ENGINES = {
+    "bucket": match_pairs_bucketed,
+    "broadcast": match_pairs_broadcast,
+}
+
+def find_matches(df_rx, engine="auto"):
+    """행마다 대체 반품 후보 라벨 ("주문번호 (N일 남음)") 을 잔여일 오름차순으로 줄바꿈 연결 (후보 없으면 "").
+    engine: "bucket", "broadcast", "auto" (행 수에 따라 선택) — 결과는 엔진과 무관하게 같음"""
+    n = len(df_rx)
+    if n == 0:
+        return []
+    if engine == "auto":
+        engine = "broadcast" if n <= AUTO_BROADCAST_MAX_ROWS else "bucket"
+    ids, cids, days, brands, X = _match_inputs(df_rx)
+    rows, cols = MATCH_ENGINES[engine](ids, cids, days, brands, X)
+
+    # 기준 행 → 잔여일 → 원래 행 순서 (엔진과 무관하게 기존 list.sort의 안정 정렬과 같은 순서)
+    order = np.lexsort((cols, days[cols], rows))
+    rows, cols = rows[order], cols[order]
+
+    codes = df_rx["주문번호"].astype(str).to_numpy(dtype=object)
+    labels = [f"{code} ({d}일 남음)" for code, d in zip(codes, days.tolist())]
+    result = [""] * n
+    if rows.size:
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(rows)) + 1))
+        for start, group in zip(starts, np.split(cols, starts[1:])):
+            result[rows[start]] = "\n".join(labels[j] for j in group.tolist())
+    return result
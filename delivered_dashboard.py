@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
 import os
+import re
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from bms_order_store import load_orders, load_distinct_values, invalidate_store, data_version
+from bms_lens_sku import decode_lens_skus
+from bms_contacts import PHONES_COLUMN, format_contacts
 import sys
 import subprocess
 import time
@@ -27,15 +30,39 @@ TARGET_TABLE = "bms_orders"
 # ==========================================
 # [3. 데이터 로드 함수]
 # ==========================================
+STAFF_COLUMNS = ["statusDetail.lensStaff", "statusDetail.frameStaff"]
+
+def build_order_filters():
+    """process_delivered_data의 기간/상태/주문타입 조건을 저장소 조회 단계로 (줄인 결과를 pandas에서 한 번 더 확인).
+    담당자 조건은 넣지 않음: 담당자를 바꿔도 같은 데이터와 가공 캐시를 쓰고 process_delivered_data에서만 골라냄"""
+    # 날짜 문자열 형식(시간대) 차이를 감안해 하루 여유를 둠
+    cutoff = (pd.Timestamp.now(tz='UTC') - pd.DateOffset(months=2) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    return [
+        ("gte_or_null", "createdAt", cutoff),
+        ("in_ci", "status", ["delivered"]),
+        ("or", None, [
+            ("in_ci", "frameType", ["custom", "as"]),
+            ("in_ci", "lensType", ["custom", "as"]),
+            ("and", None, [("blank", "frameType", None), ("blank", "lensType", None)]),
+        ]),
+    ]
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_staff_names():
+    try:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            return []
+        return load_distinct_values(STAFF_COLUMNS, loading_text=st.empty())
+    except Exception as e:
+        st.error(f"담당자 목록 로드 중 오류: {e}")
+        return []
+
 @st.cache_data(ttl=600, show_spinner=False)
 def load_data():
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
             return pd.DataFrame()
         
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        all_data = []
-        
         # 🌟 deliveryDetail.memo 추가
         COLS = [
             "id", "createdAt", "status", "code", "frameType", "lensType",
@@ -45,35 +72,9 @@ def load_data():
             '"lens.left.skus"', '"lens.right.skus"',
             '"deliveryDetail.memo"'
         ]
-        cols = ",".join(COLS)
-        
-        offset = 0
-        page_size = 1000
+        # 공용 로컬 저장소에서 읽기 (변경된 주문만 Supabase에서 받아 반영)
         loading_text = st.empty()
-        
-        while True:
-            loading_text.text(f"⏳ 전체 과거 데이터를 불러오는 중입니다... ({offset}건 완료)")
-            
-            response = supabase.table(TARGET_TABLE)\
-                .select(cols)\
-                .order("id")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-                
-            data = response.data
-            if not data:
-                break
-                
-            all_data.extend(data)
-            
-            if len(data) < page_size:
-                break 
-                
-            offset += page_size
-            
-        loading_text.empty() 
-        
-        return pd.DataFrame(all_data) if all_data else pd.DataFrame()
+        return load_orders(COLS, filters=build_order_filters(), loading_text=loading_text, optional=[PHONES_COLUMN])
         
     except Exception as e:
         st.error(f"전체 데이터 로드 중 오류: {e}")
@@ -82,9 +83,45 @@ def load_data():
 # ==========================================
 # [4. 데이터 처리 로직 (배송완료)]
 # ==========================================
-def process_delivered_data(df, selected_staff):
-    if df.empty: return pd.DataFrame()
+FRAME_PREFIX_PATTERNS = [
+    re.compile(r'^frame_size_', flags=re.IGNORECASE),
+    re.compile(r'^(?:[a-z]+_)?front_color_', flags=re.IGNORECASE),
+    re.compile(r'^front_', flags=re.IGNORECASE),
+    re.compile(r'^temple_(?:[a-z]+_)?(?:temple_color_)?(?:color_)?', flags=re.IGNORECASE),
+]
+
+# 헬퍼 함수 1: 테 정보 예쁘게 파싱
+def _clean_prefix(val):
+    if pd.isna(val) or str(val).lower() == 'nan': return ""
+    v = str(val).strip()
+    for pattern in FRAME_PREFIX_PATTERNS:
+        v = pattern.sub('', v)
+    return v
+
+def build_frame_info(row):
+    size = _clean_prefix(row.get('frame.size', ''))
+    color = _clean_prefix(row.get('frame.color', ''))
+    front = _clean_prefix(row.get('frame.front', ''))
+    temple = _clean_prefix(row.get('frame.temple', ''))
     
+    res = ""
+    if front: res += f"👓 {front}"
+    if size: res += f" ({size})"
+    if color: res += f" 🎨 {color}"
+    if temple: res += f" 🦵 {temple}"
+    return res.strip()
+
+# 헬퍼 함수 2: 접수일 'YYYY-MM-DD'
+def format_date(created_at):
+    return pd.to_datetime(created_at, errors='coerce').strftime('%Y-%m-%d') if created_at else ""
+
+@st.cache_data(ttl=600, show_spinner=False)
+def build_delivered_table(_df, version):
+    """담당자 선택과 무관한 가공 단계 (전처리, 기간/상태/주문타입 필터, 표 구성).
+    같은 데이터(version)에는 한 번만 실행되고 체크박스 클릭 등으로 재실행될 때는 캐시 사용"""
+    if _df.empty: return pd.DataFrame()
+    df = _df.copy()
+
     # 전처리
     df['id'] = df['id'].astype(str).str.replace(r'\.0$', '', regex=True)
     df = df.fillna("")
@@ -122,101 +159,17 @@ def process_delivered_data(df, selected_staff):
         
     cond_clipon = cond_empty_frame & cond_empty_lens
     
-    target_df = df[cond_frame | cond_lens | cond_clipon].copy()
-    if target_df.empty: return pd.DataFrame()
-
-    # 조건 2: 담당자 매칭
-    cond_staff1 = False
-    cond_staff2 = False
-    if 'statusDetail.lensStaff' in target_df.columns:
-        cond_staff1 = target_df['statusDetail.lensStaff'].astype(str) == str(selected_staff)
-    if 'statusDetail.frameStaff' in target_df.columns:
-        cond_staff2 = target_df['statusDetail.frameStaff'].astype(str) == str(selected_staff)
-    
-    my_df = target_df[cond_staff1 | cond_staff2].copy()
+    # 담당자 매칭은 process_delivered_data에서 (이 단계 결과는 담당자 선택과 무관하게 캐시)
+    my_df = df[cond_frame | cond_lens | cond_clipon].copy()
     if my_df.empty: return pd.DataFrame()
 
-    # 헬퍼 함수 1: 전화번호 파싱
-    def parse_contacts(c_data):
-        if not c_data or str(c_data).strip() == "" or str(c_data).lower() == 'nan': 
-            return ""
-        c_str = str(c_data).strip()
-        import re
-        phones = re.findall(r"(?:010|02|03[1-3]|04[1-4]|05[1-5]|06[1-4])[-.]?\d{3,4}[-.]?\d{4}", c_str)
-        if phones: return ", ".join(phones)
-        return c_str
-
-    # 헬퍼 함수 2: 테 정보 예쁘게 파싱
-    def clean_prefix(val):
-        if pd.isna(val) or str(val).lower() == 'nan': return ""
-        v = str(val).strip()
-        import re
-        v = re.sub(r'^frame_size_', '', v, flags=re.IGNORECASE)
-        v = re.sub(r'^(?:[a-z]+_)?front_color_', '', v, flags=re.IGNORECASE)
-        v = re.sub(r'^front_', '', v, flags=re.IGNORECASE)
-        v = re.sub(r'^temple_(?:[a-z]+_)?(?:temple_color_)?(?:color_)?', '', v, flags=re.IGNORECASE)
-        return v
-
-    def build_frame_info(row):
-        size = clean_prefix(row.get('frame.size', ''))
-        color = clean_prefix(row.get('frame.color', ''))
-        front = clean_prefix(row.get('frame.front', ''))
-        temple = clean_prefix(row.get('frame.temple', ''))
-        
-        res = ""
-        if front: res += f"👓 {front}"
-        if size: res += f" ({size})"
-        if color: res += f" 🎨 {color}"
-        if temple: res += f" 🦵 {temple}"
-        return res.strip()
-
-    # 헬퍼 함수 3: 렌즈 정보 파싱
-    def parse_lens_skus(skus_data):
-        if pd.isna(skus_data) or str(skus_data).lower() == 'nan' or skus_data == "":
-            return ""
-        try:
-            import ast
-            import re
-            s_list = ast.literal_eval(skus_data) if isinstance(skus_data, str) else skus_data
-            if isinstance(s_list, list) and s_list:
-                main_sku = str(s_list[0])
-                parts = main_sku.split('-')
-                brand_key = parts[0] if len(parts) > 0 else ""
-                
-                idx_pos = -1
-                for i, p in enumerate(parts):
-                    if re.match(r'^1\.[5-9]\d*$', p):
-                        idx_pos = i; break
-
-                refractive_index = parts[idx_pos] if idx_pos != -1 else ""
-                mid_parts = parts[1:idx_pos] if idx_pos != -1 else parts[1:]
-                l_type = mid_parts[0] if len(mid_parts) > 0 else ""
-                
-                main_str = f"[{brand_key.capitalize()}] {l_type} {refractive_index}".strip()
-                main_str = re.sub(r'\s+', ' ', main_str)
-
-                # 옵션 파싱 (간략화)
-                options = [str(x) for x in s_list[1:]]
-                opt_strs = []
-                for opt in options:
-                    o = re.sub(r'^(zeiss-[a-z]+-|nikon-[a-z]+-|chemi-[a-z]+-|varilux-[a-z]+-|baseColor_|mirrorColor_)', '', opt, flags=re.IGNORECASE)
-                    if o and o.lower() != "nan": opt_strs.append(o)
-
-                unique_opts = list(dict.fromkeys(opt_strs))
-                opt_str = ", ".join(unique_opts)
-
-                if opt_str: return f"{main_str} / {opt_str}"
-                return main_str
-
-        except Exception: return str(skus_data)
-        return str(skus_data)
-
     results = []
-    for _, row in my_df.iterrows():
+    # iterrows 대신 dict 행으로 순회 (행마다 Series를 만들지 않음)
+    for row in my_df.to_dict('records'):
         frame_info = build_frame_info(row)
         
-        l_lens_raw = parse_lens_skus(row.get('lens.left.skus', ''))
-        r_lens_raw = parse_lens_skus(row.get('lens.right.skus', ''))
+        l_lens_raw = decode_lens_skus(row.get('lens.left.skus', ''))
+        r_lens_raw = decode_lens_skus(row.get('lens.right.skus', ''))
         
         l_lens_str = f"🅻 {l_lens_raw}" if l_lens_raw else ""
         r_lens_str = f"🆁 {r_lens_raw}" if r_lens_raw else ""
@@ -236,8 +189,7 @@ def process_delivered_data(df, selected_staff):
         else:
             order_type_str = "기타"
 
-        createdAt = row.get('createdAt', '')
-        date_str = pd.to_datetime(createdAt, errors='coerce').strftime('%Y-%m-%d') if createdAt else ""
+        date_str = format_date(row.get('createdAt', ''))
 
         results.append({
             'key_id': row['id'],
@@ -246,17 +198,26 @@ def process_delivered_data(df, selected_staff):
             '주문타입': order_type_str,
             '주문번호': row.get('code', ''),
             '이름': row.get('customer.name', ''),
-            '전화번호': parse_contacts(row.get('customer.contacts', '')),
+            '전화번호': row.get(PHONES_COLUMN) or format_contacts(row.get('customer.contacts', '')),
             '테정보': frame_info,
             'L렌즈': l_lens_str,
             'R렌즈': r_lens_str,
+            **{c: str(row.get(c, '')) for c in STAFF_COLUMNS},
         })
 
-    final_df = pd.DataFrame(results)
-    if not final_df.empty:
-        final_df = final_df.sort_values(by='접수일', ascending=False)
-    
-    return final_df
+    return pd.DataFrame(results)
+
+def process_delivered_data(df, selected_staff):
+    """캐시된 수령 완료 주문 표에서 담당자 주문만 골라 접수일 최신순으로 (재실행마다 이 부분만 실행)"""
+    if df.empty: return pd.DataFrame()
+    table = build_delivered_table(df, data_version(df))
+    if table.empty: return pd.DataFrame()
+
+    # 조건 2: 담당자 매칭
+    is_mine = (table[STAFF_COLUMNS] == str(selected_staff)).any(axis=1)
+    final_df = table[is_mine].drop(columns=STAFF_COLUMNS).reset_index(drop=True)
+    if final_df.empty: return pd.DataFrame()
+    return final_df.sort_values(by='접수일', ascending=False)
 
 # ==========================================
 # [5. 메인 UI 함수]
@@ -274,6 +235,7 @@ def main():
     st.sidebar.title("설정")
     
     if st.sidebar.button("🔄 화면 새로고침"):
+        invalidate_store()
         st.cache_data.clear()
         st.rerun()
 
@@ -285,13 +247,8 @@ def main():
     st.sidebar.markdown("---")
 
     # --- 데이터 로드 및 담당자 선택 ---
-    df = load_data()
-    if df.empty: st.warning("데이터가 없습니다."); return
-
-    all_staff = set()
-    if 'statusDetail.lensStaff' in df.columns: all_staff.update(df['statusDetail.lensStaff'].dropna().astype(str).unique())
-    if 'statusDetail.frameStaff' in df.columns: all_staff.update(df['statusDetail.frameStaff'].dropna().astype(str).unique())
-    raw_staff_list = [s for s in all_staff if s and s.strip() != "" and s != "nan"]
+    raw_staff_list = [s for s in load_staff_names() if s and s.strip() != "" and s != "nan"]
+    if not raw_staff_list: st.warning("데이터가 없습니다."); return
     def staff_sort_key(name):
         n = name.lower().strip()
         if n == 'sen': return 0
@@ -305,6 +262,7 @@ def main():
 
     # --- 메인 화면 ---
     st.title(f"📦 {selected_staff}님의 수령피드백 관리")
+    df = load_data()
     result_df = process_delivered_data(df, selected_staff)
     
     if result_df.empty: st.info(f"최근 수령피드백 내역이 없습니다."); return
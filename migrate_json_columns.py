@@ -0,0 +1,97 @@
+import sys
+import json
+from bms_paged_loader import fetch_all_rows
+from bms_json_columns import JSON_COLUMNS, parse_json_value, to_json_text
+from bms_order_store import reset_store
+from bms_full_sync import (SUPABASE_URL, SUPABASE_KEY, TARGET_TABLE,
+                           get_table_columns, get_json_columns, upsert_records)
+
+# 리스트/딕셔너리 컬럼(JSON_COLUMNS)을 jsonb로 옮기는 일회성 스크립트
+# 1) 예전 동기화가 str(x)로 저장한 파이썬 표현("['a', 'b']")을 JSON 문자열로 일괄 변환
+# 2) 남은 컬럼 타입 변경은 PostgREST로 할 수 없으므로 SQL Editor에서 실행할 SQL 안내
+# 다시 실행해도 이미 JSON인 값은 건드리지 않음
+
+# JSON이 아닌 값(잘린 문자열, 일반 텍스트 등)은 jsonb 문자열로 보관
+TRY_JSONB_SQL = """CREATE OR REPLACE FUNCTION pg_temp.try_jsonb(t text) RETURNS jsonb AS $$
+BEGIN
+    RETURN t::jsonb;
+EXCEPTION WHEN others THEN
+    RETURN to_jsonb(t);
+END $$ LANGUAGE plpgsql;"""
+
+class PrintProgress:
+    """fetch_all_rows의 loading_text 자리에 넣어 진행 상황을 콘솔에 출력"""
+    def text(self, msg):
+        print(msg)
+
+def alter_sql(columns):
+    lines = [TRY_JSONB_SQL]
+    for c in columns:
+        lines.append(f'ALTER TABLE {TARGET_TABLE} ALTER COLUMN "{c}" TYPE jsonb '
+                     f'USING pg_temp.try_jsonb(NULLIF(trim("{c}"), \'\'));')
+    lines.append("NOTIFY pgrst, 'reload schema';")
+    return "\n".join(lines)
+
+def to_json_cell(value):
+    """text 컬럼 값 → JSON 문자열로 바꿀 값 (이미 JSON이거나 해석할 수 없으면 그대로)"""
+    if not isinstance(value, str) or value.strip()[:1] not in ("[", "{"):
+        return value
+    try:
+        json.loads(value)
+        return value
+    except ValueError:
+        pass
+    parsed = parse_json_value(value)
+    return value if parsed is None else to_json_text(parsed)
+
+def migrate():
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("❌ Supabase 환경 변수가 설정되지 않았습니다.")
+        return False
+
+    # 1. 아직 text인 JSON 컬럼 확인 (jsonb 컬럼에 문자열을 쓰면 안 되므로 타입을 모르면 중단)
+    json_columns = get_json_columns(SUPABASE_URL, SUPABASE_KEY, TARGET_TABLE)
+    if json_columns is None:
+        print("❌ 컬럼 타입을 확인할 수 없어 중단합니다.")
+        return False
+    table_columns = get_table_columns(SUPABASE_URL, SUPABASE_KEY, TARGET_TABLE)
+    columns = [c for c in JSON_COLUMNS
+               if c not in json_columns and (not table_columns or c in table_columns)]
+    if not columns:
+        print("✅ 모든 JSON 컬럼이 이미 jsonb입니다.")
+        return True
+
+    # 2. 파이썬 표현으로 저장된 값을 JSON 문자열로 변환
+    rows = fetch_all_rows(
+        lambda client: client.table(TARGET_TABLE).select(",".join(["id"] + [f'"{c}"' for c in columns])),
+        loading_text=PrintProgress(),
+        parallel=True,
+        label="JSON 컬럼"
+    )
+    records = []
+    for r in rows:
+        # upsert 묶음 안의 모든 행이 같은 컬럼을 가져야 하므로 바뀌지 않은 컬럼도 함께 전송
+        record = {"id": r["id"], **{c: to_json_cell(r.get(c)) for c in columns}}
+        if any(record[c] != r.get(c) for c in columns):
+            records.append(record)
+
+    if records:
+        print(f"🔄 총 {len(rows)}건 중 {len(records)}건을 JSON 형식으로 바꿉니다...")
+        failed = upsert_records(records)
+        # 일부만 저장됐어도 updatedAt은 그대로라 로컬 주문 저장소가 알아채지 못함 → 다음 조회 때 전체 재수집
+        reset_store()
+        if failed:
+            failed_rows = sum(len(chunk["records"]) for chunk in failed)
+            print(f"⚠️ {failed_rows}건을 저장하지 못했습니다. 다시 실행하면 남은 주문만 처리합니다.")
+            return False
+        print(f"✅ {len(records)}건 변환 완료")
+    else:
+        print("✅ 변환할 값이 없습니다.")
+
+    # 3. 컬럼 타입 변경 안내
+    print("👉 Supabase SQL Editor에서 아래 SQL을 실행하면 jsonb로 바뀝니다. (이후 동기화는 JSON 그대로 저장)")
+    print(alter_sql(columns))
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if migrate() else 1)
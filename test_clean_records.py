@@ -0,0 +1,174 @@
+import copy
+import json
+import math
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("supabase")
+pytest.importorskip("dotenv")
+
+import bms_full_sync
+from bms_full_sync import build_order_row, clean_records
+from bms_json_columns import parse_json_value
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_api.json")
+
+# ==========================================
+# 기존 sync_to_supabase의 정리 로직 (clean_cell + 행 단위 루프) 그대로
+# ==========================================
+def baseline_clean_cell(x):
+    if isinstance(x, (list, dict)):
+        val = str(x)
+    else:
+        val = x
+    if isinstance(val, str) and len(val) > 30000:
+        return val[:30000] + "...(중략)"
+    return val
+
+def baseline_records(df, table_columns=None):
+    new_df = df.copy()
+    for col in new_df.columns:
+        new_df[col] = new_df[col].apply(baseline_clean_cell)
+
+    records = new_df.to_dict('records')
+    cleaned_records = []
+    for row in records:
+        if 'id' not in row or 'code' not in row:
+            continue
+        r_id = row['id']
+        r_code = row['code']
+        if r_id is None or str(r_id).strip() == "" or str(r_id).strip().lower() == "nan":
+            continue
+        if r_code is None or str(r_code).strip() == "" or str(r_code).strip().lower() == "nan":
+            continue
+
+        clean_row = {}
+        for k, v in row.items():
+            if table_columns and k not in table_columns:
+                continue
+
+            if v is None or (isinstance(v, float) and math.isnan(v)):
+                clean_row[k] = None
+            elif isinstance(v, str) and (v.strip().lower() == "nan" or v == ""):
+                clean_row[k] = None
+            else:
+                val_str = str(v)
+                if val_str.endswith('.0') and val_str[:-2].isdigit():
+                    clean_row[k] = val_str[:-2]
+                else:
+                    clean_row[k] = v
+
+        cleaned_records.append(clean_row)
+    return cleaned_records
+
+# ==========================================
+# test_api.json 기반 입력 프레임
+# ==========================================
+def load_detail():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return json.load(f)
+
+def variant(detail, i, **changes):
+    d = copy.deepcopy(detail)
+    d["id"] = detail["id"] + i
+    d["code"] = f"{detail['code']}-{i}"
+    d.update(changes)
+    return d
+
+def fixture_rows():
+    detail = load_detail()
+    return [
+        build_order_row(detail),
+        build_order_row(variant(detail, 1, note="", status="nan", storeId=12.0, optometryId=None)),
+        build_order_row(variant(detail, 2, note=" NaN ", storeId=float("nan"), useReference=False)),
+        build_order_row(variant(detail, 3, note="x" * 30010, updatedById=100.5, reservationId=[])),
+        build_order_row(variant(detail, 4, note="12.0", storeId=-3.0, customerId=1e16)),
+        build_order_row(variant(detail, 5, note=7.0, frame={"size": None, "price": 12.0})),
+        # 유령 행: id/code 없음, None, 빈 문자열, 'nan'
+        build_order_row(variant(detail, 6, id=None)),
+        build_order_row(variant(detail, 7, code="")),
+        build_order_row(variant(detail, 8, code=" nan ")),
+        build_order_row(variant(detail, 9, id=float("nan"))),
+        {k: v for k, v in build_order_row(variant(detail, 10)).items() if k != "code"},
+    ]
+
+def frames():
+    rows = fixture_rows()
+    yield "build_order_row", pd.DataFrame(rows)
+    yield "json_normalize", pd.json_normalize([load_detail()] + [
+        variant(load_detail(), i, note=v) for i, v in enumerate(["", "3.0", None, "nan"], 1)
+    ])
+    # id가 전부 정수(유령 행 없음) → int64 컬럼
+    yield "int_ids", pd.DataFrame(rows[:6])
+    yield "all_ghost", pd.DataFrame(rows[6:])
+
+FRAMES = list(frames())
+
+@pytest.fixture
+def no_json_columns(monkeypatch):
+    """기존 루프에는 JSON 컬럼 처리가 없으므로 비교할 때는 끔"""
+    monkeypatch.setattr(bms_full_sync, "JSON_COLUMNS", [])
+
+def assert_same_records(new, old):
+    assert len(new) == len(old)
+    for n, o in zip(new, old):
+        # 컬럼 순서까지 같아야 함
+        assert list(n) == list(o)
+        for k in o:
+            assert type(n[k]) is type(o[k]), k
+            assert n[k] == o[k], k
+
+# ==========================================
+# 테스트
+# ==========================================
+@pytest.mark.parametrize("name,df", FRAMES, ids=[name for name, _ in FRAMES])
+def test_matches_baseline(no_json_columns, name, df):
+    assert_same_records(clean_records(df), baseline_records(df))
+
+@pytest.mark.parametrize("name,df", FRAMES, ids=[name for name, _ in FRAMES])
+def test_matches_baseline_with_table_columns(no_json_columns, name, df):
+    table_columns = {"code", "note", "storeId", "frame.size", "frame.price", "reservationId", "없는컬럼"}
+    assert_same_records(clean_records(df, table_columns), baseline_records(df, table_columns))
+
+def test_ghost_rows_removed(no_json_columns):
+    df = pd.DataFrame(fixture_rows())
+    codes = [r["code"] for r in clean_records(df)]
+    assert codes == [r["code"] for r in baseline_records(df)]
+    assert len(codes) == 6
+
+def test_missing_key_column(no_json_columns):
+    df = pd.DataFrame(fixture_rows()).drop(columns="code")
+    assert clean_records(df) == baseline_records(df) == []
+
+def test_dot_zero_and_blank(no_json_columns):
+    records = {r["code"]: r for r in clean_records(pd.DataFrame(fixture_rows()))}
+    base = load_detail()["code"]
+    assert records[f"{base}-1"]["storeId"] == "12"
+    assert records[f"{base}-1"]["note"] is None
+    assert records[f"{base}-1"]["status"] is None
+    assert records[f"{base}-2"]["storeId"] is None
+    assert records[f"{base}-4"]["note"] == "12"
+    assert records[f"{base}-4"]["storeId"] == -3.0
+    assert records[f"{base}-3"]["note"].endswith("...(중략)")
+
+def _valid_rows(df):
+    ids = df["id"].astype(str).str.strip().str.lower()
+    codes = df["code"].astype(str).str.strip().str.lower()
+    return (~ids.isin(["", "nan", "none"]) & ~codes.isin(["", "nan", "none"])).to_numpy()
+
+def test_json_columns_as_json_text():
+    """JSON 컬럼만 JSON 문자열로 바뀌고 나머지는 기존과 같음"""
+    df = pd.DataFrame(fixture_rows())
+    new = clean_records(df)
+    old = baseline_records(df)
+    json_cols = set(bms_full_sync.JSON_COLUMNS) & set(df.columns)
+    assert json_cols
+    for n, o, src in zip(new, old, df[_valid_rows(df)].to_dict('records')):
+        assert list(n) == list(o)
+        for k in o:
+            if k in json_cols and isinstance(src[k], (list, dict)):
+                assert parse_json_value(n[k]) == src[k]
+            elif k not in json_cols:
+                assert n[k] == o[k], k
@@ -0,0 +1,65 @@
+import copy
+import json
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("supabase")
+pytest.importorskip("dotenv")
+
+from bms_full_sync import flatten_detail
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_api.json")
+
+# ==========================================
+# test_api.json 기반 상세 JSON
+# ==========================================
+def load_detail():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return json.load(f)
+
+def variant(detail, i, **changes):
+    d = copy.deepcopy(detail)
+    d["id"] = detail["id"] + i
+    d.update(changes)
+    return d
+
+def fixture_details():
+    detail = load_detail()
+    return [
+        detail,
+        # 빈 dict / None / 리스트로 바뀐 중첩 값
+        variant(detail, 1, frame={}, customer=None, orderItems=[]),
+        # 더 깊은 중첩, 숫자 키, 빈 중첩 dict
+        variant(detail, 2, data={"las": {"referenceId": 1, "nested": {"deep": "x", "empty": {}}}, 3: "three"}),
+        # 키 순서가 다른 주문
+        dict(reversed(list(variant(detail, 3).items()))),
+        # 상위 값만 있는 주문
+        {"id": detail["id"] + 4, "code": "DT-0000-0000", "note": None},
+    ]
+
+# ==========================================
+# 테스트
+# ==========================================
+@pytest.mark.parametrize("i", range(len(fixture_details())))
+def test_row_matches_json_normalize(i):
+    d = fixture_details()[i]
+    flat = flatten_detail(d)
+    expected = pd.json_normalize(d).to_dict('records')[0]
+    # 컬럼 순서까지 같아야 함
+    assert list(flat) == list(expected)
+    assert flat == expected
+
+def test_frame_matches_json_normalize():
+    details = fixture_details()
+    pd.testing.assert_frame_equal(
+        pd.DataFrame([flatten_detail(d) for d in details]),
+        pd.json_normalize(details),
+    )
+
+def test_does_not_modify_input():
+    d = load_detail()
+    before = copy.deepcopy(d)
+    flatten_detail(d)
+    assert d == before
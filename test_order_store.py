@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("supabase")
+pytest.importorskip("dotenv")
+
+import bms_order_store as store
+
+COLUMNS = ["id", "customer.name", "lens.left.skus"]
+
+class FakeRemote:
+    """Supabase bms_orders 대신: updatedAt >= since 조건을 서버처럼 경계값 포함으로 처리"""
+    def __init__(self, rows):
+        self.rows = {r["id"]: dict(r) for r in rows}
+        self.calls = []
+
+    def fetch(self, columns, since=None, loading_text=None):
+        self.calls.append(since)
+        return [{c: r.get(c) for c in columns} for r in self.rows.values()
+                if not since or r["updatedAt"] >= since]
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "STORE_PATH", str(tmp_path / "orders.sqlite"))
+    monkeypatch.setattr(store, "SUPABASE_URL", "http://example.invalid")
+    monkeypatch.setattr(store, "SUPABASE_KEY", "key")
+    fake = FakeRemote([
+        {"id": 1, "updatedAt": "2026-01-01T00:00:00Z", "customer.name": "가", "lens.left.skus": ["a", "b"]},
+        {"id": 2, "updatedAt": "2026-01-02T00:00:00Z", "customer.name": "나", "lens.left.skus": None},
+        {"id": 3, "updatedAt": "2026-01-02T00:00:00Z", "customer.name": None, "lens.left.skus": 1.5},
+    ])
+    monkeypatch.setattr(store, "_fetch_rows", fake.fetch)
+    return fake
+
+def test_unchanged_refresh_keeps_version(remote):
+    first = store.data_version(store.load_orders(COLUMNS))
+    # 변경분 조회가 경계 시각의 주문을 다시 받아도 내용이 같으면 버전 유지
+    store.refresh_store(COLUMNS, force=True)
+    store.refresh_store(COLUMNS, force=True)
+    assert remote.calls[-1] == "2026-01-02T00:00:00Z"
+    assert store.data_version(store.load_orders(COLUMNS)) == first
+
+def test_changed_row_bumps_version(remote):
+    first = store.data_version(store.load_orders(COLUMNS))
+    remote.rows[2].update({"updatedAt": "2026-01-03T00:00:00Z", "customer.name": "다"})
+    store.refresh_store(COLUMNS, force=True)
+    df = store.load_orders(COLUMNS)
+    assert store.data_version(df) != first
+    assert df.set_index("id").loc[2, "customer.name"] == "다"
+
+    # 바뀐 뒤 다시 조회해도 같은 내용이면 그대로
+    second = store.data_version(df)
+    store.refresh_store(COLUMNS, force=True)
+    assert store.data_version(store.load_orders(COLUMNS)) == second
+
+def test_changed_boundary_row_bumps_version(remote):
+    first = store.data_version(store.load_orders(COLUMNS))
+    # updatedAt이 그대로인 경계 행의 내용만 바뀐 경우도 반영
+    remote.rows[3]["customer.name"] = "라"
+    store.refresh_store(COLUMNS, force=True)
+    df = store.load_orders(COLUMNS)
+    assert store.data_version(df) != first
+    assert df.set_index("id").loc[3, "customer.name"] == "라"
+
+def test_new_row_bumps_version(remote):
+    first = store.data_version(store.load_orders(COLUMNS))
+    remote.rows[4] = {"id": 4, "updatedAt": "2026-01-04T00:00:00Z", "customer.name": "마", "lens.left.skus": []}
+    store.refresh_store(COLUMNS, force=True)
+    df = store.load_orders(COLUMNS)
+    assert store.data_version(df) != first
+    assert list(df["id"]) == [1, 2, 3, 4]
+
+# ==========================================
+# load_orders를 거치지 않은 DataFrame의 버전 (내용 해시)
+# ==========================================
+def test_data_version_of_plain_frame():
+    df = pd.DataFrame({"id": [1, 2], "a": ["x", "y"], "b": ["p", "q"]})
+    assert store.data_version(df) == store.data_version(df.copy())
+    # 행끼리 값이 바뀐 경우 (행 해시의 합은 같음)
+    swapped = pd.DataFrame({"id": [1, 2], "a": ["y", "x"], "b": ["q", "p"]})
+    assert store.data_version(swapped) != store.data_version(df)
+    # 행 순서, 컬럼명이 다른 경우
+    assert store.data_version(df.iloc[::-1]) != store.data_version(df)
+    assert store.data_version(df.rename(columns={"b": "c"})) != store.data_version(df)
+    assert store.data_version(pd.DataFrame()) == store.data_version(pd.DataFrame())
+
+def test_data_version_prefers_store_version(remote):
+    df = store.load_orders(COLUMNS)
+    assert store.data_version(df) == df.attrs["data_version"]
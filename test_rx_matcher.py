@@ -0,0 +1,176 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bms_rx_matcher
+from bms_rx_matcher import MATCH_ENGINES, _match_inputs, find_matches, match_pairs_broadcast, match_pairs_bucketed
+
+# ==========================================
+# 기존 find_alt_returns의 이중 iterrows 비교 그대로 (결과 컬럼 값 목록만 돌려줌)
+# ==========================================
+def baseline_find_alt_returns(df_rx):
+    df_rx = df_rx.copy()
+    df_rx['대체반주문(유사건)'] = ""
+
+    def is_match(r1, r2):
+        if r1['_id'] == r2['_id']: return False
+        if str(r1['_cid']) == str(r2['_cid']): return False  # 동일 고객 제외
+        if r2['잔여일'] < 0: return False                     # 기한 만료 후보 제외
+        if r1['브랜드'] != r2['브랜드']: return False          # 브랜드 불일치 제외
+
+        if abs(r1['_L_sph'] - r2['_L_sph']) > 0.5: return False
+        if abs(r1['_L_cyl'] - r2['_L_cyl']) > 0.5: return False
+        if abs(r1['_L_add'] - r2['_L_add']) > 0.5: return False
+        if abs(r1['_L_axi'] - r2['_L_axi']) > 15: return False
+        if abs(r1['_L_pd'] - r2['_L_pd']) > 3: return False
+
+        if abs(r1['_R_sph'] - r2['_R_sph']) > 0.5: return False
+        if abs(r1['_R_cyl'] - r2['_R_cyl']) > 0.5: return False
+        if abs(r1['_R_add'] - r2['_R_add']) > 0.5: return False
+        if abs(r1['_R_axi'] - r2['_R_axi']) > 15: return False
+        if abs(r1['_R_pd'] - r2['_R_pd']) > 3: return False
+
+        return True
+
+    for idx, row in df_rx.iterrows():
+        matches = []
+        for jdx, cand in df_rx.iterrows():
+            if idx == jdx: continue
+            if is_match(row, cand):
+                matches.append((cand['잔여일'], cand['주문번호'] + f" ({cand['잔여일']}일 남음)"))
+
+        matches.sort(key=lambda x: x[0])
+        if matches:
+            df_rx.at[idx, '대체반주문(유사건)'] = "\n".join(label for _, label in matches)
+
+    return df_rx['대체반주문(유사건)'].tolist()
+
+# ==========================================
+# 무작위 RX 주문 (bms_return_dashboard의 df_rx와 같은 컬럼)
+# ==========================================
+def make_rx(n, seed=0, sph_range=(-1.5, 0.5)):
+    """좁은 도수 범위에 몰아 넣어 후보가 많이 생기도록.
+    SPH는 0.25 단위라 bucket 칸 경계(정수)와 오차 경계(±0.5)에 걸친 값이 자주 나옴"""
+    rnd = random.Random(seed)
+    quarter = lambda lo, hi: rnd.randint(int(lo * 4), int(hi * 4)) / 4
+    rows = []
+    for i in range(n):
+        row = {
+            '_id': i if i % 50 else i - 1,  # 같은 주문이 두 행인 경우
+            '_cid': rnd.choice([rnd.randint(1, max(1, n // 3)), '', None]),  # 같은 고객 / 빈 고객
+            '잔여일': rnd.randint(-10, 60),  # 음수 = 기한 만료
+            '브랜드': rnd.choice(['zeiss', 'chemi', 'nikon']),
+            '주문번호': f'O{i:05d}',
+        }
+        for side in 'LR':
+            row[f'_{side}_sph'] = quarter(*sph_range)
+            row[f'_{side}_cyl'] = quarter(-0.75, 0)
+            row[f'_{side}_add'] = rnd.choice([0.0, 0.0, 1.0])
+            row[f'_{side}_axi'] = float(rnd.choice([180, 175, 170, 160, 90]))
+            row[f'_{side}_pd'] = float(rnd.randint(30, 34))
+        # 도수가 비어 있는 주문 (NaN 비교는 탈락 조건이 아님)
+        if i % 17 == 0: row['_L_sph'] = np.nan
+        if i % 23 == 0: row['_R_sph'] = np.nan
+        if i % 29 == 0: row['_R_pd'] = np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def make_rx_realistic(n, seed=0):
+    """실제 반품 대시보드에 가까운 분포: 도수가 넓게 퍼져 있고 브랜드가 여럿 (후보는 드묾)"""
+    rnd = random.Random(seed)
+    quarter = lambda lo, hi: rnd.randint(int(lo * 4), int(hi * 4)) / 4
+    rows = []
+    for i in range(n):
+        row = {
+            '_id': i, '_cid': rnd.randint(1, max(1, n // 2)), '잔여일': rnd.randint(-10, 100),
+            '브랜드': rnd.choice(['zeiss', 'chemi', 'nikon', 'varilux', 'tokai', 'hoya']),
+            '주문번호': f'O{i:05d}',
+        }
+        for side in 'LR':
+            row[f'_{side}_sph'] = quarter(-8, 4)
+            row[f'_{side}_cyl'] = quarter(-3, 0)
+            row[f'_{side}_add'] = rnd.choice([0.0] * 4 + [1.0, 1.5, 2.0])
+            row[f'_{side}_axi'] = float(rnd.randint(0, 180))
+            row[f'_{side}_pd'] = float(rnd.randint(28, 36))
+        if i % 41 == 0: row['_L_sph'] = np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def pair_set(rows, cols):
+    pairs = list(zip(rows.tolist(), cols.tolist()))
+    assert len(pairs) == len(set(pairs))  # 같은 쌍이 두 번 나오지 않음
+    return set(pairs)
+
+ENGINES = sorted(MATCH_ENGINES) + ["auto"]
+
+# ==========================================
+# 테스트
+# ==========================================
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", [0, 1])
+def test_matches_baseline(engine, seed):
+    df = make_rx(150, seed)
+    expected = baseline_find_alt_returns(df)
+    assert sum(1 for x in expected if x) > 50
+    assert find_matches(df, engine) == expected
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_matches_baseline_wide_sph(engine):
+    # 도수가 넓게 퍼져 여러 bucket 칸에 걸치는 경우
+    df = make_rx(150, seed=2, sph_range=(-6, 3))
+    assert find_matches(df, engine) == baseline_find_alt_returns(df)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_non_range_index(engine):
+    # 필터링 뒤 인덱스가 0부터가 아닌 df_rx
+    df = make_rx(120, seed=3)
+    df.index = np.arange(len(df)) * 3 + 7
+    assert find_matches(df, engine) == baseline_find_alt_returns(df)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_excludes_self_customer_and_expired(engine):
+    df = make_rx(3, seed=4)
+    for c in df.columns:
+        if c.startswith('_') and c not in ('_id', '_cid'):
+            df[c] = 0.0
+    df['브랜드'] = 'zeiss'
+    df['_id'] = [1, 2, 3]
+    df['_cid'] = ['a', 'a', 'b']
+    df['잔여일'] = [5, 3, -1]
+    # 1, 2는 같은 고객, 3은 기한 만료라 후보가 아님 (3의 후보는 잔여일 오름차순)
+    assert find_matches(df, engine) == ["", "", "O00001 (3일 남음)\nO00000 (5일 남음)"] == baseline_find_alt_returns(df)
+
+def test_empty():
+    assert find_matches(make_rx(0)) == []
+
+# ==========================================
+# 엔진 간 비교 (기존 방식으로는 너무 오래 걸리는 크기)
+# ==========================================
+@pytest.mark.parametrize("make,n", [(make_rx, 2000), (make_rx_realistic, 6000)], ids=["dense", "realistic"])
+def test_engines_agree(make, n):
+    df = make(n, seed=5)
+    inputs = _match_inputs(df)
+    bucket = pair_set(*match_pairs_bucketed(*inputs))
+    assert bucket
+    assert pair_set(*match_pairs_broadcast(*inputs)) == bucket
+    assert find_matches(df, "broadcast") == find_matches(df, "bucket") == find_matches(df, "auto")
+
+def test_engines_agree_small_tiles(monkeypatch):
+    # 타일/블록 경계가 여러 번 생기도록 작게
+    monkeypatch.setattr(bms_rx_matcher, "TILE_ROWS", 7)
+    monkeypatch.setattr(bms_rx_matcher, "TILE_COLS", 13)
+    df = make_rx(400, seed=6)
+    inputs = _match_inputs(df)
+    assert pair_set(*match_pairs_broadcast(*inputs)) == pair_set(*match_pairs_bucketed(*inputs, block_rows=5))
+    assert find_matches(df, "broadcast") == baseline_find_alt_returns(df)
+
+@pytest.mark.parametrize("n,expected", [(10, "broadcast"), (30, "bucket")])
+def test_auto_engine_choice(monkeypatch, n, expected):
+    monkeypatch.setattr(bms_rx_matcher, "AUTO_BROADCAST_MAX_ROWS", 20)
+    used = []
+    for name, func in list(MATCH_ENGINES.items()):
+        monkeypatch.setitem(MATCH_ENGINES, name, lambda *a, _name=name, _func=func: used.append(_name) or _func(*a))
+    find_matches(make_rx(n, seed=7))
+    assert used == [expected]